@@ -0,0 +1,324 @@
+# -*- coding: utf8 -*-
+
+"""
+Minimal stand-in for arcpy so the tool's stages run headless in benchmarks.
+
+Rasters are single-band float32 .npy files (NoData is NaN) with a cell size of
+1 and the lower left corner at (0, 0). Map algebra (+, ==, IsNull, Con) is
+evaluated eagerly in memory. Only what somcore.raster_io.ArcpyRasterIO and
+somcore.raster.ArcpyRaster use is implemented. arcpy.mapping is a mock of the
+map for somcore.layers: the layers added to the data frame, the symbology
+updates and the refreshes are recorded; reset() clears them. Parameter holds
+the parameters of the Python toolbox ('SOM Toolbox.pyt').
+
+    import arcpy_stub
+    arcpy_stub.install()        # registers the modules 'arcpy', 'arcpy.sa' and 'arcpy.mapping'
+"""
+
+import os
+import sys
+import types
+
+import numpy as np
+
+# version reported by GetInstallInfo()
+VERSION = "stub"
+
+
+# .npy file holding a raster
+def raster_file(path):
+    path = str(path)
+    return path if path.endswith(".npy") else path + ".npy"
+
+
+class Point(object):
+    def __init__(self, x=0.0, y=0.0):
+        self.X = x
+        self.Y = y
+
+
+class Extent(object):
+    def __init__(self, width, height):
+        self.XMin, self.YMin, self.XMax, self.YMax = 0.0, 0.0, float(width), float(height)
+
+    def __str__(self):
+        return "{} {} {} {}".format(self.XMin, self.YMin, self.XMax, self.YMax)
+
+
+class SpatialReference(object):
+    name = "Unknown"
+    type = "Unknown"
+    PCSCode = 0
+
+    def exportToString(self):
+        return ""
+
+
+class Raster(object):
+    def __init__(self, source):
+        if isinstance(source, np.ndarray):
+            self.array = source
+            self.catalogPath = None
+        else:
+            self.array = np.load(raster_file(source), mmap_mode="r")
+            self.catalogPath = raster_file(source)
+        self.name = os.path.basename(str(source)) if self.catalogPath else "result"
+        self.height, self.width = self.array.shape
+        self.meanCellWidth = self.meanCellHeight = 1.0
+        self.extent = Extent(self.width, self.height)
+        self.spatialReference = SpatialReference()
+        self.noDataValue = None                             # NoData is NaN
+
+    def __add__(self, other):
+        return Raster(np.add(self.array, other.array if isinstance(other, Raster) else other, dtype=np.float32))
+
+    __radd__ = __add__
+
+    def __eq__(self, other):
+        return Raster(np.asarray(self.array) == other)
+
+    def save(self, path):
+        np.save(raster_file(path), self.array)
+
+
+# arcpy.sa
+def IsNull(raster):
+    return Raster(np.isnan(raster.array).astype(np.float32))
+
+
+def Con(condition, true_value):
+    return Raster(np.where(condition.array, np.float32(true_value), np.float32(np.nan)).astype(np.float32))
+
+
+def RasterToNumPyArray(raster, lower_left=None, ncols=None, nrows=None, nodata_to_value=None):
+    nrows = raster.height if nrows is None else nrows
+    ncols = raster.width if ncols is None else ncols
+    row = raster.height - nrows - (int(round(lower_left.Y)) if lower_left is not None else 0)
+    block = np.array(raster.array[row:row + nrows, :ncols])
+    if nodata_to_value is not None:
+        block[np.isnan(block)] = nodata_to_value
+    return block
+
+
+# stub rasters keep NoData as NaN
+def NumPyArrayToRaster(array, lower_left=None, x_cell_size=1.0, y_cell_size=1.0, value_to_nodata=None):
+    array = np.asarray(array, dtype=np.float32)
+    if value_to_nodata is not None:
+        array = np.where(array == value_to_nodata, np.float32(np.nan), array)
+    return Raster(array)
+
+
+class Describe(object):
+    def __init__(self, path):
+        raster = Raster(path)
+        self.name = raster.name
+        self.catalogPath = raster.catalogPath
+        self.extent = raster.extent
+        self.spatialReference = raster.spatialReference
+        self.meanCellWidth = raster.meanCellWidth
+        self.meanCellHeight = raster.meanCellHeight
+        self.height, self.width = raster.height, raster.width
+
+
+def Exists(path):
+    return os.path.exists(str(path)) or os.path.exists(raster_file(path))
+
+
+def CreateFolder_management(folder, name):
+    os.makedirs(os.path.join(folder, name))
+
+
+def Delete_management(path):
+    for candidate in (str(path), raster_file(path)):
+        if os.path.isfile(candidate):
+            os.remove(candidate)
+
+
+def CopyRaster_management(source, destination):
+    np.save(raster_file(destination), np.load(raster_file(source)))
+
+
+def DefineProjection_management(path, spatial_reference):
+    pass
+
+
+# the inputs are blocks of rows from the top down, as ArcpyRasterIO.create_mask() writes them
+def MosaicToNewRaster_management(inputs, output_location, raster_dataset_name_with_extension, coordinate_system=None,
+                                 pixel_type=None, cellsize=None, number_of_bands=1):
+    blocks = [np.load(raster_file(path)) for path in inputs.split(";")]
+    np.save(raster_file(os.path.join(output_location, raster_dataset_name_with_extension)), np.concatenate(blocks))
+
+
+# arcpy.mapping: a layer of a group layer file (EmptyLayer.lyr) is a group layer
+class Layer(object):
+    def __init__(self, path):
+        self.dataSource = str(path)
+        self.name = os.path.splitext(os.path.basename(self.dataSource))[0]
+        self.description = ""
+        self.isGroupLayer = self.dataSource.lower().endswith("emptylayer.lyr")
+        self.layers = []                                    # layers of a group layer
+        self.symbology = None
+
+
+class DataFrame(object):
+    def __init__(self):
+        self.layers = []
+
+
+class MapDocument(object):
+    frame = DataFrame()                                     # one data frame shared by all documents
+
+    def __init__(self, path="CURRENT"):
+        self.activeDataFrame = MapDocument.frame
+
+
+def AddLayer(data_frame, layer, position="AUTO_ARRANGE"):
+    data_frame.layers.append(layer)
+
+
+def AddLayerToGroup(data_frame, group, layer, position="AUTO_ARRANGE"):
+    group.layers.append(layer)
+
+
+def RemoveLayer(data_frame, layer):
+    for layers in [data_frame.layers] + [group.layers for group in ListLayers(None, "*", data_frame)]:
+        if layer in layers:
+            layers.remove(layer)
+
+
+def ListLayers(document, wildcard="*", data_frame=None):
+    found, queue = [], list(data_frame.layers)
+    while queue:
+        layer = queue.pop(0)
+        if wildcard == "*" or layer is wildcard:
+            found.append(layer)
+        queue.extend(layer.layers)
+    return found
+
+
+def UpdateLayer(data_frame, layer, source_layer, symbology_only=True):
+    layer.symbology = source_layer.dataSource
+    symbology_updates.append(layer.name)
+
+
+# layer names updated with a symbology and refreshes
+symbology_updates = []
+refreshes = []
+
+
+def RefreshActiveView():
+    refreshes.append("view")
+
+
+def RefreshTOC():
+    refreshes.append("toc")
+
+
+# files and folders of the workspace, like the names of GRIDs
+def ListFiles():
+    return sorted(os.path.splitext(name)[0] if name.endswith(".npy") else name
+                  for name in os.listdir(env.workspace))
+
+
+messages = []
+
+
+def AddMessage(message):
+    messages.append(message)
+
+
+AddError = AddWarning = AddMessage
+
+# labels and positions shown by the progressor
+progressor = []
+
+
+def SetProgressor(kind, message="", minimum=0, maximum=100, step=1):
+    progressor.append(message)
+
+
+def SetProgressorLabel(message):
+    progressor.append(message)
+
+
+def SetProgressorPosition(position=None):
+    progressor.append(position)
+
+
+def ResetProgressor():
+    progressor.append(None)
+
+# GetParameterAsText() returns the entries of this list
+parameters = []
+
+
+def GetParameterAsText(index):
+    return parameters[index] if index < len(parameters) else ""
+
+
+def GetInstallInfo():
+    return {"Version": VERSION}
+
+
+# parameter of a Python toolbox tool; valueAsText like arcpy returns it
+class Parameter(object):
+    def __init__(self, name=None, displayName=None, datatype=None, parameterType=None, direction=None,
+                 category=None, multiValue=False):
+        self.name = name
+        self.displayName = displayName
+        self.datatype = datatype
+        self.parameterType = parameterType
+        self.direction = direction
+        self.category = category
+        self.multiValue = multiValue
+        self.filter = types.ModuleType("filter")
+        self.filter.type, self.filter.list = None, []
+        self.value = None
+
+    @property
+    def valueAsText(self):
+        if self.value is None:
+            return None
+        if isinstance(self.value, bool):
+            return "true" if self.value else "false"
+        return str(self.value)
+
+
+def CheckOutExtension(name):
+    return "CheckedOut"
+
+
+env = types.ModuleType("arcpy.env")
+
+
+# empties the map, the recorded symbology updates, refreshes, messages and progress
+def reset():
+    MapDocument.frame = DataFrame()
+    for recorded in (symbology_updates, refreshes, messages, progressor):
+        del recorded[:]
+
+
+# registers the stub as the modules 'arcpy', 'arcpy.sa' and 'arcpy.mapping'
+def install():
+    arcpy = types.ModuleType("arcpy")
+    sa = types.ModuleType("arcpy.sa")
+    mapping = types.ModuleType("arcpy.mapping")
+    module = sys.modules[__name__]
+    for name in ("Point", "Extent", "Raster", "RasterToNumPyArray", "NumPyArrayToRaster", "Describe", "Exists",
+                 "CreateFolder_management", "Delete_management", "CopyRaster_management",
+                 "DefineProjection_management", "MosaicToNewRaster_management", "AddMessage", "SetProgressor",
+                 "SetProgressorLabel", "SetProgressorPosition", "ResetProgressor", "progressor", "AddError",
+                 "AddWarning", "GetParameterAsText", "GetInstallInfo", "Parameter", "CheckOutExtension", "messages",
+                 "parameters", "RefreshActiveView", "RefreshTOC", "ListFiles", "refreshes", "env"):
+        setattr(arcpy, name, getattr(module, name))
+    for name in ("Raster", "IsNull", "Con"):
+        setattr(sa, name, getattr(module, name))
+    for name in ("Layer", "MapDocument", "AddLayer", "AddLayerToGroup", "RemoveLayer", "ListLayers", "UpdateLayer",
+                 "symbology_updates"):
+        setattr(mapping, name, getattr(module, name))
+    arcpy.sa = sa
+    arcpy.mapping = mapping
+    sys.modules["arcpy"] = arcpy
+    sys.modules["arcpy.sa"] = sa
+    sys.modules["arcpy.mapping"] = mapping
+    return arcpy
@@ -0,0 +1,63 @@
+# -*- coding: utf8 -*-
+
+"""
+Benchmark of the k-means sweep over the SOM codebook (somcore.cluster).
+
+Times the sweep from number_min to number_max for growing number_max with
+1 and N workers and with warm starts, and checks that the parallel sweep
+gives the same labels as the serial one.
+
+    python benchmarks/bench_kmeans.py --nodes 900 --bands 10 --number 5 --max 10 25 50
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from somcore import cluster, parallel  # noqa: E402
+
+
+def timed(function, *arguments, **keywords):
+    start = time.time()
+    result = function(*arguments, **keywords)
+    return time.time() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--nodes", type=int, default=900)
+    parser.add_argument("--bands", type=int, default=10)
+    parser.add_argument("--number", type=int, default=5, help="initializations per number of clusters")
+    parser.add_argument("--min", type=int, default=2)
+    parser.add_argument("--max", type=int, nargs="+", default=[10, 25, 50])
+    parser.add_argument("--workers", type=int, default=0, help="0: number of cores")
+    parser.add_argument("--pool-type", default="thread")
+    arguments = parser.parse_args()
+
+    random_state = np.random.RandomState(0)
+    centers = random_state.uniform(0, 10, (15, arguments.bands))
+    codebook = centers[random_state.randint(15, size=arguments.nodes)]
+    codebook += random_state.normal(0, 1, codebook.shape)
+    workers = parallel.worker_count(arguments.workers)
+
+    print("{:>6} {:>10} {:>14} {:>10} {:>8}".format("max k", "serial [s]",
+                                                    "{} workers [s]".format(workers), "warm [s]", "same"))
+    for number_max in arguments.max:
+        serial, labels = timed(cluster.cluster_codebook, codebook, arguments.number, arguments.min, number_max)
+        shared, parallel_labels = timed(cluster.cluster_codebook, codebook, arguments.number, arguments.min,
+                                        number_max, workers=workers, pool_type=arguments.pool_type)
+        warm, _ = timed(cluster.cluster_codebook, codebook, arguments.number, arguments.min, number_max,
+                        workers=workers, pool_type=arguments.pool_type, warm_start=True)
+        print("{:>6d} {:>10.2f} {:>14.2f} {:>10.2f} {:>8}".format(number_max, serial, shared, warm,
+                                                                 str((labels == parallel_labels).all())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+# -*- coding: utf8 -*-
+
+"""
+Benchmark of the whole processing chain on synthetic raster stacks.
+
+Generates stacks of float32 rasters with a given number of cells (10^4 to
+10^8), bands and NoData fraction and runs the stages of SOM_Clustering.py
+headless with the arcpy raster I/O against a stubbed arcpy
+(benchmarks/arcpy_stub.py):
+
+    mask        SomTool.create_mask() (block-wise mask and valid-cell index)
+    lrn         SomTool.create_lrn() (SOM.lrn or SOM.npy)
+    train       SOM training (somcore.som, or nextsom_wrap.exe on Windows)
+    kmeans      k-means sweep over the codebook (somcore.cluster)
+    assign      BMU search and geospace.txt / somspace.txt with the clusters
+                of the kmeans stage
+    rasterize   result rasters (somcore.rasterize; GeoTIFF with GDAL, else in memory)
+
+Wall time, peak RSS, I/O and cells/s of every stage are written to a JSON
+results file. Given a baseline (an earlier results file) the benchmark exits
+with status 1 if a stage got slower (or, with --memory-threshold, bigger) than
+the threshold allows. Stages faster than --min-time are not compared.
+
+    python benchmarks/bench_pipeline.py --cells 1e4 1e5 1e6 --bands 8 --nodata 0.2 --output results.json
+    python benchmarks/bench_pipeline.py --baseline baseline.json --threshold 0.25
+    python benchmarks/bench_pipeline.py --save-baseline baseline.json
+
+10^8 cells need about 0.4 GB of disk per band; --training-mode minibatch
+streams the training data.
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCHMARK_FOLDER = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_FOLDER))
+sys.path.insert(0, BENCHMARK_FOLDER)
+
+import arcpy_stub  # noqa: E402
+
+arcpy_stub.install()
+
+from somcore import lrn, rasterize, report, som, workflow  # noqa: E402
+from somcore.raster_io import ArcpyRasterIO  # noqa: E402
+
+# rows of a synthetic raster generated at once
+GENERATE_ROWS = 1024
+
+# side of the square patches of one synthetic class
+PATCH_SIZE = 64
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--cells", type=float, nargs="+", default=[1e4, 1e5, 1e6])
+    parser.add_argument("--bands", type=int, default=8)
+    parser.add_argument("--nodata", type=float, default=0.1, help="fraction of cells without data")
+    parser.add_argument("--classes", type=int, default=6, help="synthetic classes in the stack")
+    parser.add_argument("--som-x", default="10")
+    parser.add_argument("--som-y", default="10")
+    parser.add_argument("--epochs", default="10")
+    parser.add_argument("--kmeans", nargs=3, default=["5", "2", "12"], metavar=("NUMBER", "MIN", "MAX"))
+    parser.add_argument("--input-format", default="npy", choices=sorted(lrn.INPUT_FORMATS))
+    parser.add_argument("--backend", default="numpy", choices=sorted(som.BACKENDS) + ["nextsom_wrap"])
+    parser.add_argument("--workers", default="1")
+    parser.add_argument("--training-mode", default="batch", choices=["batch", "minibatch"])
+    parser.add_argument("--repeat", type=int, default=1, help="runs per size, the fastest counts")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--folder", help="folder of the synthetic stacks (default: temporary, removed)")
+    parser.add_argument("--output", default="bench_pipeline.json")
+    parser.add_argument("--baseline", help="results file to compare with")
+    parser.add_argument("--save-baseline", help="also write the results to this baseline file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, 0.2 = 20 %%")
+    parser.add_argument("--memory-threshold", type=float, help="allowed growth of the peak RSS")
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds below which stages are not compared")
+    return parser.parse_args()
+
+
+# rows and columns of a nearly square raster with about 'cells' cells
+def raster_shape(cells):
+    rows = max(1, int(round(np.sqrt(cells))))
+    return rows, max(1, int(round(cells / rows)))
+
+
+# writes a stack of rasters whose cells belong to square patches of a few classes;
+# every NoData cell lacks data in one random band, so the mask has the NoData fraction
+def generate_stack(folder, cells, bands, nodata, classes, seed):
+    shape = raster_shape(cells)
+    random_state = np.random.RandomState(seed)
+    centers = random_state.rand(classes, bands).astype(np.float32) * 10
+    paths = [os.path.join(folder, "band_{}".format(band + 1)) for band in range(bands)]
+    outputs = [np.lib.format.open_memmap(arcpy_stub.raster_file(path), "w+", np.float32, shape) for path in paths]
+    for row in range(0, shape[0], GENERATE_ROWS):
+        rows = np.arange(row, min(row + GENERATE_ROWS, shape[0]))[:, None]
+        cols = np.arange(shape[1])[None, :]
+        labels = (rows // PATCH_SIZE * 7 + cols // PATCH_SIZE * 3) % classes
+        missing = random_state.rand(*labels.shape) < nodata
+        missing_band = random_state.randint(0, bands, labels.shape)
+        for band, output in enumerate(outputs):
+            values = centers[labels, band] + random_state.standard_normal(labels.shape).astype(np.float32)
+            values[missing & (missing_band == band)] = np.nan
+            output[row:row + len(rows)] = values
+    for output in outputs:
+        output.flush()
+    return paths, shape
+
+
+# the tool with its parameters as SOM_Clustering.py reads them from the toolbox
+def configure_tool(workspace, paths, arguments):
+    values = [workspace, ";".join(paths), arguments.som_x, arguments.som_y, arguments.epochs,
+              arguments.kmeans[1], arguments.kmeans[2], arguments.kmeans[0], "toroid", "rectangular", "false",
+              "random", "gaussian", "0.5", "0", "1", "linear", "0.1", "0.01", "linear",
+              arguments.input_format, arguments.backend, arguments.workers, arguments.training_mode, "0", "0", "false"]
+    return workflow.SomTool(workflow.ToolParameters(values), ArcpyRasterIO(), log=arcpy_stub.AddMessage)
+
+
+# resets the peak RSS of the process (Linux), so every stage reports its own peak;
+# elsewhere the peak is the high-water mark since the benchmark started
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except (IOError, OSError):
+        pass
+
+
+# runs all stages once on a stack, returns the stage entries of a run report
+def run_stages(workspace, paths, arguments):
+    tool = configure_tool(workspace, paths, arguments)
+    path_to_temp, path_to_geofolder, path_to_somfolder, out = tool.createfolders()
+    path_to_somxml = tool.write_xml()
+    run_report = report.RunReport()
+    state = {}
+
+    def train():
+        if arguments.backend in som.BACKENDS:
+            state["codebook"] = som.run(path_to_somxml, assign=False)
+        else:
+            run_report.call('{} --xmlfile="{}"'.format(tool.path_to_nextsom_wrap, path_to_somxml))
+
+    def kmeans():
+        state["labels"] = som.cluster_labels(som.SomConfig(path_to_somxml), state["codebook"])
+
+    def result_rasters():
+        rasterize.create_result_rasters(workspace, path_to_geofolder, path_to_somfolder,
+                                        os.path.join(path_to_temp, "mask"),
+                                        os.path.join(workspace, "geospace.txt"), None,
+                                        os.path.join(workspace, "somspace.txt"), None,
+                                        arguments.som_x, arguments.som_y, len(paths), driver=raster_driver(),
+                                        index=tool.mask_index(path_to_temp))
+
+    in_repo = arguments.backend in som.BACKENDS
+    stages = [("mask", lambda: tool.create_mask(path_to_temp), True),
+              ("lrn", lambda: tool.create_lrn(path_to_temp), True),
+              ("train", train, True),
+              ("kmeans", kmeans, in_repo),
+              ("assign", lambda: som.run(path_to_somxml, codebook=state["codebook"], labels=state["labels"]), in_repo),
+              ("rasterize", result_rasters, True)]
+    for name, function, enabled in stages:
+        if not enabled:
+            run_report.skip(name)
+            continue
+        reset_peak_rss()
+        cells = tool.raster_cells if name == "mask" else tool.training_cells
+        with run_report.measure(name, cells):
+            function()
+    return run_report.stages
+
+
+# GeoTIFF with GDAL, otherwise in-memory rasters
+def raster_driver():
+    try:
+        import osgeo.gdal  # noqa: F401
+    except ImportError:
+        return "array"
+    return "GTiff"
+
+
+# stage entries of several runs with the fastest wall time of each stage
+def fastest(runs):
+    best = runs[0]
+    for stages in runs[1:]:
+        best = [stage if stage.get("wall_time", 0) < other.get("wall_time", 0) else other
+                for stage, other in zip(best, stages)]
+    return best
+
+
+def benchmark(arguments, folder):
+    results = {"created": time.time(), "arguments": vars(arguments),
+               "environment": {"python": platform.python_version(), "numpy": np.__version__,
+                               "platform": platform.platform(), "processor": platform.processor()},
+               "sizes": []}
+    for cells in arguments.cells:
+        stack_folder = os.path.join(folder, "stack_{}".format(int(cells)))
+        os.makedirs(stack_folder)
+        paths, shape = generate_stack(stack_folder, cells, arguments.bands, arguments.nodata, arguments.classes,
+                                      arguments.seed)
+        runs = []
+        for run in range(arguments.repeat):
+            workspace = os.path.join(stack_folder, "run_{}".format(run))
+            os.makedirs(workspace)
+            runs.append(run_stages(workspace, paths, arguments))
+            shutil.rmtree(workspace)
+        stages = fastest(runs)
+        results["sizes"].append({"cells": int(shape[0] * shape[1]), "shape": list(shape),
+                                 "bands": arguments.bands, "nodata": arguments.nodata, "stages": stages})
+        print_stages(shape, stages)
+        shutil.rmtree(stack_folder)
+    return results
+
+
+def print_stages(shape, stages):
+    print("{} x {} cells".format(*shape))
+    print("  {:<10} {:>10} {:>14} {:>12}".format("stage", "time [s]", "cells/s", "peak [MB]"))
+    for stage in stages:
+        if stage["status"] == "skipped":
+            print("  {:<10} {:>10}".format(stage["name"], "skipped"))
+            continue
+        print("  {:<10} {:>10.3f} {:>14} {:>12}".format(
+            stage["name"], stage["wall_time"],
+            "{:.0f}".format(stage["cells_per_second"]) if stage["cells_per_second"] else "-",
+            "{:.0f}".format(stage["peak_rss"] / 2 ** 20) if stage["peak_rss"] else "-"))
+
+
+# stages that got slower (or bigger) than allowed compared with the baseline
+def regressions(results, baseline, threshold, memory_threshold=None, min_time=0.05):
+    found = []
+    base_sizes = dict((size["cells"], size) for size in baseline["sizes"])
+    for size in results["sizes"]:
+        base_size = base_sizes.get(size["cells"])
+        if base_size is None:
+            continue
+        base_stages = dict((stage["name"], stage) for stage in base_size["stages"])
+        for stage in size["stages"]:
+            base = base_stages.get(stage["name"])
+            if base is None or stage["status"] != "done" or base["status"] != "done":
+                continue
+            if base["wall_time"] >= min_time and stage["wall_time"] > base["wall_time"] * (1 + threshold):
+                found.append("{} cells, {}: {:.3f} s instead of {:.3f} s".format(
+                    size["cells"], stage["name"], stage["wall_time"], base["wall_time"]))
+            if (memory_threshold is not None and base["peak_rss"] and stage["peak_rss"] and
+                    stage["peak_rss"] > base["peak_rss"] * (1 + memory_threshold)):
+                found.append("{} cells, {}: peak RSS {:.0f} MB instead of {:.0f} MB".format(
+                    size["cells"], stage["name"], stage["peak_rss"] / 2 ** 20, base["peak_rss"] / 2 ** 20))
+    return found
+
+
+def write_results(path, results):
+    with open(path, "w") as results_file:
+        json.dump(results, results_file, indent=2)
+
+
+def main():
+    arguments = parse_arguments()
+    if arguments.backend == "nextsom_wrap" and sys.platform != "win32":
+        sys.exit("nextsom_wrap.exe runs on Windows only.")
+    folder = arguments.folder or tempfile.mkdtemp(prefix="bench_pipeline_")
+    try:
+        results = benchmark(arguments, folder)
+    finally:
+        if not arguments.folder:
+            shutil.rmtree(folder, ignore_errors=True)
+    write_results(arguments.output, results)
+    if arguments.save_baseline:
+        write_results(arguments.save_baseline, results)
+    if arguments.baseline:
+        with open(arguments.baseline) as baseline_file:
+            found = regressions(results, json.load(baseline_file), arguments.threshold, arguments.memory_threshold,
+                                arguments.min_time)
+        for regression in found:
+            print("REGRESSION " + regression)
+        if found:
+            sys.exit(1)
+        print("No stage regressed by more than {:.0%}.".format(arguments.threshold))
+
+
+if __name__ == "__main__":
+    main()
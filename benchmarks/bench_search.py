@@ -0,0 +1,91 @@
+# -*- coding: utf8 -*-
+
+"""
+Benchmark of the BMU searches of somcore.search on large maps.
+
+Trains one map on synthetic data with the exact search, then matches the
+data against the trained codebook with every available search (the final
+assignment). With --train the map is trained again with every search from
+the same initial codebook; on large maps the neighbourhood update, not the
+BMU search, dominates the training time. Reports the seconds, the share of
+rows whose BMU differs from the exact one and the mean quantization error.
+kdtree is measured when scipy is installed.
+
+    python benchmarks/bench_search.py --cells 200000 --bands 10 --som 100 100 --epochs 10
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+BENCHMARK_FOLDER = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_FOLDER))
+sys.path.insert(0, BENCHMARK_FOLDER)
+
+from bench_som import BenchmarkConfig, synthetic_data  # noqa: E402
+from somcore import bmu, search, som  # noqa: E402
+
+
+def available_searches():
+    names = ["exact", "local"]
+    try:
+        import scipy.spatial  # noqa: F401
+        names.insert(1, "kdtree")
+    except ImportError:
+        print("scipy is not installed, the kdtree search is not measured.")
+    return names
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--cells", type=int, default=200000)
+    parser.add_argument("--bands", type=int, default=10)
+    parser.add_argument("--som", type=int, nargs=2, default=(100, 100))
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--map-type", default="toroid")
+    parser.add_argument("--grid-type", default="hexagonal")
+    parser.add_argument("--neighborhood", default="gaussian")
+    parser.add_argument("--initialization", default="pca", choices=["random", "pca"])
+    parser.add_argument("--train", action="store_true", help="also train with every search")
+    arguments = parser.parse_args()
+
+    config = BenchmarkConfig(arguments)
+    config.initialization = arguments.initialization
+    data = synthetic_data(arguments.cells, arguments.bands)
+    grid = config.grid()
+    initial = som.initialize_codebook(data, grid, config.initialization, config.seed)
+    trained = som.NumpyBackend().train(data, initial.copy(), grid, config)
+    exact, _ = bmu.best_matching_units(data, trained)
+
+    print("assignment of {} rows to a trained {} x {} map".format(len(data), *arguments.som))
+    print("{:<8} {:>10} {:>14} {:>10}".format("search", "seconds", "disagreement", "mean QE"))
+    for name in available_searches():
+        bmu_search = search.get_search(name, grid)
+        start = time.time()
+        bmus, distances = bmu_search.query(data, trained)
+        seconds = time.time() - start
+        print("{:<8} {:>10.3f} {:>13.2%} {:>10.5f}".format(name, seconds, np.mean(bmus != exact),
+                                                          float(np.sqrt(distances).mean())))
+
+    if not arguments.train:
+        return
+    print("training, {} epochs".format(arguments.epochs))
+    print("{:<8} {:>10} {:>14} {:>10}".format("search", "seconds", "disagreement", "mean QE"))
+    for name in available_searches():
+        bmu_search = None if name == "exact" else search.get_search(name, grid)
+        start = time.time()
+        codebook = som.NumpyBackend(bmu_search=bmu_search).train(data, initial.copy(), grid, config)
+        seconds = time.time() - start
+        exact, distances = bmu.best_matching_units(data, codebook)
+        found = exact if bmu_search is None else bmu_search.query(data, codebook)[0]
+        print("{:<8} {:>10.3f} {:>13.2%} {:>10.5f}".format(name, seconds, np.mean(found != exact),
+                                                          float(np.sqrt(distances).mean())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+# -*- coding: utf8 -*-
+
+"""
+Benchmark of the SOM trainers of somcore.som.
+
+Trains the same synthetic dataset from the same initial codebook with every
+available backend and reports the wall-clock time, the mean quantization
+error and the median and largest codebook difference to the numpy backend
+per node. somoclu is used when it is installed (pip install somoclu).
+
+Both trainers run the same batch algorithm, so they differ only by float32
+rounding. Rounding decides near ties of the best matching unit differently,
+though (a few hundred of 200000 rows), and once a node has other data its
+trajectory differs: after a few epochs single nodes differ by a sizeable
+share of the data range while the maps are equally good. The check is
+therefore on the mean quantization errors (within 1 %); the codebook
+differences are reported only. Measured baselines: benchmarks/BASELINE.md.
+
+    python benchmarks/bench_som.py --cells 200000 --bands 10 --som 30 30 --epochs 10
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from somcore import som  # noqa: E402
+from somcore.grid import Grid  # noqa: E402
+
+# allowed relative difference of the mean QE
+QE_TOLERANCE = 0.01
+
+
+class BenchmarkConfig(object):
+    def __init__(self, arguments):
+        self.som_x, self.som_y = arguments.som
+        self.n_epoch = arguments.epochs
+        self.map_type = arguments.map_type
+        self.grid_type = arguments.grid_type
+        self.neighborhood = arguments.neighborhood
+        self.std_coeff = 0.5
+        self.initialization = "random"
+        self.radius0 = min(self.som_x, self.som_y) / 2.0
+        self.radius_n = 1.0
+        self.radius_cooling = "linear"
+        self.scale0 = 0.1
+        self.scale_n = 0.01
+        self.scale_cooling = "linear"
+        self.seed = som.SEED
+        self.tolerance = 0.0                                # all epochs, no early stop
+
+    def grid(self):
+        return Grid(self.som_x, self.som_y, self.map_type, self.grid_type)
+
+
+# clustered synthetic data: gaussian blobs around random centers
+def synthetic_data(cells, bands, clusters=12, seed=0):
+    random_state = np.random.RandomState(seed)
+    centers = random_state.uniform(0, 100, (clusters, bands))
+    labels = random_state.randint(clusters, size=cells)
+    return (centers[labels] + random_state.normal(0, 5, (cells, bands))).astype(np.float32)
+
+
+def available_backends():
+    backends = ["numpy"]
+    try:
+        import somoclu  # noqa: F401
+        backends.append("somoclu")
+    except ImportError:
+        print("somoclu is not installed, only the numpy backend is measured.")
+    return backends
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--cells", type=int, default=200000)
+    parser.add_argument("--bands", type=int, default=10)
+    parser.add_argument("--som", type=int, nargs=2, default=(30, 30))
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--map-type", default="planar")
+    parser.add_argument("--grid-type", default="rectangular")
+    parser.add_argument("--neighborhood", default="gaussian")
+    arguments = parser.parse_args()
+
+    config = BenchmarkConfig(arguments)
+    data = synthetic_data(arguments.cells, arguments.bands)
+    grid = config.grid()
+    initial = som.initialize_codebook(data, grid, "random", config.seed)
+    data_range = float(data.max() - data.min())
+
+    backends = available_backends()
+    results = {}
+    print("{:<10} {:>10} {:>12} {:>14} {:>14}".format("backend", "seconds", "mean QE", "median diff", "max diff"))
+    for name in backends:
+        backend = som.get_backend(name)
+        start = time.time()
+        codebook = backend.train(data, initial.copy(), grid, config)
+        seconds = time.time() - start
+        _, distances = som.NumpyBackend().best_matching_units(data, codebook)
+        results[name] = (seconds, float(np.sqrt(distances).mean()), codebook)
+        difference = np.abs(codebook - results["numpy"][2]).max(axis=1) / data_range  # per node
+        print("{:<10} {:>10.2f} {:>12.5f} {:>14.2e} {:>14.2e}".format(name, seconds, results[name][1],
+                                                                      np.median(difference), difference.max()))
+
+    if "somoclu" in results:
+        numpy_qe, somoclu_qe = results["numpy"][1], results["somoclu"][1]
+        if abs(numpy_qe - somoclu_qe) > QE_TOLERANCE * somoclu_qe:
+            sys.exit("numpy backend is outside the tolerance of the somoclu backend.")
+        print("speedup numpy vs somoclu: {:.2f}x".format(results["somoclu"][0] / results["numpy"][0]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# -*- coding: utf8 -*-
+
+"""
+Scaling benchmark of the sharded BMU search (somcore.parallel).
+
+Times the work of a batch epoch (BMU search and sums per node) and of the
+final BMU assignment for 1 to N workers with thread and process pools and
+reports the speedup against one worker. BLAS is limited to one thread per
+worker (--blas-threads) so the speedup comes from the shards alone.
+
+    python benchmarks/bench_workers.py --cells 1000000 --bands 10 --nodes 900 --max-workers 8
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import os
+import sys
+import time
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split("\n")[0])
+    parser.add_argument("--cells", type=int, default=1000000)
+    parser.add_argument("--bands", type=int, default=10)
+    parser.add_argument("--nodes", type=int, default=900)
+    parser.add_argument("--max-workers", type=int, default=0, help="0: number of cores")
+    parser.add_argument("--pool-types", nargs="+", default=["thread", "process"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--blas-threads", default="1")
+    return parser.parse_args()
+
+
+def main():
+    arguments = parse_arguments()
+    for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[variable] = arguments.blas_threads      # before numpy is imported, inherited by the workers
+
+    import numpy as np
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from somcore import parallel, som
+
+    random_state = np.random.RandomState(0)
+    data = random_state.rand(arguments.cells, arguments.bands).astype(np.float32)
+    codebook = random_state.rand(arguments.nodes, arguments.bands).astype(np.float32)
+    max_workers = parallel.worker_count(arguments.max_workers)
+
+    print("{:<8} {:>8} {:>12} {:>10} {:>12} {:>10}".format("pool", "workers", "epoch [s]", "speedup",
+                                                          "assign [s]", "speedup"))
+    for pool_type in arguments.pool_types:
+        single = None
+        for workers in range(1, max_workers + 1):
+            backend = som.NumpyBackend(workers=workers, pool_type=pool_type)
+            backend.node_sums(data, codebook)                   # starts the pool
+            start = time.time()
+            for _ in range(arguments.repeat):
+                backend.node_sums(data, codebook)
+            epoch = (time.time() - start) / arguments.repeat
+            start = time.time()
+            for _ in range(arguments.repeat):
+                backend.best_matching_units(data, codebook)
+            assign = (time.time() - start) / arguments.repeat
+            backend.close()
+            if single is None:
+                single = (epoch, assign)
+            print("{:<8} {:>8d} {:>12.3f} {:>9.2f}x {:>12.3f} {:>9.2f}x".format(
+                pool_type, workers, epoch, single[0] / epoch, assign, single[1] / assign))
+
+
+if __name__ == "__main__":
+    main()
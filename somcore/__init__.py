@@ -0,0 +1,9 @@
+# -*- coding: utf8 -*-
+
+"""
+somcore - in-process building blocks of the SOM-Toolbox
+
+The modules of this package replace the external executables used by
+SOM_Clustering.py and run with plain NumPy (and GDAL where available), so
+the processing chain also runs outside of ArcMap.
+"""
@@ -0,0 +1,87 @@
+# -*- coding: utf8 -*-
+
+"""
+Best matching unit (BMU) search of data rows against a codebook.
+
+The data is processed in chunks of rows; the squared distances of a chunk to
+all codebook vectors are |x|^2 - 2 x.W^T + |w|^2, with the matrix product
+done by BLAS. |x|^2 doesn't change the BMU and is only added for the
+distance of the BMU itself.
+"""
+
+import numpy as np
+
+# elements of the distance matrix (data rows x nodes) computed at once
+CHUNK_ELEMENTS = 1 << 22
+
+
+# data rows per chunk so that the distance matrix stays at chunk_elements
+def chunk_rows(nodes, chunk_elements=CHUNK_ELEMENTS):
+    return max(1, chunk_elements // nodes)
+
+
+# yields (first row, float32 copy of the rows) for all chunks of the data
+def iter_chunks(data, nodes, chunk_elements=CHUNK_ELEMENTS):
+    step = chunk_rows(nodes, chunk_elements)
+    for start in range(0, data.shape[0], step):
+        yield start, np.ascontiguousarray(data[start:start + step], dtype=np.float32)
+
+
+# BMU of every row of a chunk, without |x|^2
+def _chunk_bmus(chunk, codebook, codebook_norms):
+    products = np.dot(chunk, codebook.T)
+    products *= -2.0
+    products += codebook_norms
+    best = products.argmin(axis=1)
+    return best, products[np.arange(chunk.shape[0]), best]
+
+
+# best matching unit and squared distance of every data row
+def best_matching_units(data, codebook, chunk_elements=CHUNK_ELEMENTS):
+    codebook = np.asarray(codebook, dtype=np.float32)
+    codebook_norms = (codebook * codebook).sum(axis=1)
+    bmus = np.empty(data.shape[0], dtype=np.int32)
+    distances = np.empty(data.shape[0], dtype=np.float32)
+    for start, chunk in iter_chunks(data, codebook.shape[0], chunk_elements):
+        stop = start + chunk.shape[0]
+        bmus[start:stop], distances[start:stop] = _chunk_bmus(chunk, codebook, codebook_norms)
+        distances[start:stop] += (chunk * chunk).sum(axis=1)
+    np.maximum(distances, 0.0, out=distances)
+    return bmus, distances
+
+
+# best and second best matching unit and squared distance to the best of every data row
+def best_two_units(data, codebook, chunk_elements=CHUNK_ELEMENTS):
+    codebook = np.asarray(codebook, dtype=np.float32)
+    codebook_norms = (codebook * codebook).sum(axis=1)
+    first = np.empty(data.shape[0], dtype=np.int32)
+    second = np.empty(data.shape[0], dtype=np.int32)
+    distances = np.empty(data.shape[0], dtype=np.float32)
+    for start, chunk in iter_chunks(data, codebook.shape[0], chunk_elements):
+        stop = start + chunk.shape[0]
+        products = np.dot(chunk, codebook.T)
+        products *= -2.0
+        products += codebook_norms
+        rows = np.arange(chunk.shape[0])
+        best = products.argmin(axis=1)
+        first[start:stop] = best
+        distances[start:stop] = products[rows, best] + (chunk * chunk).sum(axis=1)
+        products[rows, best] = np.inf
+        second[start:stop] = products.argmin(axis=1)
+    np.maximum(distances, 0.0, out=distances)
+    return first, second, distances
+
+
+# sums of the data rows and number of hits per best matching unit
+def node_sums(data, codebook, chunk_elements=CHUNK_ELEMENTS):
+    nodes = codebook.shape[0]
+    codebook = np.asarray(codebook, dtype=np.float32)
+    codebook_norms = (codebook * codebook).sum(axis=1)
+    sums = np.zeros((nodes, data.shape[1]), dtype=np.float64)
+    hits = np.zeros(nodes, dtype=np.float64)
+    for _, chunk in iter_chunks(data, nodes, chunk_elements):
+        best, _ = _chunk_bmus(chunk, codebook, codebook_norms)
+        hits += np.bincount(best, minlength=nodes)
+        for dimension in range(chunk.shape[1]):
+            sums[:, dimension] += np.bincount(best, weights=chunk[:, dimension], minlength=nodes)
+    return sums, hits
@@ -0,0 +1,143 @@
+# -*- coding: utf8 -*-
+
+"""
+Content-addressed cache of pipeline artifacts (mask, training data, SOM).
+
+An entry is stored under the hash of everything its stage depends on (input
+raster paths, modification times and extents, parameters) and holds copies
+of the stage's output files. The index 'cache.json' records the size and the
+last use of every entry. Before an entry is stored the least recently used
+entries are deleted until it fits; outputs larger than the whole cache are
+not copied at all.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from os.path import exists, isdir, join
+
+# size of the cache in bytes
+CACHE_SIZE = 2 << 30
+
+# name of the index file in the cache folder
+INDEX_FILE = "cache.json"
+
+
+# hash of any JSON-serializable description of the inputs of a stage
+def cache_key(*parts):
+    text = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode("utf8")).hexdigest()
+
+
+# latest modification time of a file or folder (ESRI GRIDs are folders); paths inside
+# a geodatabase fall back to the geodatabase folder
+def modification_time(path):
+    while path and not exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+    if not path:
+        return None
+    if not isdir(path):
+        return os.path.getmtime(path)
+    latest = os.path.getmtime(path)
+    for folder, _, files in os.walk(path):
+        for name in files:
+            latest = max(latest, os.path.getmtime(join(folder, name)))
+    return latest
+
+
+# bytes of a file or folder
+def path_size(path):
+    if not isdir(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(join(folder, name)) for folder, _, files in os.walk(path) for name in files)
+
+
+# bytes of the outputs ({name: path}) found on disk
+def outputs_size(outputs):
+    return sum(path_size(path) for path in outputs.values() if exists(path))
+
+
+# copies a file or folder
+def copy_path(source, destination):
+    if exists(destination):
+        remove_path(destination)
+    if isdir(source):
+        shutil.copytree(source, destination)
+    else:
+        shutil.copy2(source, destination)
+
+
+def remove_path(path):
+    if isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif exists(path):
+        os.remove(path)
+
+
+class ArtifactCache(object):
+    def __init__(self, folder, size=CACHE_SIZE, log=None):
+        self.folder = folder
+        self.size = size
+        self.log = log or (lambda message: None)
+        if not isdir(folder):
+            os.makedirs(folder)
+        self.index_file = join(folder, INDEX_FILE)
+        self.index = {}
+        if exists(self.index_file):
+            with open(self.index_file) as index_file:
+                self.index = json.load(index_file)
+
+    def save_index(self):
+        with open(self.index_file, "w") as index_file:
+            json.dump(self.index, index_file, indent=2, sort_keys=True)
+
+    # copies the outputs ({name: path}) of a cached stage back; False if the key is not cached
+    def fetch(self, stage, key, outputs, copy=copy_path):
+        entry = self.index.get(key)
+        folder = join(self.folder, key)
+        if entry is None or not all(exists(join(folder, name)) for name in outputs):
+            self.log("Cache miss for stage '{}' ({}).".format(stage, key[:12]))
+            return False
+        for name, path in outputs.items():
+            copy(join(folder, name), path)
+        entry["used"] = time.time()
+        self.save_index()
+        self.log("Cache hit for stage '{}' ({}), reusing the earlier result.".format(stage, key[:12]))
+        return True
+
+    # stores the outputs ({name: path}) of a stage, after evicting the least recently used entries
+    # to make room for them; False if they are larger than the cache
+    def store(self, stage, key, outputs, copy=copy_path):
+        size = outputs_size(outputs)
+        if size > self.size:
+            self.log("The outputs of stage '{}' ({} MB) don't fit into the cache, they are not cached.".format(
+                stage, size // 2 ** 20))
+            return False
+        self.index.pop(key, None)
+        self.evict(self.size - size)
+        folder = join(self.folder, key)
+        remove_path(folder)
+        os.makedirs(folder)
+        for name, path in outputs.items():
+            copy(path, join(folder, name))
+        self.index[key] = {"stage": stage, "size": path_size(folder), "used": time.time()}
+        self.evict()
+        self.save_index()
+        return True
+
+    # deletes entries, least recently used first, until the cache holds at most 'size' bytes
+    def evict(self, size=None):
+        size = self.size if size is None else size
+        total = sum(entry["size"] for entry in self.index.values())
+        for key in sorted(self.index, key=lambda key: self.index[key]["used"]):
+            if total <= size:
+                break
+            total -= self.index[key]["size"]
+            self.log("Cache full, removing stage '{}' ({}).".format(self.index[key]["stage"], key[:12]))
+            remove_path(join(self.folder, key))
+            del self.index[key]
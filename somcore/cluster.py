@@ -0,0 +1,181 @@
+# -*- coding: utf8 -*-
+
+"""
+k-means clustering of the SOM codebook.
+
+For every number of clusters from number_min to number_max k-means is run
+'number' times from different initial means (k-means++). The labels of the
+run with the smallest Davies-Bouldin index are kept. Every run draws its
+initial means from its own seed, so the runs don't depend on each other and
+the numbers of clusters are swept in parallel with the same result.
+
+All runs share the codebook norms and the distance columns of the codebook
+vectors picked by k-means++. The Davies-Bouldin index is computed from the
+distances of the last assignment step. With warm_start the runs for k start
+from their solution for k - 1 plus one more k-means++ center; this is faster
+but gives other labels than the default sweep.
+"""
+
+import numpy as np
+
+from somcore import parallel
+
+# iterations of one k-means run
+MAX_ITERATIONS = 300
+
+# a run stops when the centers move less than this (relative to the data variance)
+TOLERANCE = 1e-4
+
+# seed of the initial means
+SEED = 0
+
+
+# squared euclidean distances (len(a) x len(b))
+def squared_distances(a, b):
+    distances = (a * a).sum(axis=1)[:, np.newaxis] - 2.0 * np.dot(a, b.T) + (b * b).sum(axis=1)[np.newaxis, :]
+    return np.maximum(distances, 0.0)
+
+
+# codebook with everything the runs of a sweep share
+class SharedCodebook(object):
+    def __init__(self, codebook):
+        self.data = np.asarray(codebook, dtype=np.float64)
+        self.norms = (self.data * self.data).sum(axis=1)
+        self.threshold = TOLERANCE * self.data.var(axis=0).mean()
+        self.columns = {}
+
+    @property
+    def size(self):
+        return self.data.shape[0]
+
+    # squared distances of all codebook vectors to vector 'index', computed once per sweep
+    def column(self, index):
+        if index not in self.columns:
+            products = np.dot(self.data, self.data[[index]].T)[:, 0]
+            self.columns[index] = np.maximum(self.norms - 2.0 * products + self.norms[index], 0.0)
+        return self.columns[index]
+
+    # squared distances of all codebook vectors to the centers (size x k)
+    def distances(self, centers):
+        distances = self.norms[:, np.newaxis] - 2.0 * np.dot(self.data, centers.T)
+        distances += (centers * centers).sum(axis=1)[np.newaxis, :]
+        return np.maximum(distances, 0.0)
+
+
+# index of the next initial mean by the k-means++ rule; 'closest' are the squared distances to the chosen ones
+def next_mean(shared, closest, random_state):
+    total = closest.sum()
+    if total > 0:
+        index = int(np.searchsorted(np.cumsum(closest), random_state.random_sample() * total))
+    else:
+        index = random_state.randint(shared.size)
+    return min(index, shared.size - 1)
+
+
+# initial means by k-means++
+def initial_means(shared, k, random_state):
+    index = [random_state.randint(shared.size)]
+    closest = shared.column(index[0])
+    for _ in range(1, k):
+        index.append(next_mean(shared, closest, random_state))
+        closest = np.minimum(closest, shared.column(index[-1]))
+    return shared.data[index].copy()
+
+
+# Lloyd's k-means from the given initial means, returns labels, centers and the squared distances to them
+def kmeans(shared, centers, max_iterations=MAX_ITERATIONS):
+    centers = centers.copy()
+    k = centers.shape[0]
+    previous = None
+    for _ in range(max_iterations):
+        distances = shared.distances(centers)
+        labels = distances.argmin(axis=1)
+        if previous is not None and (labels == previous).all():
+            return labels, centers, distances                   # the centers wouldn't move any more
+        previous = labels
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centers)
+        for dimension in range(shared.data.shape[1]):
+            sums[:, dimension] = np.bincount(labels, weights=shared.data[:, dimension], minlength=k)
+        filled = counts > 0                                     # empty clusters keep their center
+        new_centers = centers.copy()
+        new_centers[filled] = sums[filled] / counts[filled, np.newaxis]
+        shift = ((new_centers - centers) ** 2).sum()
+        centers = new_centers
+        if shift <= shared.threshold:
+            break
+    distances = shared.distances(centers)
+    return distances.argmin(axis=1), centers, distances
+
+
+# Davies-Bouldin index of a clustering (smaller is better) from the squared distances to the centers
+def davies_bouldin(labels, centers, distances):
+    used = np.unique(labels)
+    if len(used) < 2:
+        return np.inf
+    spread = np.sqrt(distances[np.arange(len(labels)), labels])
+    labels = np.searchsorted(used, labels)
+    scatter = np.bincount(labels, weights=spread) / np.bincount(labels)
+    centers = centers[used]
+    separation = np.sqrt(squared_distances(centers, centers))
+    np.fill_diagonal(separation, np.inf)
+    ratio = (scatter[:, np.newaxis] + scatter[np.newaxis, :]) / separation
+    return ratio.max(axis=1).mean()
+
+
+# seeds of all runs: one row per number of clusters, one column per initialization
+def run_seeds(seed, cluster_numbers, number):
+    return np.random.RandomState(seed).randint(2 ** 31 - 1, size=(len(cluster_numbers), number))
+
+
+# numbers of clusters tried for a codebook
+def cluster_numbers(size, number_min, number_max):
+    return list(range(max(2, number_min), min(number_max, size - 1) + 1))
+
+
+# best (score, labels) of the runs for one number of clusters
+def _sweep_k(task):
+    shared, k, seeds = task
+    best = (np.inf, None)
+    for run_seed in seeds:
+        labels, centers, distances = kmeans(shared, initial_means(shared, k, np.random.RandomState(run_seed)))
+        score = davies_bouldin(labels, centers, distances)
+        if best[1] is None or score < best[0]:
+            best = (score, labels)
+    return best
+
+
+# (score, labels) for every number of clusters of one run started from the solution for k - 1
+def _sweep_warm(task):
+    shared, numbers, run_seed = task
+    random_state = np.random.RandomState(run_seed)
+    labels, centers, distances = kmeans(shared, initial_means(shared, numbers[0], random_state))
+    results = [(davies_bouldin(labels, centers, distances), labels)]
+    for _ in numbers[1:]:
+        closest = distances[np.arange(shared.size), labels]     # squared distances to the k - 1 centers
+        centers = np.vstack((centers, shared.data[[next_mean(shared, closest, random_state)]]))
+        labels, centers, distances = kmeans(shared, centers)
+        results.append((davies_bouldin(labels, centers, distances), labels))
+    return results
+
+
+# cluster label of every codebook vector; without k-means every node is its own cluster
+def cluster_codebook(codebook, number, number_min, number_max, seed=SEED, workers=1, pool_type="thread",
+                     warm_start=False):
+    shared = SharedCodebook(codebook)
+    numbers = cluster_numbers(shared.size, number_min, number_max)
+    if number < 1 or not numbers:
+        return np.arange(shared.size)
+    seeds = run_seeds(seed, numbers, number)
+    if warm_start:
+        runs = parallel.map_tasks(_sweep_warm, [(shared, numbers, run_seed) for run_seed in seeds[0]],
+                                  workers, pool_type)
+        results = [run[i] for i in range(len(numbers)) for run in runs]
+    else:
+        results = parallel.map_tasks(_sweep_k, [(shared, k, seeds[i]) for i, k in enumerate(numbers)],
+                                     workers, pool_type)
+    best_score, best_labels = results[0]
+    for score, labels in results[1:]:                           # first of equal scores, like a serial sweep
+        if score < best_score:
+            best_score, best_labels = score, labels
+    return best_labels
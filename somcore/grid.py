@@ -0,0 +1,93 @@
+# -*- coding: utf8 -*-
+
+"""
+Geometry of the SOM grid.
+
+Nodes are numbered row by row (node = som_y * som_x_dimension + som_x), like
+the codebook of somoclu. On hexagonal grids odd rows are shifted by half a
+cell and rows are sqrt(3)/2 apart, so all direct neighbours are at distance
+1. Toroid maps wrap around in both directions.
+
+The direct neighbours of every node are listed in an index table (4 columns
+on rectangular grids, 6 on hexagonal ones, -1 pads nodes at the border), so
+per-node statistics like the U-matrix need no distance matrix.
+"""
+
+import numpy as np
+
+# vertical distance of two rows of a hexagonal grid
+HEX_ROW_HEIGHT = np.sqrt(3.0) / 2.0
+
+
+class Grid(object):
+    def __init__(self, som_x, som_y, map_type="planar", grid_type="rectangular"):
+        self.som_x = int(som_x)
+        self.som_y = int(som_y)
+        self.map_type = map_type
+        self.grid_type = grid_type
+        self.size = self.som_x * self.som_y
+        self.x = np.tile(np.arange(self.som_x), self.som_y)
+        self.y = np.repeat(np.arange(self.som_y), self.som_x)
+        positions = np.column_stack((self.x, self.y)).astype(np.float64)
+        period = np.array([self.som_x, self.som_y], dtype=np.float64)
+        if grid_type == "hexagonal":
+            positions[:, 0] += 0.5 * (self.y % 2)
+            positions[:, 1] *= HEX_ROW_HEIGHT
+            period[1] *= HEX_ROW_HEIGHT
+        self.positions = positions
+        self.period = period
+        self._neighbours = None
+
+    @property
+    def toroid(self):
+        return self.map_type == "toroid"
+
+    # map distances (len(nodes) x size) of the given nodes to all nodes
+    def distances(self, nodes=None):
+        if nodes is None:
+            nodes = np.arange(self.size)
+        difference = np.abs(self.positions[nodes, np.newaxis, :] - self.positions[np.newaxis, :, :])
+        if self.toroid:
+            difference = np.minimum(difference, self.period - difference)
+        return np.sqrt((difference ** 2).sum(axis=2))
+
+    # map distances between the nodes a[i] and b[i]
+    def pair_distances(self, a, b):
+        difference = np.abs(self.positions[a] - self.positions[b])
+        if self.toroid:
+            difference = np.minimum(difference, self.period - difference)
+        return np.sqrt((difference ** 2).sum(axis=1))
+
+    # True where the nodes a[i] and b[i] are direct neighbours (or the same node)
+    def adjacent(self, a, b):
+        return self.pair_distances(a, b) <= 1.0 + 1e-6
+
+    # (size x 4 or 6) index table of the direct neighbours of every node, padded with -1;
+    # the candidates are the 8 surrounding cells (wrapped on toroids), kept if at distance 1
+    def neighbours(self):
+        if self._neighbours is None:
+            candidates = []
+            for dy in (-1, 0, 1):
+                for dx in (-1, 0, 1):
+                    if dx == 0 and dy == 0:
+                        continue
+                    x, y = self.x + dx, self.y + dy
+                    if self.toroid:
+                        candidates.append(self.node(x % self.som_x, y % self.som_y))
+                    else:
+                        inside = (x >= 0) & (x < self.som_x) & (y >= 0) & (y < self.som_y)
+                        candidates.append(np.where(inside, self.node(x, y), -1))
+            table = np.column_stack(candidates)
+            nodes = np.repeat(np.arange(self.size), table.shape[1])
+            distances = self.pair_distances(nodes, np.maximum(table.ravel(), 0)).reshape(table.shape)
+            table[(table < 0) | (distances <= 0) | (distances > 1.0 + 1e-6)] = -1
+            # small toroids reach a node from two sides; every neighbour is listed once
+            table.sort(axis=1)
+            table[:, 1:][table[:, 1:] == table[:, :-1]] = -1
+            table = -np.sort(-table, axis=1)
+            self._neighbours = table[:, :6 if self.grid_type == "hexagonal" else 4]
+        return self._neighbours
+
+    # node numbers of the (som_x, som_y) coordinates
+    def node(self, som_x, som_y):
+        return np.asarray(som_y) * self.som_x + np.asarray(som_x)
@@ -0,0 +1,135 @@
+# -*- coding: utf8 -*-
+
+"""
+Loads the result rasters into the current ArcMap map.
+
+The layers are grouped like this (with the group layer 'EmptyLayer.lyr'; without it
+they are added ungrouped):
+
+    Geospace Data       Geo Cluster, Quantization Error, BMU Data (the band rasters)
+    SOM Space Data      SOM Cluster, U-Matrix, BMU Data (the band rasters)
+
+The SOM space layers get the symbology of 'ColorSource.lyr', which is loaded
+once. All layers are added first and the view and the table of contents are
+refreshed once at the end. With summary_only the map gets only the cluster,
+quantization error and U-matrix layers; no layer is created for the band
+rasters, they are left in the result folders to be added when needed. Their
+paths are returned, the Python toolbox passes them on as its derived output
+'band_rasters'.
+The result folders hold ESRI GRIDs or GeoTIFFs (result format 'gtiff'); the
+files GDAL and ArcMap write next to a GeoTIFF are not layers.
+
+The mapping API (arcpy.mapping), the refresh and the listing of the result
+folders are passed in, so the grouping runs against a mock as well (see
+benchmarks/arcpy_stub.py).
+"""
+
+from collections import namedtuple
+from os.path import join
+
+# summary rasters of the result folders and their layer names
+GEO_SUMMARY = [("Geo_cluster", "Geo Cluster"), ("quant_error", "Quantization Error")]
+SOM_SUMMARY = [("SOM_cluster", "SOM Cluster"), ("umatrix", "U-Matrix")]
+
+# extension of GeoTIFF results and of the files written next to rasters (statistics, metadata, overviews)
+GEOTIFF_EXTENSION = ".tif"
+SIDECAR_EXTENSIONS = (".aux.xml", ".tif.xml", ".ovr", ".tfw")
+
+# group of result layers: its summary rasters [(file, layer name)] and band rasters [file] in a folder
+ResultGroup = namedtuple("ResultGroup", ["name", "description", "folder", "summary", "bands", "symbolized"])
+
+
+# band rasters of a result folder: all files but the summary rasters, the 'info' folder of GRIDs,
+# layer files and the files next to GeoTIFFs
+def band_files(files, summary):
+    skipped = set(name.lower() for name, _ in summary) | set(["info"])
+    skipped |= set(name.lower() + GEOTIFF_EXTENSION for name, _ in summary)
+    return [name for name in files
+            if name.lower() not in skipped and not name.lower().endswith(SIDECAR_EXTENSIONS + (".lyr",))]
+
+
+# summary rasters [(file, layer name)] of a result folder, GeoTIFFs where the folder holds them
+def summary_files(files, summary):
+    geotiffs = set(name.lower() for name in files if name.lower().endswith(GEOTIFF_EXTENSION))
+    return [(name + GEOTIFF_EXTENSION if (name + GEOTIFF_EXTENSION).lower() in geotiffs else name, layer_name)
+            for name, layer_name in summary]
+
+
+# the groups of the geospace and the SOM space results; list_files(folder) lists a result folder
+def result_groups(geo_folder, som_folder, list_files):
+    geo_files, som_files = list_files(geo_folder), list_files(som_folder)
+    return [ResultGroup("Geospace Data", "This is a group layer of geospace results.", geo_folder,
+                        summary_files(geo_files, GEO_SUMMARY), band_files(geo_files, GEO_SUMMARY), False),
+            ResultGroup("SOM Space Data", "This is a group layer of SOM-space results.", som_folder,
+                        summary_files(som_files, SOM_SUMMARY), band_files(som_files, SOM_SUMMARY), True)]
+
+
+class ResultLoader(object):
+    def __init__(self, mapping, refresh, empty_layer, color_source, map_document="CURRENT"):
+        self.mapping = mapping
+        self.refresh = refresh
+        self.empty_layer = empty_layer                      # None: the layers are not grouped
+        self.color_source = color_source
+        self.document = mapping.MapDocument(map_document)
+        self.frame = self.document.activeDataFrame
+        self._symbology = None
+
+    # symbology template of the SOM space layers, loaded once
+    def symbology(self):
+        if self._symbology is None:
+            self._symbology = self.mapping.Layer(self.color_source)
+        return self._symbology
+
+    def layer(self, path, name=None, symbolized=False):
+        layer = self.mapping.Layer(path)
+        if name is not None:
+            layer.name = name
+        if symbolized:
+            self.mapping.UpdateLayer(self.frame, layer, self.symbology())
+        return layer
+
+    # adds layers to the map or to a group layer in it
+    def add(self, layers, group=None):
+        for layer in layers:
+            if group is None:
+                self.mapping.AddLayer(self.frame, layer, "BOTTOM")
+            else:
+                self.mapping.AddLayerToGroup(self.frame, group, layer, "BOTTOM")
+
+    # empty group layer added to the map or to a group layer in it
+    def group(self, name, description, parent=None):
+        empty = self.mapping.Layer(self.empty_layer)
+        self.add([empty], parent)
+        group = self.mapping.ListLayers(self.document, empty, self.frame)[0]
+        group.name = name
+        group.description = description
+        return group
+
+    # adds the result groups and refreshes the map once; with summary_only the band rasters are left out,
+    # returns their paths
+    def load(self, groups, summary_only=False):
+        left_out = []
+        for result in groups:
+            summary = [self.layer(join(result.folder, name), layer_name, result.symbolized)
+                       for name, layer_name in result.summary]
+            bands = []
+            if summary_only:
+                left_out.extend(join(result.folder, name) for name in result.bands)
+            else:
+                bands = [self.layer(join(result.folder, name), None, result.symbolized) for name in result.bands]
+            if self.empty_layer is None:
+                self.add(summary + bands)
+                continue
+            parent = self.group(result.name, result.description)
+            self.add(summary, parent)
+            if bands:
+                self.add(bands, self.group("BMU Data", "This is a group layer of input rasters", parent))
+        self.refresh()
+        return left_out
+
+
+# loads the results of the geospace and the SOM space folders into the current map
+def load_results(mapping, refresh, list_files, empty_layer, color_source, geo_folder, som_folder,
+                 summary_only=False):
+    loader = ResultLoader(mapping, refresh, empty_layer, color_source)
+    return loader.load(result_groups(geo_folder, som_folder, list_files), summary_only)
@@ -0,0 +1,354 @@
+# -*- coding: utf8 -*-
+
+"""
+Creates the SOM training data ('SOM.lrn') from a mask and the input rasters.
+
+The rasters are read block by block, giving one float32 row per valid mask
+cell and one column per input raster. The text output is written block by
+block as it is read and is byte-identical to the one of
+Run_CreateSOMLrnFile.exe:
+
+    %<number of rows>
+    %<number of columns>
+    %   9   0   0   0   1 ...            (column types, tab separated)
+    ID  X   Y   Z   <raster name><band number> ...
+    0   <column> <row> 0   <value> ...
+
+Values are formatted like .NET's Double.ToString() (15 significant digits,
+exact ties rounded away from zero) and lines end with CR LF.
+
+Alternatively the rows are gathered into one matrix and stored in binary
+form, which needs no parsing:
+
+    SOM.npy         float32 matrix (cells x bands), column-major, memory-mappable
+    SOM_cells.npy   int32 (cells x 2) raster row and column of every matrix row
+    SOM.json        header with band names, cell index file and nodata policy
+
+With a normalization the band statistics are gathered while the blocks are
+read and the data is normalized before it is written (somcore.normalize); the
+text output then reads the rasters twice, the statistics before any block is
+written. The method, its parameters and the statistics go to
+'<training data>_normalization.json'.
+"""
+
+import decimal
+import io
+import itertools
+import json
+import os
+import sys
+from collections import namedtuple
+
+import numpy as np
+
+from somcore import normalize
+from somcore.mask import index_blocks, valid_index
+from somcore.raster import BLOCK_ROWS, iter_blocks, open_raster, valid_cells
+
+# number of data rows formatted and written at once
+WRITE_ROWS = 20000
+
+# file name extension of each training data format
+INPUT_FORMATS = {"lrn": ".lrn", "npy": ".npy"}
+
+# how cells without data in any input raster are handled
+NODATA_POLICY = "drop"
+
+# data rows read at once when the training data is streamed
+STREAM_ROWS = 100000
+
+# data: (cells x bands) matrix, rows/cols: raster position of every matrix row
+TrainingData = namedtuple("TrainingData", ["data", "rows", "cols", "names"])
+
+
+# column names as written by Run_CreateSOMLrnFile.exe: file name + band number
+def column_names(rasters):
+    return ["{}{}".format(raster.name, i + 1) for i, raster in enumerate(rasters)]
+
+
+# counts the valid cells of the mask
+def count_valid(mask, block_rows=BLOCK_ROWS):
+    count = 0
+    for _, block in iter_blocks(mask, block_rows):
+        count += int(np.count_nonzero(valid_cells(block, mask.nodata)))
+    return count
+
+
+# opened mask and input rasters and the flat index of the valid cells; the index saved with
+# the mask (somcore.mask) saves the pass over the mask raster
+def open_inputs(mask, rasters, block_rows=BLOCK_ROWS, index=None):
+    mask = open_raster(mask)
+    rasters = [open_raster(raster) for raster in rasters]
+    for raster in rasters:
+        if raster.shape != mask.shape:
+            raise ValueError("Raster '{}' does not match the grid of the mask.".format(raster.name))
+    if index is None:
+        index = valid_index(mask, block_rows)
+    return mask, rasters, index
+
+
+# yields the training data of the valid mask cells block by block, with the number of its first row;
+# the rows are row-major like the pixel block cursor of the .NET tool
+def training_blocks(mask, rasters, index, block_rows=BLOCK_ROWS, dtype=np.float32):
+    names = column_names(rasters)
+    for row, nrows, start, stop, cells in index_blocks(index, mask.shape, block_rows):
+        if start == stop:
+            continue
+        data = np.empty((stop - start, len(rasters)), dtype=dtype, order="F")
+        for band, raster in enumerate(rasters):
+            data[:, band] = raster.read_rows(row, nrows).reshape(-1)[cells]
+        block_index = index[start:stop]
+        yield start, TrainingData(data, np.asarray(block_index // mask.shape[1], dtype=np.int32),
+                                  np.asarray(block_index % mask.shape[1], dtype=np.int32), names)
+
+
+# reads the input rasters at the valid mask cells into one matrix. The blocks are added to
+# the band statistics (normalize.BandStatistics) if given.
+def build_training_matrix(mask, rasters, block_rows=BLOCK_ROWS, dtype=np.float32, index=None, statistics=None):
+    mask, rasters, index = open_inputs(mask, rasters, block_rows, index)
+    count = len(index)
+    data = np.empty((count, len(rasters)), dtype=dtype, order="F")
+    rows = np.asarray(index // mask.shape[1], dtype=np.int32)
+    cols = np.asarray(index % mask.shape[1], dtype=np.int32)
+    for start, block in training_blocks(mask, rasters, index, block_rows, dtype):
+        data[start:start + len(block.data)] = block.data
+        if statistics is not None:
+            statistics.add(block.data)
+    return TrainingData(data, rows, cols, column_names(rasters))
+
+
+# header lines of the lrn file
+def lrn_header(count, names):
+    return ["%{}".format(count),
+            "%{}".format(len(names) + 4),
+            "%\t9\t0\t0\t0" + "\t1" * len(names),
+            "ID\tX\tY\tZ" + "".join("\t" + name for name in names)]
+
+
+# .NET context: 15 significant digits, ties away from zero
+NET_CONTEXT = decimal.Context(prec=15, rounding=decimal.ROUND_HALF_UP)
+
+
+# value of x rounded to 15 significant digits the way .NET does it
+def net_round(x):
+    return float(NET_CONTEXT.plus(decimal.Decimal(x)))
+
+
+# exact product of two float arrays as sum hi + lo (Dekker)
+def _two_product(a, b):
+    hi = a * b
+    a_split = 134217729.0 * a
+    a_hi = a_split - (a_split - a)
+    a_lo = a - a_hi
+    b_split = 134217729.0 * b
+    b_hi = b_split - (b_split - b)
+    b_lo = b - b_hi
+    lo = ((a_hi * b_hi - hi) + a_hi * b_lo + a_lo * b_hi) + a_lo * b_lo
+    return hi, lo
+
+
+# Python rounds exact ties at the 15th digit to even, .NET away from zero;
+# values where this differs are replaced by the decimal .NET prints
+def round_ties_away(values):
+    values = np.array(values, dtype=np.float64, order="C")
+    flat = values.reshape(-1)                               # a view, the training data is column-major
+    magnitude = np.abs(flat)
+    index = np.nonzero(np.isfinite(magnitude) & (magnitude > 0))[0]
+    magnitude = magnitude[index]
+    exponent = 14 - np.floor(np.log10(magnitude))
+    for _ in range(2):                                      # log10 may be off by one
+        scaled = magnitude * 10.0 ** exponent
+        exponent[scaled >= 1e15] -= 1
+        exponent[scaled < 1e14] += 1
+    exact = (exponent >= 0) & (exponent <= 22)              # 10**exponent is exact
+    for i in index[~exact]:
+        flat[i] = net_round(flat[i])
+    index, magnitude, exponent = index[exact], magnitude[exact], exponent[exact]
+    power = 10.0 ** exponent
+    hi, lo = _two_product(magnitude, power)
+    integer = np.floor(hi)
+    tie = ((hi - integer) + lo == 0.5) & (integer % 2 == 0)
+    flat[index[tie]] = np.copysign((integer[tie] + 1) / power[tie], flat[index[tie]])
+    return values
+
+
+# formats a block of rows in one go; ids, cols and rows go into the first three columns
+def format_rows(first_id, rows, cols, values):
+    count, bands = values.shape
+    table = np.empty((count, bands + 3), dtype=np.float64)
+    table[:, 0] = np.arange(first_id, first_id + count)
+    table[:, 1] = cols
+    table[:, 2] = rows
+    table[:, 3:] = round_ties_away(values)
+    table[:, 3:] += 0.0                                     # .NET prints negative zero as '0'
+    line = "%d\t%d\t%d\t0" + "\t%.15G" * bands + "\r\n"
+    text = (line * count) % tuple(table.ravel().tolist())
+    if not np.isfinite(values).all():
+        text = text.replace("NAN", "NaN").replace("INF", "Infinity")
+    return text
+
+
+# writes training data given in blocks ((first row, TrainingData) pairs) as text lrn file
+def write_lrn_blocks(path, count, names, blocks, write_rows=WRITE_ROWS):
+    with io.open(path, "wb") as lrn_file:
+        lrn_file.write(("\r\n".join(lrn_header(count, names)) + "\r\n").encode("utf8"))
+        for first_id, block in blocks:
+            for start in range(0, len(block.data), write_rows):
+                stop = start + write_rows
+                lrn_file.write(format_rows(first_id + start,
+                                           block.rows[start:stop],
+                                           block.cols[start:stop],
+                                           block.data[start:stop]).encode("ascii"))
+    return path
+
+
+# writes the training data as text lrn file
+def write_lrn(path, training, write_rows=WRITE_ROWS):
+    return write_lrn_blocks(path, training.data.shape[0], training.names, [(0, training)], write_rows)
+
+
+# file names belonging to the binary training data
+def binary_files(path):
+    base = os.path.splitext(path)[0]
+    return path, base + "_cells.npy", base + ".json"
+
+
+# writes the training data in binary form
+def write_npy(path, training, nodata_policy=NODATA_POLICY):
+    path, cells_file, header_file = binary_files(path)
+    np.save(path, np.asfortranarray(training.data))
+    np.save(cells_file, np.column_stack((training.rows, training.cols)).astype(np.int32))
+    header = {"shape": list(training.data.shape),
+              "dtype": str(training.data.dtype),
+              "bands": list(training.names),
+              "cell_index": {"file": os.path.basename(cells_file), "columns": ["Y", "X"]},
+              "nodata_policy": nodata_policy}
+    with open(header_file, "w") as json_file:
+        json.dump(header, json_file, indent=2)
+    return path
+
+
+# data columns, their names and the X and Y columns from the header lines of a lrn file
+def lrn_columns(header):
+    types = header[2].split("\t")[1:]
+    names = header[3].split("\t")
+    data_columns = [i for i, column_type in enumerate(types) if column_type == "1"]
+    return data_columns, [names[i] for i in data_columns], names.index("X"), names.index("Y")
+
+
+# training data of a float64 table of lrn rows: float32 data, int32 positions (float32 would round
+# positions from 2^24 on)
+def lrn_table(table, columns):
+    data_columns, names, x_column, y_column = columns
+    return TrainingData(np.asfortranarray(table[:, data_columns], dtype=np.float32),
+                        table[:, y_column].astype(np.int32),
+                        table[:, x_column].astype(np.int32),
+                        names)
+
+
+# reads a text lrn file (compatibility path) into one float32 matrix, parsing STREAM_ROWS rows at once
+def read_lrn(path, rows=STREAM_ROWS):
+    count, names = training_info(path)
+    data = np.empty((count, len(names)), dtype=np.float32, order="F")
+    positions = np.empty((count, 2), dtype=np.int32)
+    start = 0
+    for part in stream_training_data(path, rows):
+        stop = start + part.data.shape[0]
+        data[start:stop] = part.data
+        positions[start:stop, 0] = part.rows
+        positions[start:stop, 1] = part.cols
+        start = stop
+    return TrainingData(data[:start], positions[:start, 0], positions[:start, 1], names)
+
+
+# opens binary training data without copying it into memory
+def read_npy(path, mmap_mode="r"):
+    path, cells_file, header_file = binary_files(path)
+    with open(header_file) as json_file:
+        header = json.load(json_file)
+    cells = np.load(cells_file, mmap_mode=mmap_mode)
+    return TrainingData(np.load(path, mmap_mode=mmap_mode), cells[:, 0], cells[:, 1], header["bands"])
+
+
+# reads training data in any of the supported formats
+def read_training_data(path, mmap_mode="r"):
+    if path.lower().endswith(INPUT_FORMATS["npy"]):
+        return read_npy(path, mmap_mode)
+    return read_lrn(path)
+
+
+# number of rows and band names of a training data file, without reading the data
+def training_info(path):
+    if path.lower().endswith(INPUT_FORMATS["npy"]):
+        with open(binary_files(path)[2]) as json_file:
+            header = json.load(json_file)
+        return header["shape"][0], header["bands"]
+    with io.open(path, "r", encoding="utf8") as lrn_file:
+        header = [lrn_file.readline().rstrip("\r\n") for _ in range(4)]
+    return int(header[0][1:]), lrn_columns(header)[1]
+
+
+# yields the training data of a file in parts of at most 'rows' rows, only one part is held in memory
+def stream_training_data(path, rows=STREAM_ROWS):
+    if path.lower().endswith(INPUT_FORMATS["npy"]):
+        training = read_npy(path)
+        for start in range(0, training.data.shape[0], rows):
+            stop = start + rows
+            yield TrainingData(training.data[start:stop], training.rows[start:stop],
+                               training.cols[start:stop], training.names)
+        return
+    with io.open(path, "r", encoding="utf8") as lrn_file:
+        columns = lrn_columns([lrn_file.readline().rstrip("\r\n") for _ in range(4)])
+        while True:
+            lines = list(itertools.islice(lrn_file, rows))
+            if not lines:
+                break
+            yield lrn_table(np.loadtxt(lines, delimiter="\t", ndmin=2, dtype=np.float64), columns)
+
+
+# writes training data in the format given by the file name extension
+def write_training_data(path, training):
+    if path.lower().endswith(INPUT_FORMATS["npy"]):
+        return write_npy(path, training)
+    return write_lrn(path, training)
+
+
+# normalization and band statistics saved with the training data
+def normalization_file(path):
+    return os.path.splitext(path)[0] + "_normalization.json"
+
+
+# all files making up the training data
+def training_files(path):
+    if path.lower().endswith(INPUT_FORMATS["npy"]):
+        return list(binary_files(path)) + [normalization_file(path)]
+    return [path, normalization_file(path)]
+
+
+# creates the training data (SOM.lrn or SOM.npy) from a mask and a list of rasters, normalized
+# with one of normalize.NORMALIZATIONS; without normalization no statistics are gathered
+def create_lrn(output_lrn_file, mask, rasters, block_rows=BLOCK_ROWS, index=None, normalization="none"):
+    statistics = None if normalization == "none" else normalize.BandStatistics(len(rasters))
+    mask, rasters, index = open_inputs(mask, rasters, block_rows, index)
+    if output_lrn_file.lower().endswith(INPUT_FORMATS["npy"]):
+        training = build_training_matrix(mask, rasters, block_rows, index=index, statistics=statistics)
+        scaling = normalize.fit_normalization(normalization, statistics)
+        scaling.apply(training.data)
+        write_npy(output_lrn_file, training)
+    else:
+        if statistics is not None:
+            for _, block in training_blocks(mask, rasters, index, block_rows):
+                statistics.add(block.data)
+        scaling = normalize.fit_normalization(normalization, statistics)
+        blocks = ((start, block._replace(data=scaling.apply(block.data)))
+                  for start, block in training_blocks(mask, rasters, index, block_rows))
+        write_lrn_blocks(output_lrn_file, len(index), column_names(rasters), blocks)
+    normalize.save_normalization(normalization_file(output_lrn_file), scaling)
+    return output_lrn_file
+
+
+# same arguments as Run_CreateSOMLrnFile.exe: workspace, lrn file, mask, rasters
+if __name__ == "__main__":
+    if len(sys.argv) < 5:
+        sys.exit("usage: python -m somcore.lrn <workspace> <lrn file> <mask> <raster> [<raster> ...]")
+    create_lrn(sys.argv[2], sys.argv[3], sys.argv[4:])
@@ -0,0 +1,110 @@
+# -*- coding: utf8 -*-
+
+"""
+Mask of the cells where all input rasters have data, built block by block.
+
+The rasters are read in row strips; their NoData masks are ANDed strip by
+strip, so no intermediate of the size of the whole stack is created (unlike
+the Map Algebra sum Con(IsNull(sum(rasters)) == 0, 1)). The mask is kept
+bit-packed (one bit per cell) together with the flat index of its valid
+cells (row * columns + column, in row-major order). The index is saved as
+'mask_index.npy' next to the mask raster; the training data writer
+(somcore.lrn) and the rasterizer (somcore.rasterize) read the valid cells
+from it instead of scanning the mask raster again.
+"""
+
+import numpy as np
+
+from somcore.raster import BLOCK_ROWS, iter_blocks, open_raster, valid_cells
+
+# flat index of the valid cells, saved next to the mask raster
+MASK_INDEX_FILE = "mask_index.npy"
+
+# values of the mask raster: valid cells are 1, the others NoData
+MASK_VALUE = 1
+MASK_NODATA = 0
+
+
+# smallest integer type holding the flat index of all cells of a raster
+def index_dtype(shape):
+    return np.int32 if shape[0] * shape[1] < 2 ** 31 else np.int64
+
+
+class ValidMask(object):
+    def __init__(self, bits, index, shape, geotransform=None, projection=None):
+        self.bits = bits                                        # np.packbits of the rows
+        self.index = index
+        self.shape = shape
+        self.geotransform = geotransform
+        self.projection = projection
+        self.nodata = MASK_NODATA
+        self.name = "mask"
+
+    @property
+    def count(self):
+        return len(self.index)
+
+    # rows of the mask as uint8 (1 valid, 0 NoData), so the mask is a raster reader itself
+    def read_rows(self, row, nrows):
+        return np.unpackbits(self.bits[row:row + nrows], axis=1)[:, :self.shape[1]]
+
+    def close(self):
+        pass
+
+    def save_index(self, path):
+        np.save(path, self.index)
+        return path
+
+
+# ANDs the NoData masks of the rasters strip by strip
+def build_mask(rasters, block_rows=BLOCK_ROWS):
+    rasters = [open_raster(raster) for raster in rasters]
+    shape = rasters[0].shape
+    for raster in rasters[1:]:
+        if raster.shape != shape:
+            raise ValueError("Raster '{}' does not match the grid of '{}'.".format(raster.name, rasters[0].name))
+    bits = np.empty((shape[0], (shape[1] + 7) // 8), dtype=np.uint8)
+    index = []
+    for row, block in iter_blocks(rasters[0], block_rows):
+        valid = valid_cells(block, rasters[0].nodata)
+        for raster in rasters[1:]:
+            valid &= valid_cells(raster.read_rows(row, block.shape[0]), raster.nodata)
+        bits[row:row + block.shape[0]] = np.packbits(valid, axis=1)
+        index.append((np.flatnonzero(valid) + row * shape[1]).astype(index_dtype(shape)))
+    index = np.concatenate(index) if index else np.empty(0, dtype=index_dtype(shape))
+    return ValidMask(bits, index, shape, getattr(rasters[0], "geotransform", None),
+                     getattr(rasters[0], "projection", None))
+
+
+# flat index of the valid cells of a mask raster
+def valid_index(mask, block_rows=BLOCK_ROWS):
+    mask = open_raster(mask)
+    if hasattr(mask, "index"):
+        return mask.index
+    index = [np.flatnonzero(valid_cells(block, mask.nodata)) + row * mask.shape[1]
+             for row, block in iter_blocks(mask, block_rows)]
+    return np.concatenate(index).astype(index_dtype(mask.shape)) if index else np.empty(0, np.int32)
+
+
+# opens a saved index without reading it into memory
+def load_index(path, mmap_mode="r"):
+    return np.load(path, mmap_mode=mmap_mode)
+
+
+# yields (first row, rows, first and last valid cell + 1, offsets of the valid cells in the strip)
+# for the row strips of a raster, from the flat index of the valid cells
+def index_blocks(index, shape, block_rows=BLOCK_ROWS):
+    cols = shape[1]
+    for row in range(0, shape[0], block_rows):
+        nrows = min(block_rows, shape[0] - row)
+        start, stop = np.searchsorted(index, [row * cols, (row + nrows) * cols])
+        yield row, nrows, int(start), int(stop), np.asarray(index[start:stop]) - row * cols
+
+
+# the same as index_blocks() from a mask raster
+def mask_blocks(mask, block_rows=BLOCK_ROWS):
+    position = 0
+    for row, block in iter_blocks(mask, block_rows):
+        cells = np.flatnonzero(valid_cells(block, mask.nodata))
+        yield row, block.shape[0], position, position + len(cells), cells
+        position += len(cells)
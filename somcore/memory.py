@@ -0,0 +1,223 @@
+# -*- coding: utf8 -*-
+
+"""
+Pre-flight estimate of the peak memory of a run, and the chunk sizes that fit.
+
+The data is float32 from the export to the BMU search; only per-node sums,
+statistics and the neighbourhood weights are float64. The peak of every
+stage follows from the valid cells, the bands and the nodes of the map:
+
+    lrn        the training matrix (cells x bands), the flat cell index and
+               the positions of the cells, a block of every raster
+    train      the training matrix (batch) or one batch (minibatch), the text
+               of the rows parsed at once, the codebooks, the node sums, the
+               neighbourhood weights of som.NODE_BLOCK nodes and the BMU
+               distance buffer (bmu.CHUNK_ELEMENTS)
+    cluster    the training step plus the BMU, second BMU, distance and
+               quantization error of every row and the rows of geospace.txt
+               formatted at once
+    rasterize  a chunk of geospace.txt parsed and scattered into a row strip,
+               for compressed results a tile row of every raster and of its
+               overview levels (somcore.raster.TileRows)
+
+The budget is the memory limit of the tool or MEMORY_FRACTION of the
+available physical memory. A 32-bit Python (the one of ArcMap) can't use
+more than its address space, so there the available memory is also capped
+by the free address space of the process. If batch training exceeds the
+budget, the in-repo backends train in mini-batches of the largest batch
+that fits. The run is refused when the export of the training matrix or the
+smallest batch does not fit. nextsom_wrap.exe keeps its data as it likes,
+it only gets a warning (float64 copies of the training data assumed).
+"""
+
+from __future__ import division
+
+import sys
+from collections import OrderedDict, namedtuple
+
+from somcore import bmu, lrn, rasterize, som
+from somcore.raster import BLOCK_ROWS, TILE_SIZE
+
+# share of the available physical memory a run may use
+MEMORY_FRACTION = 0.8
+
+# memory of the interpreter, numpy and the raster I/O
+BASE_BYTES = 200 * 2 ** 20
+
+# bytes per value of text training data parsed by np.loadtxt (Python float and list entry)
+TEXT_VALUE_BYTES = 40
+
+# bytes per value of geospace.txt read at once (its text and the parsed float32)
+GEOSPACE_VALUE_BYTES = 16
+
+# smallest mini-batch worth training with
+MIN_BATCH_ROWS = 10000
+
+# pointer size of the interpreter; 32-bit processes are limited by their address space
+PROCESS_BITS = 64 if sys.maxsize > 2 ** 32 else 32
+
+# user address space of a 32-bit process where the free part is unknown (2 GB on 32-bit Windows)
+ADDRESS_SPACE_32BIT = 2 ** 31
+
+# estimate of a run: training mode and batch rows chosen, geospace rows rasterized at once,
+# peak bytes per stage, budget (None: unknown) and a warning for the executables
+MemoryPlan = namedtuple("MemoryPlan", ["training_mode", "batch_rows", "rasterize_chunk", "stages", "budget",
+                                       "warning"])
+
+
+class MemoryBudgetError(RuntimeError):
+    pass
+
+
+# memory status of Windows (GlobalMemoryStatusEx), None if it fails
+def windows_memory_status():
+    import ctypes
+
+    class MemoryStatus(ctypes.Structure):
+        _fields_ = [("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong)] + [
+            (name, ctypes.c_ulonglong) for name in ("ullTotalPhys", "ullAvailPhys", "ullTotalPageFile",
+                                                    "ullAvailPageFile", "ullTotalVirtual", "ullAvailVirtual",
+                                                    "ullAvailExtendedVirtual")]
+
+    status = MemoryStatus()
+    status.dwLength = ctypes.sizeof(status)
+    if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)):
+        return status
+    return None
+
+
+# free user address space of the process in bytes (the part of it Windows reports, else all of it)
+def available_address_space():
+    if sys.platform == "win32":
+        status = windows_memory_status()
+        if status is not None:
+            return int(status.ullAvailVirtual)
+    return ADDRESS_SPACE_32BIT
+
+
+# memory a run can allocate in bytes: the available physical memory, in a 32-bit process at most
+# its free address space; None if the platform can't tell
+def available_memory():
+    physical = available_physical_memory()
+    if PROCESS_BITS > 32:
+        return physical
+    address_space = available_address_space()
+    return address_space if physical is None else min(physical, address_space)
+
+
+# available physical memory in bytes, None if the platform can't tell
+def available_physical_memory():
+    if sys.platform == "win32":
+        status = windows_memory_status()
+        return None if status is None else int(status.ullAvailPhys)
+    try:
+        with open("/proc/meminfo") as meminfo:
+            fields = dict(line.split(":", 1) for line in meminfo.read().splitlines() if ":" in line)
+        return int(fields["MemAvailable"].split()[0]) * 1024
+    except (IOError, OSError, KeyError, ValueError):
+        pass
+    try:
+        import psutil
+        return int(psutil.virtual_memory().available)
+    except ImportError:
+        return None
+
+
+# memory budget in bytes: the limit in MB if positive, else a share of the available memory
+def memory_budget(limit_mb=0):
+    if limit_mb > 0:
+        return int(limit_mb * 2 ** 20)
+    available = available_memory()
+    return None if available is None else int(available * MEMORY_FRACTION)
+
+
+# peak bytes of every stage; batch_rows None means batch training on all rows
+def stage_memory(cells, bands, nodes, width, batch_rows=None, input_format="lrn",
+                 chunk_elements=bmu.CHUNK_ELEMENTS, rasterize_chunk=rasterize.CHUNK_SIZE, compressed=False):
+    rows = cells if batch_rows is None else min(batch_rows, cells)
+    parsed = 0
+    if input_format == "lrn":
+        parsed = (rows if batch_rows is not None else min(cells, lrn.STREAM_ROWS)) * (bands + 4) * TEXT_VALUE_BYTES
+    som_map = (nodes * bands * (2 * 4 + 2 * 8) + som.NODE_BLOCK * nodes * 3 * 8 + nodes * 8 +
+               chunk_elements * 2 * 4)
+    training = rows * (bands * 4 + 2 * 4) + parsed + som_map
+    geospace = som.WRITE_ROWS * (2 * bands + 6) * (8 + GEOSPACE_VALUE_BYTES)
+    tiles = (bands + 2) * TILE_SIZE * width * 4 * 2 if compressed else 0     # rasters and their overviews
+    stages = OrderedDict([("lrn", cells * (bands * 4 + 8 + 2 * 4) + BLOCK_ROWS * width * 4 * 2),
+                          ("train", training),
+                          ("cluster", training + rows * 4 * 4 + geospace),
+                          ("rasterize", min(rasterize_chunk, cells) * (2 * bands + 7) * GEOSPACE_VALUE_BYTES +
+                           rasterize_chunk * 4 + tiles)])
+    return OrderedDict((name, BASE_BYTES + value) for name, value in stages.items())
+
+
+# largest batch of rows between low and high whose training fits the budget, None if none does
+def fitting_batch(budget, cells, bands, nodes, width, input_format, low, high):
+    def fits(rows):
+        stages = stage_memory(cells, bands, nodes, width, rows, input_format)
+        return max(stages["train"], stages["cluster"]) <= budget
+
+    if not fits(low):
+        return None
+    while low < high:
+        middle = (low + high + 1) // 2
+        if fits(middle):
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+# chooses the training mode, the batch size and the rasterize chunk for the budget;
+# batch_rows 0 means the default batch size. Raises MemoryBudgetError if the run can't fit.
+def plan_memory(cells, bands, nodes, width, budget, training_mode="batch", batch_rows=0, input_format="lrn",
+                in_process=True, compressed=False):
+    batch_rows = batch_rows or lrn.STREAM_ROWS
+    chunk = rasterize.CHUNK_SIZE
+    if budget is None:
+        return MemoryPlan(training_mode, batch_rows, chunk,
+                          stage_memory(cells, bands, nodes, width, None if training_mode == "batch" else batch_rows,
+                                       input_format, compressed=compressed), None, None)
+    while chunk > width and stage_memory(cells, bands, nodes, width, rasterize_chunk=chunk,
+                                         compressed=compressed)["rasterize"] > budget:
+        chunk //= 2
+    warning = None
+    if not in_process:
+        stages = stage_memory(cells, bands, nodes, width, None, input_format, rasterize_chunk=chunk,
+                              compressed=compressed)
+        external = BASE_BYTES + cells * bands * 8 * 2
+        if external > budget:
+            warning = ("nextsom_wrap.exe may need about {} for the training data, the budget is {}.".format(
+                format_bytes(external), format_bytes(budget)))
+    elif training_mode == "batch":
+        stages = stage_memory(cells, bands, nodes, width, None, input_format, rasterize_chunk=chunk,
+                              compressed=compressed)
+        if max(stages["train"], stages["cluster"]) > budget:
+            training_mode = "minibatch"
+            batch_rows = fitting_batch(budget, cells, bands, nodes, width, input_format,
+                                       min(MIN_BATCH_ROWS, cells), cells) or MIN_BATCH_ROWS
+    if training_mode == "minibatch" and in_process:
+        stages = stage_memory(cells, bands, nodes, width, batch_rows, input_format, rasterize_chunk=chunk,
+                              compressed=compressed)
+        if max(stages["train"], stages["cluster"]) > budget:
+            fitting = fitting_batch(budget, cells, bands, nodes, width, input_format, min(MIN_BATCH_ROWS, cells),
+                                    batch_rows)
+            if fitting is None:
+                raise MemoryBudgetError(
+                    "Training a {} node SOM on {} bands needs about {} even in mini-batches, the budget is {}.".format(
+                        nodes, bands, format_bytes(max(stages["train"], stages["cluster"])), format_bytes(budget)))
+            batch_rows = fitting
+            stages = stage_memory(cells, bands, nodes, width, batch_rows, input_format, rasterize_chunk=chunk,
+                                  compressed=compressed)
+    if stages["lrn"] > budget:
+        raise MemoryBudgetError("The training data of {} cells and {} bands needs about {}, the budget is {}.".format(
+            cells, bands, format_bytes(stages["lrn"]), format_bytes(budget)))
+    return MemoryPlan(training_mode, batch_rows, chunk, stages, budget, warning)
+
+
+def format_bytes(count):
+    for unit in ("bytes", "KB", "MB", "GB"):
+        if abs(count) < 1024 or unit == "GB":
+            return "{:.1f} {}".format(count, unit) if unit != "bytes" else "{} bytes".format(int(count))
+        count /= 1024.0
+
@@ -0,0 +1,158 @@
+# -*- coding: utf8 -*-
+
+"""
+Trained SOM saved as a model, and scoring of new rasters with it.
+
+Assigning the training data (somcore.som) writes 'model.npz' to the output
+folder:
+
+    codebook        (nodes x bands) trained codebook
+    som_x, som_y, map_type, grid_type
+                    geometry of the grid
+    labels          k-means cluster of every node
+    names           band names of the training data, in the order of the rasters
+    normalization   normalization of the bands before training (somcore.normalize),
+    normalization_center, normalization_scale
+                    its parameters, new data is scaled with them before scoring
+    count, mean, std, minimum, maximum, q25, median, q75
+                    band statistics of the training data (normalized)
+
+Scoring streams a stack of new rasters (the same bands in the same order)
+row strip by row strip: the cells where all rasters have data are matched
+against the codebook in chunks (somcore.bmu) and Geo_cluster and
+quant_error are written for them. Nothing is trained, clustered or written
+as text, so a tile is scored in seconds:
+
+    python -m somcore.model <model.npz> <output folder> <raster> [<raster> ...] [--driver GTiff]
+"""
+
+from __future__ import division, print_function
+
+import argparse
+import os
+import sys
+from os.path import join
+
+import numpy as np
+
+from somcore import bmu
+from somcore.grid import Grid
+from somcore.normalize import Normalization
+from somcore.raster import (BLOCK_ROWS, DRIVER_EXTENSIONS, FLOAT_NODATA, create_raster, open_raster,
+                            valid_cells)
+
+# model written next to the trained codebook
+MODEL_FILE = "model.npz"
+
+# band statistics kept in a model
+STATISTICS = ("count", "mean", "std", "minimum", "maximum", "q25", "median", "q75")
+
+
+class SomModel(object):
+    # normalization: normalize.Normalization of the training data, None = none
+    def __init__(self, codebook, grid, labels, names, normalization=None, statistics=None):
+        self.codebook = np.asarray(codebook, dtype=np.float32)
+        self.grid = grid
+        self.labels = np.asarray(labels)
+        self.names = list(names)
+        self.normalization = normalization or Normalization()
+        self.statistics = statistics or {}
+
+    @property
+    def bands(self):
+        return self.codebook.shape[1]
+
+    # data rows in the space of the codebook
+    def normalize(self, data):
+        return self.normalization.transform(data)
+
+    # cluster and quantization error of every data row
+    def score(self, data, chunk_elements=bmu.CHUNK_ELEMENTS):
+        bmus, distances = bmu.best_matching_units(self.normalize(data), self.codebook, chunk_elements)
+        return self.labels[bmus], np.sqrt(distances)
+
+
+# writes a model (replacing an older one only when it is complete)
+def save_model(path, model):
+    temporary = path + ".tmp.npz"
+    grid = model.grid
+    normalization = model.normalization
+    if not normalization.identity:
+        statistics = dict(model.statistics, normalization_center=normalization.center,
+                          normalization_scale=normalization.scale)
+    else:
+        statistics = model.statistics
+    np.savez(temporary, codebook=model.codebook, som_x=grid.som_x, som_y=grid.som_y, map_type=grid.map_type,
+             grid_type=grid.grid_type, labels=model.labels, names=np.array(model.names),
+             normalization=normalization.method, **statistics)
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(temporary, path)
+    return path
+
+
+def load_model(path):
+    saved = np.load(path)
+    try:
+        grid = Grid(int(saved["som_x"]), int(saved["som_y"]), str(saved["map_type"]), str(saved["grid_type"]))
+        statistics = dict((name, saved[name]) for name in STATISTICS if name in saved.files)
+        normalization = Normalization(str(saved["normalization"]))
+        if "normalization_center" in saved.files:
+            normalization = Normalization(normalization.method, saved["normalization_center"],
+                                          saved["normalization_scale"])
+        return SomModel(saved["codebook"], grid, saved["labels"], [str(name) for name in saved["names"]],
+                        normalization, statistics)
+    finally:
+        saved.close()
+
+
+# writes Geo_cluster and quant_error of a stack of rasters (paths or readers, one per band of the model)
+def score_rasters(model, rasters, output_folder, driver="GTiff", block_rows=BLOCK_ROWS,
+                  chunk_elements=bmu.CHUNK_ELEMENTS):
+    rasters = [open_raster(raster) for raster in rasters]
+    if len(rasters) != model.bands:
+        raise ValueError("The model was trained on {} bands ({}), got {} rasters.".format(
+            model.bands, ", ".join(model.names), len(rasters)))
+    shape = rasters[0].shape
+    for raster in rasters[1:]:
+        if raster.shape != shape:
+            raise ValueError("Raster '{}' does not match the grid of '{}'.".format(raster.name, rasters[0].name))
+    if not os.path.isdir(output_folder):
+        os.makedirs(output_folder)
+
+    writers = [create_raster(join(output_folder, name), shape, like=rasters[0], driver=driver)
+               for name in ("Geo_cluster", "quant_error")]
+    try:
+        for row in range(0, shape[0], block_rows):
+            blocks = [raster.read_rows(row, block_rows) for raster in rasters]
+            valid = valid_cells(blocks[0], rasters[0].nodata)
+            for raster, block in zip(rasters[1:], blocks[1:]):
+                valid &= valid_cells(block, raster.nodata)
+            cells = np.flatnonzero(valid)
+            data = np.column_stack([block.reshape(-1)[cells] for block in blocks])
+            labels, q_error = model.score(data, chunk_elements)
+            for writer, values in zip(writers, (labels, q_error)):
+                strip = np.full(valid.shape, FLOAT_NODATA, dtype=np.float32)
+                strip.reshape(-1)[cells] = values
+                writer.write_rows(row, strip)
+    finally:
+        for writer in writers:
+            writer.close()
+    return writers
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Scores new rasters with a trained SOM model.")
+    parser.add_argument("model", help="model.npz of a run")
+    parser.add_argument("output_folder", help="folder of Geo_cluster and quant_error")
+    parser.add_argument("rasters", nargs="+", help="one raster per band of the model, in the order of training")
+    parser.add_argument("--driver", default="GTiff", choices=sorted(DRIVER_EXTENSIONS))
+    arguments = parser.parse_args(arguments)
+    model = load_model(arguments.model)
+    score_rasters(model, arguments.rasters, arguments.output_folder, arguments.driver)
+    print("Geo_cluster and quant_error written to '{}'.".format(arguments.output_folder))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
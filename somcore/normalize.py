@@ -0,0 +1,179 @@
+# -*- coding: utf8 -*-
+
+"""
+Band statistics gathered in one pass and normalization of the training data.
+
+The statistics are collected block by block while the rasters are exported
+(somcore.lrn): count, minimum and maximum, mean and standard deviation
+merged per block (Chan et al., stable for large counts and offsets) and the
+quartiles of a uniform sample of at most QUANTILE_SAMPLE rows (bottom-k
+sampling with random keys). The quartiles are exact while the data has
+fewer rows and approximate beyond, so the robust normalization of large
+rasters uses an estimated median and interquartile range.
+
+The normalization is applied to the exported matrix in place, band by band:
+
+    none    the values as they are
+    zscore  (x - mean) / std
+    minmax  (x - minimum) / (maximum - minimum)
+    robust  (x - median) / (q75 - q25)
+
+A band without spread keeps a scale of 1; data without rows can't be
+normalized (ValueError). The method, its center and scale
+and the statistics are saved next to the training data (see
+lrn.normalization_file()), so the results are mapped back to the original
+units and the model (somcore.model) scales new data the same way.
+"""
+
+from __future__ import division
+
+import json
+import os
+
+import numpy as np
+
+# normalizations of the bands before training
+NORMALIZATIONS = ("none", "zscore", "minmax", "robust")
+
+# rows sampled for the quartiles of the robust normalization
+QUANTILE_SAMPLE = 100000
+
+# seed of the sampling keys
+SEED = 0
+
+# rows converted to float64 at once
+CHUNK_ROWS = 65536
+
+
+# count, mean, standard deviation, minimum, maximum and quartiles per band of data added in parts
+class BandStatistics(object):
+    def __init__(self, bands, sample_rows=QUANTILE_SAMPLE, seed=SEED):
+        self.count = 0
+        self.mean = np.zeros(bands, dtype=np.float64)
+        self.scatter = np.zeros(bands, dtype=np.float64)    # sum of squared deviations from the mean
+        self.minimum = np.full(bands, np.inf)
+        self.maximum = np.full(bands, -np.inf)
+        self.sample_rows = sample_rows
+        self.sample = np.empty((0, bands), dtype=np.float64)
+        self.sample_keys = np.empty(0, dtype=np.float64)
+        self.random_state = np.random.RandomState(seed)
+
+    # adds float32 data in float64 chunks
+    def add(self, data):
+        for start in range(0, len(data), CHUNK_ROWS):
+            self.add_chunk(np.asarray(data[start:start + CHUNK_ROWS], dtype=np.float64))
+
+    def add_chunk(self, data):
+        count = data.shape[0]
+        mean = data.mean(axis=0)
+        centered = data - mean
+        scatter = np.einsum("ij,ij->j", centered, centered)
+        total = self.count + count                          # pairwise merge (Chan et al.)
+        delta = mean - self.mean
+        self.scatter += scatter + delta * delta * self.count * count / total
+        self.mean += delta * count / total
+        self.count = total
+        self.minimum = np.minimum(self.minimum, data.min(axis=0))
+        self.maximum = np.maximum(self.maximum, data.max(axis=0))
+        self.add_sample(data)
+
+    # keeps the rows with the smallest random keys
+    def add_sample(self, data):
+        keys = self.random_state.random_sample(data.shape[0])
+        if len(self.sample_keys) >= self.sample_rows:
+            candidates = keys < self.sample_keys.max()
+            data, keys = data[candidates], keys[candidates]
+            if not len(keys):
+                return
+        sample = np.concatenate((self.sample, data))
+        sample_keys = np.concatenate((self.sample_keys, keys))
+        if len(sample_keys) > self.sample_rows:
+            kept = np.argpartition(sample_keys, self.sample_rows - 1)[:self.sample_rows]
+            sample, sample_keys = sample[kept], sample_keys[kept]
+        self.sample, self.sample_keys = sample, sample_keys
+
+    def as_dict(self):
+        result = {"count": self.count, "mean": self.mean, "std": np.sqrt(self.scatter / max(self.count, 1)),
+                  "minimum": self.minimum, "maximum": self.maximum}
+        if len(self.sample):
+            result["q25"], result["median"], result["q75"] = np.percentile(self.sample, [25, 50, 75], axis=0)
+        return result
+
+
+# normalization of the bands: x' = (x - center) / scale
+class Normalization(object):
+    def __init__(self, method="none", center=None, scale=None, statistics=None):
+        if method not in NORMALIZATIONS:
+            raise ValueError("Unknown normalization '{}', use one of {}.".format(method, ", ".join(NORMALIZATIONS)))
+        self.method = method
+        self.center = None if center is None else np.asarray(center, dtype=np.float64)
+        self.scale = None if scale is None else np.asarray(scale, dtype=np.float64)
+        self.statistics = statistics or {}
+
+    @property
+    def identity(self):
+        return self.method == "none" or self.center is None
+
+    # normalizes a (rows x bands) array in place
+    def apply(self, data):
+        if self.identity:
+            return data
+        for band in range(data.shape[1]):
+            data[:, band] -= data.dtype.type(self.center[band])
+            data[:, band] /= data.dtype.type(self.scale[band])
+        return data
+
+    # normalized copy of data rows, for data that must not change
+    def transform(self, data):
+        if self.identity:
+            return data
+        return self.apply(np.array(data, dtype=np.float32))
+
+    # data rows (or codebook vectors) in the original units
+    def invert(self, data):
+        if self.identity:
+            return data
+        return (np.asarray(data, dtype=np.float64) * self.scale + self.center).astype(np.asarray(data).dtype)
+
+    def as_dict(self):
+        result = {"method": self.method}
+        if not self.identity:
+            result.update(center=self.center.tolist(), scale=self.scale.tolist())
+        result["statistics"] = dict((name, np.asarray(value).tolist()) for name, value in self.statistics.items())
+        return result
+
+
+# normalization of a method from the statistics of the training data (none: no statistics needed)
+def fit_normalization(method, statistics):
+    if method == "none" and statistics is None:
+        return Normalization(method)
+    if method in NORMALIZATIONS[1:] and not statistics.count:
+        raise ValueError("The training data has no rows with data, it can't be normalized ({}).".format(method))
+    values = statistics.as_dict()
+    if method == "zscore":
+        center, scale = values["mean"], values["std"]
+    elif method == "minmax":
+        center, scale = values["minimum"], values["maximum"] - values["minimum"]
+    elif method == "robust":
+        center, scale = values["median"], values["q75"] - values["q25"]
+    else:
+        return Normalization(method, statistics=values)
+    scale = np.where(np.isfinite(scale) & (scale > 0), scale, 1.0)
+    return Normalization(method, center, scale, values)
+
+
+# writes a normalization as json
+def save_normalization(path, normalization):
+    with open(path, "w") as json_file:
+        json.dump(normalization.as_dict(), json_file, indent=1)
+    return path
+
+
+# normalization saved with the training data, none for training data of an older run
+def load_normalization(path):
+    if not os.path.exists(path):
+        return Normalization()
+    with open(path) as json_file:
+        saved = json.load(json_file)
+    statistics = dict((name, np.asarray(value)) for name, value in saved.get("statistics", {}).items())
+    return Normalization(saved["method"], saved.get("center"), saved.get("scale"), statistics)
@@ -0,0 +1,165 @@
+# -*- coding: utf8 -*-
+
+"""
+Sharded best matching unit search on several cores (and a pool helper for
+other independent tasks).
+
+The training matrix is split into row shards that a pool of threads or
+processes works on. For a batch epoch every worker returns the sums and hits
+per node of its shard, which are added up once per epoch; for the final
+assignment the workers return the best and second best BMUs of their shard.
+
+Threads share the matrix directly. Processes memory-map 'SOM.npy' when the
+matrix comes from it; data held in memory is copied once into a shared
+memory buffer (multiprocessing.RawArray) that the workers inherit when the
+pool starts. Neither way do the workers get a copy of the data, and nothing
+is written to disk.
+"""
+
+import ctypes
+import mmap
+import multiprocessing
+import os
+import sys
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+from somcore import bmu
+
+# kinds of worker pools
+POOL_TYPES = ("thread", "process")
+
+# memory-mapped matrices of a worker process by file name, and the shared memory matrix
+_SHARED = {}
+
+# name of the shared memory matrix in _SHARED
+SHARED_MEMORY = "<shared memory>"
+
+
+# number of workers; 0 means one per core
+def worker_count(workers):
+    return int(workers) if int(workers) > 0 else multiprocessing.cpu_count()
+
+
+# first and last row + 1 of the shards of a matrix
+def shard_bounds(count, shards):
+    bounds = np.linspace(0, count, min(shards, max(count, 1)) + 1).astype(int)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+# path of a .npy file holding the whole matrix, if it is memory-mapped from one
+def mapped_file(data):
+    filename = getattr(data, "filename", None)
+    if filename and filename.lower().endswith(".npy") and isinstance(getattr(data, "base", None), mmap.mmap):
+        return filename
+    return None
+
+
+# matrix of a worker process, opened once per process
+def shared_data(path):
+    if path not in _SHARED:
+        _SHARED[path] = np.load(path, mmap_mode="r")
+    return _SHARED[path]
+
+
+# float32 matrix in a shared memory buffer of the shape
+def shared_array(buffer, shape):
+    return np.frombuffer(buffer, dtype=np.float32).reshape(shape)
+
+
+# initializer of the worker processes: the shared memory matrix, passed when the process starts
+def _init_worker(buffer, shape):
+    _SHARED[SHARED_MEMORY] = shared_array(buffer, shape)
+
+
+# work of one shard: ("sums", "bmus" or "two", matrix or file, rows, codebook, chunk size)
+def _shard_task(task):
+    kind, source, start, stop, codebook, chunk_elements = task
+    data = source if isinstance(source, np.ndarray) else shared_data(source)
+    if kind == "sums":
+        return bmu.node_sums(data[start:stop], codebook, chunk_elements)
+    if kind == "two":
+        return bmu.best_two_units(data[start:stop], codebook, chunk_elements)
+    return bmu.best_matching_units(data[start:stop], codebook, chunk_elements)
+
+
+# ArcMap runs Python inside ArcMap.exe, worker processes need python(w).exe
+def _set_python_executable():
+    if not os.path.basename(sys.executable).lower().startswith("python"):
+        multiprocessing.set_executable(os.path.join(sys.exec_prefix, "pythonw.exe"))
+
+
+# maps a function over tasks with a pool of workers, the results are in the order of the tasks
+def map_tasks(function, tasks, workers=0, pool_type="thread"):
+    workers = min(worker_count(workers), len(tasks))
+    if workers <= 1:
+        return [function(task) for task in tasks]
+    if pool_type == "process":
+        _set_python_executable()
+        pool = multiprocessing.Pool(workers)
+    else:
+        pool = ThreadPool(workers)
+    try:
+        return pool.map(function, tasks)
+    finally:
+        pool.close()
+        pool.join()
+
+
+class ShardPool(object):
+    def __init__(self, data, workers=0, pool_type="thread", chunk_elements=bmu.CHUNK_ELEMENTS):
+        if pool_type not in POOL_TYPES:
+            raise ValueError("Unknown pool type '{}', use one of {}.".format(pool_type, ", ".join(POOL_TYPES)))
+        self.data = data
+        self.workers = worker_count(workers)
+        self.pool_type = pool_type
+        self.chunk_elements = chunk_elements
+        self.bounds = shard_bounds(data.shape[0], self.workers)
+        if pool_type == "process":
+            self.source = mapped_file(data)
+            initializer, arguments = None, ()
+            if self.source is None:
+                buffer = multiprocessing.RawArray(ctypes.c_float, int(np.prod(data.shape)))
+                shared_array(buffer, data.shape)[...] = data
+                self.source = SHARED_MEMORY
+                initializer, arguments = _init_worker, (buffer, data.shape)
+            _set_python_executable()
+            self.pool = multiprocessing.Pool(self.workers, initializer, arguments)
+        else:
+            self.source = data
+            self.pool = ThreadPool(self.workers)
+
+    # a thread pool can switch to other data (the next batch) without a restart
+    def set_data(self, data):
+        self.data = self.source = data
+        self.bounds = shard_bounds(data.shape[0], self.workers)
+
+    def map(self, kind, codebook):
+        codebook = np.asarray(codebook, dtype=np.float32)
+        return self.pool.map(_shard_task, [(kind, self.source, start, stop, codebook, self.chunk_elements)
+                                           for start, stop in self.bounds])
+
+    # sums and hits per node of all shards, reduced into one
+    def node_sums(self, codebook):
+        results = self.map("sums", codebook)
+        sums, hits = results[0]
+        for shard_sums, shard_hits in results[1:]:
+            sums += shard_sums
+            hits += shard_hits
+        return sums, hits
+
+    # best matching units and squared distances of all shards
+    def best_matching_units(self, codebook):
+        results = self.map("bmus", codebook)
+        return (np.concatenate([bmus for bmus, _ in results]),
+                np.concatenate([distances for _, distances in results]))
+
+    # best and second best matching units and squared distances of all shards
+    def best_two_units(self, codebook):
+        results = self.map("two", codebook)
+        return tuple(np.concatenate([result[column] for result in results]) for column in range(3))
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
@@ -0,0 +1,107 @@
+# -*- coding: utf8 -*-
+
+"""
+Resumable pipeline of the SOM tool.
+
+The stages (mask, lrn, train, cluster, rasterize, load) run in order. The
+manifest 'manifest.json' in the workspace records for every stage its key (a
+hash of its inputs and parameters), its outputs, its status and when it ran.
+A re-run skips the completed stages whose key didn't change and whose outputs
+still exist and resumes with the first incomplete stage; every stage after it
+runs again. A stage fails when it raises an error or doesn't create all of
+its outputs. With a run report (somcore.report) every stage is measured.
+The StageError of a failed stage carries the error the stage raised (cause,
+chained as __cause__ on Python 3) and its formatted traceback.
+"""
+
+import json
+import os
+import time
+import traceback
+from collections import namedtuple
+from contextlib import contextmanager
+
+# name of the manifest in the workspace
+MANIFEST_FILE = "manifest.json"
+
+# always: the stage runs on every run (e.g. loading the results into the map),
+# cells: number of cells processed (or a function returning it) for the run report
+Stage = namedtuple("Stage", ["name", "key", "outputs", "function", "always", "cells"])
+
+
+# error of a failed stage; cause: the error the stage raised, details: its traceback
+class StageError(Exception):
+    def __init__(self, message, cause=None, details=None):
+        super(StageError, self).__init__(message)
+        self.cause = cause
+        self.details = details
+        self.__cause__ = cause
+
+
+def stage(name, key, outputs, function, always=False, cells=None):
+    return Stage(name, key, list(outputs), function, always, cells)
+
+
+@contextmanager
+def _unmeasured():
+    yield None
+
+
+class Manifest(object):
+    def __init__(self, path):
+        self.path = path
+        self.stages = {}
+        if os.path.exists(path):
+            with open(path) as manifest_file:
+                self.stages = json.load(manifest_file).get("stages", {})
+
+    def save(self):
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as manifest_file:
+            json.dump({"stages": self.stages}, manifest_file, indent=2, sort_keys=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(temporary, self.path)
+
+    # True if the stage was completed with the same key and its outputs still exist
+    def complete(self, stage, exists=os.path.exists):
+        entry = self.stages.get(stage.name)
+        return (entry is not None and entry["status"] == "done" and entry["key"] == stage.key and
+                all(exists(path) for path in stage.outputs))
+
+    def record(self, stage, status, started, message=None):
+        self.stages[stage.name] = {"key": stage.key, "outputs": stage.outputs, "status": status,
+                                   "started": started, "finished": time.time(), "message": message}
+        self.save()
+
+
+# runs the stages that are not complete, from the first incomplete one on;
+# progress(message, percent) is told about every stage that starts
+def run_stages(manifest, stages, log=None, exists=os.path.exists, report=None, progress=None):
+    log = log or (lambda message: None)
+    resume = True
+    for number, current in enumerate(stages):
+        if resume and not current.always and manifest.complete(current, exists):
+            log("Stage '{}' is complete, skipping it.".format(current.name))
+            if report is not None:
+                report.skip(current.name)
+            continue
+        resume = False
+        if progress is not None:
+            progress("Stage '{}' ({} of {}).".format(current.name, number + 1, len(stages)),
+                     100 * number // len(stages))
+        started = time.time()
+        manifest.record(current, "running", started)
+        try:
+            with report.measure(current.name, current.cells) if report is not None else _unmeasured():
+                current.function()
+        except Exception as error:
+            manifest.record(current, "failed", started, str(error))
+            raise StageError("Stage '{}' failed: {}".format(current.name, error), error, traceback.format_exc())
+        missing = [path for path in current.outputs if not exists(path)]
+        if missing:
+            message = "Stage '{}' did not create {}.".format(current.name, ", ".join(missing))
+            manifest.record(current, "failed", started, message)
+            raise StageError(message)
+        manifest.record(current, "done", started)
+    return manifest
@@ -0,0 +1,123 @@
+# -*- coding: utf8 -*-
+
+"""
+Quality of a trained SOM, gathered on the way instead of in extra passes.
+
+The final assignment of the training data (somcore.som) searches the best
+and the second best matching unit of every row at once and adds them up to
+
+    quantization_error  mean distance of the rows to their BMU
+    topographic_error   share of the rows whose BMU and second BMU are not
+                        direct neighbours on the grid (rectangular or
+                        hexagonal, see somcore.grid)
+    hits                rows per node
+
+written to 'quality.json' in the output folder. An approximate BMU search
+(somcore.search) finds no second BMU, then the topographic error is null.
+
+With a convergence tolerance the numpy backend follows the mean squared
+quantization error of every epoch. It comes from the node sums the batch
+update computes anyway: sum |x - w_bmu|^2 = sum |x|^2 - 2 sum_n s_n.w_n +
+sum_n h_n |w_n|^2 for the data sums s_n and hits h_n of node n. The training
+stops once the relative change stays below the tolerance for PATIENCE
+epochs in a row, after one more epoch at the radius and scale of the last
+epoch of the schedule; the errors go to 'convergence.json'.
+"""
+
+from __future__ import division
+
+import json
+
+import numpy as np
+
+# quality of the final assignment and errors of the epochs, written to the output folder
+QUALITY_FILE = "quality.json"
+CONVERGENCE_FILE = "convergence.json"
+
+# epochs in a row whose relative change of the error is below the tolerance before the training stops
+PATIENCE = 2
+
+# rows converted to float64 at once for the squared norm of the data
+NORM_ROWS = 65536
+
+
+# sum of the squared norms of the data rows, accumulated in float64
+def squared_norm(data, rows=NORM_ROWS):
+    total = 0.0
+    for start in range(0, data.shape[0], rows):
+        chunk = np.asarray(data[start:start + rows], dtype=np.float64)
+        total += float(np.einsum("ij,ij->", chunk, chunk))
+    return total
+
+
+# quantization error, topographic error and hits of data assigned in parts
+class QualityMetrics(object):
+    def __init__(self, grid):
+        self.grid = grid
+        self.rows = 0
+        self.error_sum = 0.0
+        self.topographic_errors = 0
+        self.second_missing = False
+        self.hits = np.zeros(grid.size, dtype=np.int64)
+
+    # first and second best matching unit (None if unknown) and squared distance to the first of some rows
+    def add(self, first, second, distances):
+        if not len(first):
+            return
+        self.rows += len(first)
+        self.error_sum += float(np.sqrt(np.asarray(distances, dtype=np.float64)).sum())
+        self.hits += np.bincount(first, minlength=self.grid.size)
+        if second is None:
+            self.second_missing = True
+        else:
+            self.topographic_errors += int(np.count_nonzero(~self.grid.adjacent(first, second)))
+
+    def as_dict(self):
+        rows = max(self.rows, 1)
+        return {"rows": self.rows, "quantization_error": self.error_sum / rows,
+                "topographic_error": None if self.second_missing else self.topographic_errors / rows,
+                "empty_nodes": int(np.count_nonzero(self.hits == 0)), "hits": self.hits.tolist()}
+
+    def save(self, path):
+        with open(path, "w") as json_file:
+            json.dump(self.as_dict(), json_file, indent=1)
+        return path
+
+
+# mean squared quantization error of every epoch and the early stop of the training
+class Convergence(object):
+    def __init__(self, tolerance, patience=PATIENCE):
+        self.tolerance = tolerance
+        self.patience = patience
+        self.epochs = []
+        self.stopped = False
+        self.quiet = 0                                      # epochs in a row below the tolerance
+        self.squared = 0.0
+        self.rows = 0.0
+
+    # adds the squared distances of rows to their BMUs, from the squared norm of the rows and
+    # the sums and hits per node against the codebook they were assigned to
+    def add(self, data_norm, sums, hits, codebook):
+        codebook = np.asarray(codebook, dtype=np.float64)
+        self.squared += (data_norm - 2.0 * float(np.einsum("ij,ij->", sums, codebook)) +
+                         float(np.dot(hits, np.einsum("ij,ij->i", codebook, codebook))))
+        self.rows += float(hits.sum())
+
+    # closes an epoch; True when the training has converged
+    def end_epoch(self, epoch):
+        error = max(self.squared, 0.0) / max(self.rows, 1.0)
+        self.squared, self.rows = 0.0, 0.0
+        change = None
+        if self.epochs:
+            previous = self.epochs[-1]["error"]
+            change = abs(previous - error) / previous if previous > 0 else 0.0
+            self.quiet = self.quiet + 1 if change < self.tolerance else 0
+        self.epochs.append({"epoch": epoch, "error": error, "change": change})
+        self.stopped = self.quiet >= self.patience
+        return self.stopped
+
+    def save(self, path):
+        with open(path, "w") as json_file:
+            json.dump({"tolerance": self.tolerance, "patience": self.patience, "stopped": self.stopped,
+                       "epochs": self.epochs}, json_file, indent=1)
+        return path
@@ -0,0 +1,273 @@
+# -*- coding: utf8 -*-
+
+"""
+Block-wise raster access for the SOM-Toolbox.
+
+Every reader hands out horizontal strips of a single band as NumPy arrays, so
+a raster never has to be held in memory as a whole. Readers exist for plain
+NumPy arrays, for GDAL datasets and for arcpy rasters. Writers take strips
+the same way and create GDAL rasters (GeoTIFF) or in-memory arrays.
+
+Compressed GeoTIFFs are tiled (TILE_SIZE), DEFLATE compressed and get their
+overviews while they are written: the overview levels are created empty and
+every strip is decimated (nearest neighbour, like the pyramids of ArcGIS)
+into them, so the raster is never read back. The rows of every level are
+collected to whole tile rows before they go to GDAL, so no compressed tile
+is written twice.
+"""
+
+import re
+import numpy as np
+
+# number of raster rows read at once
+BLOCK_ROWS = 256
+
+# NoData value of float rasters (same as ArcGIS uses for float grids)
+FLOAT_NODATA = -3.4028234663852886e+38
+
+# file name extension of the raster drivers
+DRIVER_EXTENSIONS = {"GTiff": ".tif", "array": ""}
+
+# tile width and height of compressed GeoTIFFs, the smallest overview is no larger than a tile
+TILE_SIZE = 256
+
+# creation options of compressed GeoTIFFs; the predictor follows the data type
+COMPRESSED_OPTIONS = ("TILED=YES", "BLOCKXSIZE={}".format(TILE_SIZE), "BLOCKYSIZE={}".format(TILE_SIZE),
+                      "COMPRESS=DEFLATE", "ZLEVEL=6", "BIGTIFF=IF_SAFER")
+
+
+# returns the file name of a Windows or POSIX path (like .NET's Path.GetFileName)
+def file_name(path):
+    return re.split(r"[\\/]", str(path))[-1]
+
+
+# raster held in memory as a 2-dimensional NumPy array
+class ArrayRaster(object):
+    def __init__(self, array, nodata=None, name="array", geotransform=None, projection=None):
+        self.array = np.asarray(array)
+        if self.array.ndim != 2:
+            raise ValueError("ArrayRaster needs a 2-dimensional array.")
+        self.nodata = nodata
+        self.name = name
+        self.shape = self.array.shape
+        self.geotransform = geotransform
+        self.projection = projection
+
+    def read_rows(self, row, nrows):
+        return self.array[row:row + nrows]
+
+    def close(self):
+        pass
+
+
+# raster read through GDAL
+class GdalRaster(object):
+    def __init__(self, path, band=1):
+        from osgeo import gdal
+        self.dataset = gdal.Open(str(path))
+        if self.dataset is None:
+            raise IOError("Raster '{}' cannot be opened.".format(path))
+        self.band = self.dataset.GetRasterBand(band)
+        self.nodata = self.band.GetNoDataValue()
+        self.name = file_name(path)
+        self.shape = (self.dataset.RasterYSize, self.dataset.RasterXSize)
+        self.geotransform = self.dataset.GetGeoTransform()
+        self.projection = self.dataset.GetProjection()
+
+    def read_rows(self, row, nrows):
+        nrows = min(nrows, self.shape[0] - row)
+        return self.band.ReadAsArray(0, row, self.shape[1], nrows)
+
+    def close(self):
+        self.band = None
+        self.dataset = None
+
+
+# raster read through arcpy (ArcMap without GDAL bindings)
+class ArcpyRaster(object):
+    def __init__(self, path):
+        import arcpy
+        self._arcpy = arcpy
+        self.raster = arcpy.Raster(path)
+        self.nodata = self.raster.noDataValue
+        self.name = file_name(path)
+        self.shape = (self.raster.height, self.raster.width)
+        extent = self.raster.extent
+        self.geotransform = (extent.XMin, self.raster.meanCellWidth, 0.0,
+                             extent.YMax, 0.0, -self.raster.meanCellHeight)
+        self.projection = self.raster.spatialReference.exportToString()
+
+    def read_rows(self, row, nrows):
+        nrows = min(nrows, self.shape[0] - row)
+        extent = self.raster.extent
+        # RasterToNumPyArray is addressed by the lower left corner of the block
+        lower_left = self._arcpy.Point(extent.XMin,
+                                       extent.YMin + (self.shape[0] - row - nrows) * self.raster.meanCellHeight)
+        if self.nodata is None:
+            return self._arcpy.RasterToNumPyArray(self.raster, lower_left, self.shape[1], nrows)
+        return self._arcpy.RasterToNumPyArray(self.raster, lower_left, self.shape[1], nrows, self.nodata)
+
+    def close(self):
+        self.raster = None
+
+
+# raster written into an in-memory array
+class ArrayWriter(object):
+    def __init__(self, path, shape, dtype=np.float32, nodata=None, geotransform=None, projection=None):
+        self.path = path
+        self.array = np.empty(shape, dtype=dtype)
+        self.nodata = nodata
+        self.geotransform = geotransform
+        self.projection = projection
+
+    def write_rows(self, row, block):
+        self.array[row:row + block.shape[0]] = block
+
+    def close(self):
+        pass
+
+
+# creation options of a compressed GeoTIFF of a data type (horizontal differencing for integers)
+def compressed_options(dtype):
+    return list(COMPRESSED_OPTIONS) + ["PREDICTOR={}".format(3 if np.dtype(dtype).kind == "f" else 2)]
+
+
+# reduction factors of the overviews of a raster, down to the first level that fits into a tile
+def overview_factors(shape, tile_size=TILE_SIZE):
+    factors, factor = [], 2
+    while -(-max(shape) // (factor // 2)) > tile_size:
+        factors.append(factor)
+        factor *= 2
+    return factors
+
+
+# rows of a band collected to whole tile rows before they are written
+class TileRows(object):
+    def __init__(self, band, columns, dtype, tile_size=TILE_SIZE):
+        self.band = band
+        self.buffer = np.empty((tile_size, columns), dtype=dtype)
+        self.start = 0                                      # band row of the first buffered row
+        self.filled = 0
+
+    def write(self, block):
+        while len(block):
+            count = min(len(block), len(self.buffer) - self.filled)
+            self.buffer[self.filled:self.filled + count] = block[:count]
+            self.filled += count
+            block = block[count:]
+            if self.filled == len(self.buffer):
+                self.flush()
+
+    def flush(self):
+        if self.filled:
+            self.band.WriteArray(self.buffer[:self.filled], 0, self.start)
+            self.start += self.filled
+            self.filled = 0
+
+
+# overview level of a raster: the source rows and columns sampled for its cells (nearest neighbour)
+class OverviewLevel(object):
+    def __init__(self, band, shape, factor, dtype):
+        rows, columns = -(-shape[0] // factor), -(-shape[1] // factor)
+        self.rows = np.minimum(np.arange(rows) * factor + factor // 2, shape[0] - 1)
+        self.columns = np.minimum(np.arange(columns) * factor + factor // 2, shape[1] - 1)
+        self.tiles = TileRows(band, columns, dtype)
+
+    # samples the overview rows of a strip of source rows
+    def write(self, row, block):
+        first, last = np.searchsorted(self.rows, [row, row + block.shape[0]])
+        if last > first:
+            self.tiles.write(block[self.rows[first:last] - row][:, self.columns])
+
+
+# raster written through GDAL; with overviews the rows are written in whole tile rows together with the
+# levels of overview_factors(), so they have to come in order
+class GdalWriter(object):
+    def __init__(self, path, shape, dtype=np.float32, nodata=None, geotransform=None, projection=None,
+                 driver="GTiff", options=(), overviews=False):
+        from osgeo import gdal, gdal_array
+        self.path = path
+        data_type = gdal_array.NumericTypeCodeToGDALTypeCode(np.dtype(dtype).type)
+        self.dataset = gdal.GetDriverByName(driver).Create(str(path), shape[1], shape[0], 1, data_type,
+                                                            list(options))
+        if self.dataset is None:
+            raise IOError("Raster '{}' cannot be created.".format(path))
+        if geotransform:
+            self.dataset.SetGeoTransform(geotransform)
+        if projection:
+            self.dataset.SetProjection(projection)
+        self.band = self.dataset.GetRasterBand(1)
+        if nodata is not None:
+            self.band.SetNoDataValue(nodata)
+        self.tiles = None
+        self.levels = []
+        if overviews:
+            factors = overview_factors(shape)
+            if factors:
+                self.dataset.BuildOverviews("NONE", factors)  # empty levels, filled by write_rows()
+            self.tiles = TileRows(self.band, shape[1], dtype)
+            self.levels = [OverviewLevel(self.band.GetOverview(i), shape, factor, dtype)
+                           for i, factor in enumerate(factors)]
+
+    def write_rows(self, row, block):
+        if self.tiles is None:
+            self.band.WriteArray(block, 0, row)
+            return
+        self.tiles.write(block)
+        for level in self.levels:
+            level.write(row, block)
+
+    def close(self):
+        for tiles in [self.tiles] + [level.tiles for level in self.levels]:
+            if tiles is not None:
+                tiles.flush()
+        self.band.FlushCache()
+        self.band = None
+        self.tiles = None
+        self.levels = []
+        self.dataset = None
+
+
+# creates an output raster; 'like' is a raster whose georeference is copied; compressed GeoTIFFs are
+# tiled, DEFLATE compressed and get overviews
+def create_raster(path, shape, like=None, dtype=np.float32, nodata=FLOAT_NODATA, driver="GTiff",
+                  geotransform=None, projection=None, compressed=False):
+    geotransform = geotransform or getattr(like, "geotransform", None)
+    projection = projection or getattr(like, "projection", None)
+    path = path + DRIVER_EXTENSIONS.get(driver, "")
+    if driver == "array":
+        return ArrayWriter(path, shape, dtype, nodata, geotransform, projection)
+    if compressed and driver == "GTiff":
+        return GdalWriter(path, shape, dtype, nodata, geotransform, projection, driver, compressed_options(dtype),
+                          overviews=True)
+    return GdalWriter(path, shape, dtype, nodata, geotransform, projection, driver)
+
+
+# opens a raster path with GDAL if it is installed, otherwise with arcpy;
+# arrays and already opened readers are passed through
+def open_raster(source, nodata=None):
+    if hasattr(source, "read_rows"):
+        return source
+    if isinstance(source, np.ndarray):
+        return ArrayRaster(source, nodata)
+    try:
+        import osgeo.gdal  # noqa: F401
+    except ImportError:
+        return ArcpyRaster(source)
+    return GdalRaster(source)
+
+
+# yields (first row, block) for all row strips of a raster
+def iter_blocks(raster, block_rows=BLOCK_ROWS):
+    for row in range(0, raster.shape[0], block_rows):
+        yield row, raster.read_rows(row, block_rows)
+
+
+# boolean array which is True where a block holds data
+def valid_cells(block, nodata):
+    valid = np.ones(block.shape, dtype=bool)
+    if block.dtype.kind == "f":
+        valid &= ~np.isnan(block)
+    if nodata is not None and not np.isnan(nodata):
+        valid &= block != nodata
+    return valid
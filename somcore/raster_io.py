@@ -0,0 +1,156 @@
+# -*- coding: utf8 -*-
+
+"""
+Raster I/O of the SOM tool behind one interface, with arcpy or GDAL/NumPy.
+
+The processing chain (somcore.workflow) describes, masks, copies and deletes
+rasters only through a RasterIO object:
+
+    ArcpyRasterIO   ArcMap: map algebra, ESRI GRIDs, CreateSOMResultRaster.exe
+    GdalRasterIO    headless: block-wise NumPy, GeoTIFFs, somcore.rasterize
+
+'driver' names the somcore.raster driver of the result rasters; None means
+the result rasters are created by CreateSOMResultRaster.exe.
+"""
+
+import os
+from collections import namedtuple
+from os.path import join
+
+import numpy as np
+
+from somcore import cache
+from somcore.mask import MASK_NODATA, build_mask
+from somcore.raster import BLOCK_ROWS, GdalRaster, create_raster, file_name
+
+# cells of the mask converted by arcpy at once (uint8); larger masks are saved in blocks of rows and mosaicked
+ARCPY_BLOCK_CELLS = 1 << 26
+
+# description of an input raster; extent is (xmin, ymin, xmax, ymax), shape is (rows, columns)
+RasterInfo = namedtuple("RasterInfo", ["name", "path", "cell_width", "cell_height", "extent",
+                                       "spatial_reference", "spatial_reference_type", "pcs_code", "shape"])
+
+
+class ArcpyRasterIO(object):
+    name = "arcpy"
+    driver = None
+
+    def __init__(self):
+        import arcpy
+        self.arcpy = arcpy
+
+    def raster_path(self, folder, name):
+        return join(folder, name)
+
+    # one Describe() per raster (a raster dataset has the properties of its band)
+    def describe(self, path):
+        description = self.arcpy.Describe(path)
+        spatial_reference = description.spatialReference
+        extent = description.extent
+        return RasterInfo(str(description.name), description.catalogPath, description.meanCellWidth,
+                          description.meanCellHeight, (extent.XMin, extent.YMin, extent.XMax, extent.YMax),
+                          str(spatial_reference.name), str(spatial_reference.type), spatial_reference.PCSCode,
+                          (description.height, description.width))
+
+    # mask with 1 where all rasters have data, built strip by strip (somcore.mask); arcpy writes it
+    # from uint8 arrays instead of the float intermediates of the raster calculator, a mask of more
+    # than block_cells cells from blocks of rows saved next to it and mosaicked into the mask
+    def create_mask(self, paths, mask_path, block_cells=ARCPY_BLOCK_CELLS):
+        mask = build_mask(paths)
+        description = self.arcpy.Describe(paths[0])
+        rows, cols = mask.shape
+        block_rows = max(1, block_cells // cols)
+        blocks = []
+        try:
+            for row in range(0, rows, block_rows):
+                nrows = min(block_rows, rows - row)
+                bottom = description.extent.YMin + (rows - row - nrows) * description.meanCellHeight
+                raster = self.arcpy.NumPyArrayToRaster(mask.read_rows(row, nrows),
+                                                       self.arcpy.Point(description.extent.XMin, bottom),
+                                                       description.meanCellWidth, description.meanCellHeight,
+                                                       MASK_NODATA)
+                if nrows == rows:
+                    raster.save(mask_path)
+                    break
+                blocks.append(mask_path + "_{}".format(len(blocks)))
+                raster.save(blocks[-1])
+            if blocks:
+                folder, name = os.path.split(mask_path)
+                self.arcpy.MosaicToNewRaster_management(";".join(blocks), folder, name, description.spatialReference,
+                                                        "8_BIT_UNSIGNED", description.meanCellWidth, 1)
+        finally:
+            for block in blocks:
+                self.arcpy.Delete_management(block)
+        self.arcpy.DefineProjection_management(mask_path, description.spatialReference)
+        return mask
+
+    def exists(self, path):
+        return self.arcpy.Exists(path)
+
+    def copy_raster(self, source, destination):                 # GRIDs can't be copied as plain folders
+        self.arcpy.CopyRaster_management(source, destination)
+
+    def delete(self, path):
+        self.arcpy.Delete_management(path)
+
+    def create_folder(self, folder, name):
+        self.arcpy.CreateFolder_management(folder, name)
+
+
+class GdalRasterIO(object):
+    name = "gdal"
+    driver = "GTiff"
+
+    def raster_path(self, folder, name):
+        return join(folder, name + ".tif")
+
+    def describe(self, path):
+        from osgeo import osr
+        raster = GdalRaster(path)
+        try:
+            geotransform = raster.geotransform
+            rows, cols = raster.shape
+            xs = (geotransform[0], geotransform[0] + cols * geotransform[1])
+            ys = (geotransform[3], geotransform[3] + rows * geotransform[5])
+            spatial_reference = osr.SpatialReference(raster.projection or "")
+            projected = bool(spatial_reference.IsProjected())
+            name = spatial_reference.GetAttrValue("PROJCS" if projected else "GEOGCS") or "Unknown"
+            code = spatial_reference.GetAuthorityCode("PROJCS") if projected else None
+            return RasterInfo(file_name(path), os.path.abspath(path), abs(geotransform[1]), abs(geotransform[5]),
+                              (min(xs), min(ys), max(xs), max(ys)), name,
+                              "Projected" if projected else "Geographic", int(code) if code else 0, raster.shape)
+        finally:
+            raster.close()
+
+    # mask with 1 where all rasters have data (uint8, NoData 0), built strip by strip (somcore.mask)
+    def create_mask(self, paths, mask_path):
+        mask = build_mask(paths)
+        writer = create_raster(os.path.splitext(mask_path)[0], mask.shape, like=mask, dtype=np.uint8,
+                               nodata=MASK_NODATA, driver=self.driver)
+        try:
+            for row in range(0, mask.shape[0], BLOCK_ROWS):
+                writer.write_rows(row, mask.read_rows(row, BLOCK_ROWS))
+        finally:
+            writer.close()
+        return mask
+
+    def exists(self, path):
+        return os.path.exists(path)
+
+    def copy_raster(self, source, destination):
+        cache.copy_path(source, destination)
+
+    def delete(self, path):
+        cache.remove_path(path)
+
+    def create_folder(self, folder, name):
+        os.makedirs(join(folder, name))
+
+
+RASTER_IO = {"arcpy": ArcpyRasterIO, "gdal": GdalRasterIO}
+
+
+def get_raster_io(name):
+    if name not in RASTER_IO:
+        raise ValueError("Unknown raster I/O '{}', use one of {}.".format(name, ", ".join(sorted(RASTER_IO))))
+    return RASTER_IO[name]()
@@ -0,0 +1,209 @@
+# -*- coding: utf8 -*-
+
+"""
+Creates the result rasters from 'geospace.txt' and 'somspace.txt'
+(replaces CreateSOMResultRaster.exe for headless runs).
+
+GeoSpace: Geo_cluster, quant_error and one raster per input band, holding
+the values of the best matching unit of every valid mask cell. The rows of
+'geospace.txt' are in the order of the valid mask cells (row by row), so the
+file is streamed in chunks and scattered into row strips of all outputs in a
+single pass. Peak memory depends on the chunk size, not on the raster size.
+The x (column) and y (row) values of every chunk are checked against the
+cells it is scattered to, a file of another mask is rejected.
+
+SomSpace: SOM_cluster, umatrix and one raster per band, som_x by som_y cells
+of size 1 with the highest som_y in the top row.
+
+Compressed results (result format 'gtiff') are tiled, DEFLATE compressed
+GeoTIFFs with overviews (somcore.raster); the cluster rasters hold the
+cluster numbers as the smallest unsigned integer type that holds the largest
+cluster number of 'somspace.txt' (every node is a cluster without k-means),
+with the largest value of the type as NoData.
+"""
+
+from __future__ import division
+
+import io
+import itertools
+import os
+import sys
+from os.path import join
+
+import numpy as np
+
+from somcore.mask import index_blocks, mask_blocks
+from somcore.raster import FLOAT_NODATA, create_raster, open_raster
+
+# result formats: 'grid' writes ESRI GRIDs with CreateSOMResultRaster.exe (plain GeoTIFFs with the GDAL
+# raster I/O), 'gtiff' compressed, tiled GeoTIFFs with overviews
+RESULT_FORMATS = ("grid", "gtiff")
+
+# number of geospace rows (= valid cells) processed at once
+CHUNK_SIZE = 1 << 20
+
+# number of leading columns of 'geospace.txt' in front of the band values
+GEOSPACE_BAND_OFFSET = 6
+
+
+# data type and NoData of the cluster rasters for cluster numbers up to 'largest'; float32 unless compressed
+def cluster_type(largest=None, compressed=False):
+    if not compressed:
+        return np.float32, FLOAT_NODATA
+    for dtype in (np.uint8, np.uint16):
+        if largest is not None and int(largest) < np.iinfo(dtype).max:
+            return dtype, np.iinfo(dtype).max
+    return np.uint32, np.iinfo(np.uint32).max
+
+
+# largest cluster number of 'somspace.txt'
+def largest_cluster(somspace_txt):
+    column = read_header(somspace_txt).index("cluster")
+    return int(np.loadtxt(somspace_txt, skiprows=1, usecols=(column,), ndmin=1).max())
+
+
+# reads the header of a result file; the first token is the comment sign
+def read_header(path):
+    with io.open(path, "r", encoding="utf8") as result_file:
+        return result_file.readline().split()[1:]
+
+
+# band names are written as 'b_<name>'; names holding '\' are placed in subfolders
+def band_output(folder, name):
+    return join(folder, *name[2:].split("\\"))
+
+
+# reads the rows of a result file in chunks
+class ResultReader(object):
+    def __init__(self, path):
+        self.path = path
+        self.file = io.open(path, "rb")
+        self.header = self.file.readline().decode("utf8").split()[1:]
+
+    # next 'count' rows as (count x columns) float32 array
+    def read(self, count):
+        lines = list(itertools.islice(self.file, count))
+        values = np.fromstring(b" ".join(lines), dtype=np.float32, sep=" ")
+        if len(lines) < count or values.size != count * len(self.header):
+            raise ValueError("'{}' does not match the valid cells of the mask.".format(self.path))
+        return values.reshape(count, len(self.header))
+
+    # true when all rows have been read
+    def at_end(self):
+        return not self.file.readline().strip()
+
+    def close(self):
+        self.file.close()
+
+
+# raises unless the x (column) and y (row) values of the rows are the cells of a row strip
+def check_positions(path, values, columns, row, ncols, cells):
+    if not (np.array_equal(values[:, columns["x"]], cells % ncols) and
+            np.array_equal(values[:, columns["y"]], row + cells // ncols)):
+        raise ValueError("'{}' does not match the valid cells of the mask.".format(path))
+
+
+# writes the geospace rasters: Geo_cluster, quant_error and the bands; with the flat index of
+# the valid cells (somcore.mask) the mask raster itself isn't read; largest is the largest cluster
+# number (largest_cluster()), compressed cluster rasters without it are uint32
+def rasterize_geospace(geospace_txt, mask, geo_folder, number_bands, chunk_size=CHUNK_SIZE, driver="GTiff",
+                       index=None, compressed=False, largest=None):
+    mask = open_raster(mask)
+    reader = ResultReader(geospace_txt)
+    columns = dict((name, i) for i, name in enumerate(reader.header))
+    if not set(("x", "y", "cluster", "q_error")) <= set(columns):
+        raise ValueError("Formatting of the header file in {} is incompatible.".format(geospace_txt))
+    values_type = (np.float32, FLOAT_NODATA)
+    outputs = [(join(geo_folder, "Geo_cluster"), columns["cluster"], cluster_type(largest, compressed)),
+               (join(geo_folder, "quant_error"), columns["q_error"], values_type)]
+    for i in range(GEOSPACE_BAND_OFFSET, GEOSPACE_BAND_OFFSET + number_bands):
+        outputs.append((band_output(geo_folder, reader.header[i]), i, values_type))
+
+    for path, _, _ in outputs:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+    writers = [create_raster(path, mask.shape, like=mask, dtype=dtype, nodata=nodata, driver=driver,
+                             compressed=compressed) for path, _, (dtype, nodata) in outputs]
+    block_rows = max(1, chunk_size // mask.shape[1])
+    tiles = dict((dtype, np.empty((block_rows, mask.shape[1]), dtype=dtype)) for _, _, (dtype, _) in outputs)
+    try:
+        if index is None:
+            blocks = mask_blocks(mask, block_rows)
+        else:
+            blocks = index_blocks(index, mask.shape, block_rows)
+        for row, nrows, _, _, cells in blocks:
+            values = reader.read(len(cells))
+            check_positions(geospace_txt, values, columns, row, mask.shape[1], cells)
+            if compressed and len(cells) and values[:, columns["cluster"]].max() >= outputs[0][2][1]:
+                raise ValueError("'{}' has cluster numbers beyond {}.".format(geospace_txt, largest))
+            for writer, (_, column, (dtype, nodata)) in zip(writers, outputs):
+                strip = tiles[dtype][:nrows]
+                strip.fill(nodata)
+                strip.reshape(-1)[cells] = values[:, column]
+                writer.write_rows(row, strip)
+        if not reader.at_end():
+            raise ValueError("'{}' does not match the valid cells of the mask.".format(geospace_txt))
+    finally:
+        reader.close()
+        for writer in writers:
+            writer.close()
+    return writers
+
+
+# paths of the somspace rasters: SOM_cluster, umatrix and the bands ('b_<name>' header names)
+def somspace_paths(som_folder, band_names):
+    return ([join(som_folder, "SOM_cluster"), join(som_folder, "umatrix")] +
+            [band_output(som_folder, name) for name in band_names])
+
+
+# writes som planes (planes x som_y x som_x, the highest som_y in the top row) to the paths;
+# the first plane holds the clusters
+def write_som_planes(planes, paths, driver="GTiff", compressed=False):
+    som_y = planes.shape[1]
+    geotransform = (0.0, 1.0, 0.0, float(som_y), 0.0, -1.0)
+    writers = []
+    for i, (plane, path) in enumerate(zip(planes, paths)):
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        dtype, nodata = np.float32, FLOAT_NODATA
+        if i == 0:
+            labels = plane[plane != FLOAT_NODATA]
+            dtype, nodata = cluster_type(labels.max() if labels.size else 0, compressed)
+        if dtype != plane.dtype:
+            plane = np.where(plane == FLOAT_NODATA, nodata, plane).astype(dtype)
+        writer = create_raster(path, plane.shape, dtype=dtype, nodata=nodata, driver=driver,
+                               geotransform=geotransform, compressed=compressed)
+        writer.write_rows(0, plane)
+        writer.close()
+        writers.append(writer)
+    return writers
+
+
+# writes the somspace rasters: SOM_cluster, umatrix and the bands
+def rasterize_somspace(somspace_txt, som_folder, som_x, som_y, driver="GTiff", compressed=False):
+    header = read_header(somspace_txt)
+    table = np.loadtxt(somspace_txt, skiprows=1, ndmin=2)
+    columns = [len(header) - 1, len(header) - 2] + list(range(2, len(header) - 2))
+
+    som_x, som_y = int(som_x), int(som_y)
+    rows = som_y - 1 - table[:, 1].astype(int)                  # highest som_y in the top row
+    cols = table[:, 0].astype(int)
+    planes = np.full((len(columns), som_y, som_x), FLOAT_NODATA, dtype=np.float32)
+    planes[:, rows, cols] = table[:, columns].T
+    return write_som_planes(planes, somspace_paths(som_folder, header[2:-2]), driver, compressed)
+
+
+# same arguments as CreateSOMResultRaster.exe
+def create_result_rasters(workspace, geo_folder, som_folder, mask, geospace_txt, geo_cluster, somspace_txt,
+                          som_cluster, som_x, som_y, number_bands, chunk_size=CHUNK_SIZE, driver="GTiff",
+                          index=None, compressed=False):
+    rasterize_geospace(geospace_txt, mask, geo_folder, int(number_bands), chunk_size, driver, index, compressed,
+                       largest_cluster(somspace_txt))
+    rasterize_somspace(somspace_txt, som_folder, som_x, som_y, driver, compressed)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 12:
+        sys.exit("usage: python -m somcore.rasterize <workspace> <geo folder> <som folder> <mask> <geospace.txt> "
+                 "<geo cluster> <somspace.txt> <som cluster> <som_x> <som_y> <number of bands>")
+    create_result_rasters(*sys.argv[1:])
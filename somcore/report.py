@@ -0,0 +1,242 @@
+# -*- coding: utf8 -*-
+
+"""
+Run report of the SOM tool: timing, memory and I/O of every stage.
+
+For every stage the report records the wall time, the peak resident set size
+(RSS) and the bytes read and written by the tool's process, and the same for
+every external executable the stage starts. Where the number of cells is known
+it also records the throughput in cells/s. Optionally the trainer adds a trace
+with the duration of every epoch. The report is written as JSON
+('run_report.json' in the output folder):
+
+    {"started": ..., "finished": ...,
+     "stages": [{"name": "train", "status": "done", "wall_time": 12.5, "cells": 250000,
+                 "cells_per_second": 20000.0, "peak_rss": ..., "read_bytes": ..., "write_bytes": ...,
+                 "processes": [{"command": ..., "returncode": 0, "wall_time": ..., "peak_rss": ...,
+                                "read_bytes": ..., "write_bytes": ...}]}],
+     "epochs": [{"epoch": 0, "seconds": 1.2}, ...]}
+
+Peak RSS is the high-water mark of the process up to the end of the stage.
+On Linux the I/O counters of the tool's process include the executables it
+waited for. Values a platform cannot measure are null. Windows is queried through
+ctypes, Linux through /proc, other systems through psutil (if installed) or
+the resource module.
+
+The output of an executable (stdout and stderr) can be streamed line by line
+to a callback while it runs; its last lines go to the report and into the
+ProcessError raised for a non-zero exit code.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# name of the run report in the output folder
+REPORT_FILE = "run_report.json"
+
+# last lines of the output of an executable kept for the report and error messages
+OUTPUT_TAIL = 20
+
+
+# peak RSS and I/O byte counts of a process from psutil, or None without psutil
+def _psutil_usage(pid):
+    try:
+        import psutil
+    except ImportError:
+        return None
+    process = psutil.Process(pid)
+    memory = process.memory_info()
+    peak = getattr(memory, "peak_wset", None)               # Windows only
+    usage = {"peak_rss": peak if peak is not None else memory.rss, "read_bytes": None, "write_bytes": None}
+    try:
+        counters = process.io_counters()
+        usage["read_bytes"] = counters.read_bytes
+        usage["write_bytes"] = counters.write_bytes
+    except (AttributeError, psutil.Error):
+        pass
+    return usage
+
+
+# peak working set and transferred bytes of a Windows process handle
+def _windows_usage(handle):
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    class IoCounters(ctypes.Structure):
+        _fields_ = [(name, ctypes.c_ulonglong) for name in
+                    ("ReadOperationCount", "WriteOperationCount", "OtherOperationCount",
+                     "ReadTransferCount", "WriteTransferCount", "OtherTransferCount")]
+
+    memory = ProcessMemoryCounters()
+    memory.cb = ctypes.sizeof(memory)
+    io_counters = IoCounters()
+    usage = {"peak_rss": None, "read_bytes": None, "write_bytes": None}
+    handle = wintypes.HANDLE(int(handle))
+    if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(memory), memory.cb):
+        usage["peak_rss"] = memory.PeakWorkingSetSize
+    if ctypes.windll.kernel32.GetProcessIoCounters(handle, ctypes.byref(io_counters)):
+        usage["read_bytes"] = io_counters.ReadTransferCount
+        usage["write_bytes"] = io_counters.WriteTransferCount
+    return usage
+
+
+# peak RSS in bytes from a resource.getrusage() result (Linux reports kB, macOS bytes)
+def _maxrss(rusage):
+    return rusage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+# peak RSS (VmHWM) and I/O byte counts of the running process from /proc (Linux), or None
+def _proc_usage():
+    try:
+        with open("/proc/self/status") as status_file:
+            status = dict(line.split(":", 1) for line in status_file.read().splitlines() if ":" in line)
+        usage = {"peak_rss": int(status["VmHWM"].split()[0]) * 1024, "read_bytes": None, "write_bytes": None}
+    except (IOError, OSError, KeyError, ValueError):
+        return None
+    try:
+        with open("/proc/self/io") as io_file:
+            counters = dict(line.split(": ") for line in io_file.read().splitlines())
+        usage["read_bytes"] = int(counters["rchar"])
+        usage["write_bytes"] = int(counters["wchar"])
+    except (IOError, OSError, KeyError, ValueError):
+        pass
+    return usage
+
+
+# peak RSS and I/O byte counts of the running process
+def process_usage():
+    if sys.platform == "win32":
+        import ctypes
+        return _windows_usage(ctypes.windll.kernel32.GetCurrentProcess())
+    usage = _proc_usage() or _psutil_usage(os.getpid())
+    if usage is not None:
+        return usage
+    import resource
+    return {"peak_rss": _maxrss(resource.getrusage(resource.RUSAGE_SELF)), "read_bytes": None, "write_bytes": None}
+
+
+# runs an external executable like subprocess.call(); returns its exit code and its usage.
+# With output, stdout and stderr are passed to output(line) as the lines arrive (in the calling
+# thread, which ArcMap's messages and progressor need).
+def run_process(command, output=None, **popen_arguments):
+    started = time.time()
+    tail = deque(maxlen=OUTPUT_TAIL)
+    if output is not None:
+        popen_arguments.update(stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    process = subprocess.Popen(command, **popen_arguments)
+    if output is not None:
+        for line in iter(process.stdout.readline, b""):
+            line = line.decode("utf8", "replace").rstrip()
+            if line:
+                tail.append(line)
+                output(line)
+        process.stdout.close()
+    if sys.platform == "win32":
+        process.wait()
+        usage = _windows_usage(process._handle)             # the handle stays open until the object is gone
+    else:
+        _, status, rusage = os.wait4(process.pid, 0)
+        process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+        usage = {"peak_rss": _maxrss(rusage), "read_bytes": rusage.ru_inblock * 512,
+                 "write_bytes": rusage.ru_oublock * 512}
+    usage["wall_time"] = time.time() - started
+    if output is not None:
+        usage["output"] = list(tail)
+    return process.returncode, usage
+
+
+# difference of two counters, None if either is unknown
+def _difference(end, start):
+    if end is None or start is None:
+        return None
+    return end - start
+
+
+class ProcessError(RuntimeError):
+    def __init__(self, command, returncode, output=()):
+        message = "'{}' exited with code {}.".format(command, returncode)
+        if output:
+            message += " Last output:\n" + "\n".join(output)
+        super(ProcessError, self).__init__(message)
+        self.command = command
+        self.returncode = returncode
+        self.output = list(output)
+
+
+class RunReport(object):
+    def __init__(self, path=None):
+        self.path = path
+        self.started = time.time()
+        self.stages = []
+        self.epochs = []
+        self.current = None
+        self.epoch_started = self.started
+
+    # measures the enclosed stage; cells is a number or a function called after the stage
+    @contextmanager
+    def measure(self, name, cells=None):
+        start = process_usage()
+        started = time.time()
+        self.epoch_started = started
+        self.current = {"name": name, "status": "failed", "processes": []}
+        self.stages.append(self.current)
+        try:
+            yield self.current
+            self.current["status"] = "done"
+        finally:
+            end = process_usage()
+            wall_time = time.time() - started
+            self.current.update({"wall_time": wall_time, "peak_rss": end["peak_rss"],
+                                 "read_bytes": _difference(end["read_bytes"], start["read_bytes"]),
+                                 "write_bytes": _difference(end["write_bytes"], start["write_bytes"])})
+            try:
+                cells = cells() if callable(cells) else cells
+            except Exception:
+                cells = None
+            self.current["cells"] = cells
+            self.current["cells_per_second"] = cells / wall_time if cells and wall_time > 0 else None
+            self.current = None
+            self.save()
+
+    # records a stage that was not run (e.g. completed by an earlier run)
+    def skip(self, name):
+        self.stages.append({"name": name, "status": "skipped", "processes": []})
+
+    # runs an external executable of the current stage, see run_process(); with check a
+    # non-zero exit code raises ProcessError
+    def call(self, command, output=None, check=False, **popen_arguments):
+        returncode, usage = run_process(command, output, **popen_arguments)
+        usage.update({"command": " ".join(command) if isinstance(command, (list, tuple)) else command,
+                      "returncode": returncode})
+        if self.current is not None:
+            self.current["processes"].append(usage)
+        if check and returncode != 0:
+            raise ProcessError(usage["command"], returncode, usage.get("output", []))
+        return returncode
+
+    # trainer callback: records the duration of every epoch (the first one includes
+    # reading the data and initializing the codebook)
+    def epoch(self, epoch, codebook=None):
+        now = time.time()
+        self.epochs.append({"epoch": epoch, "seconds": now - self.epoch_started})
+        self.epoch_started = now
+
+    def as_dict(self):
+        return {"started": self.started, "finished": time.time(), "stages": self.stages, "epochs": self.epochs}
+
+    def save(self):
+        if self.path:
+            with open(self.path, "w") as report_file:
+                json.dump(self.as_dict(), report_file, indent=2)
@@ -0,0 +1,196 @@
+# -*- coding: utf8 -*-
+
+"""
+Best matching unit search over the codebook, exact or approximate.
+
+The numpy backend of somcore.som finds the best matching units with one of
+these searches ('bmu_search' in SOM.xml):
+
+    exact   brute-force scan over all nodes with BLAS (somcore.bmu), the default
+    kdtree  KD-tree over the codebook (scipy.spatial.cKDTree, optional), fast
+            for few bands; exact with eps = 0 (the default), with eps > 0 the
+            BMU found is at most (1 + eps) times farther than the closest node
+            and the queries on more bands get faster ('kdtree_eps' in SOM.xml)
+    local   local search on the map: every row starts at a seed node and moves
+            to the closest of its map neighbours (somcore.grid) until none is
+            closer. The seed is the BMU of the previous epoch when the same
+            data is searched again; otherwise the row starts from each of the
+            SEED_STARTS best nodes of a coarse sub-grid and keeps the best
+            result. The cost grows with the bands, the neighbours and the
+            sub-grid, not with the size of the map; it is meant for large maps.
+
+kdtree and local find the best matching unit only, not the second best, so
+with them the topographic error of 'quality.json' (somcore.quality) is null
+and the run log shows it as n/a.
+
+The final assignment of somcore.som compares a sample of the results of an
+approximate search with the exact search (check(), not run while training,
+so the epochs don't pay for an exact scan). The share of rows whose BMU
+differs and the mean excess of the distance to the BMU over the exact one
+are kept in 'checks' and written to 'bmu_check.json' in the output folder.
+The searches run in the calling thread, the 'workers' of SOM.xml don't
+apply to them.
+"""
+
+from __future__ import division
+
+import json
+
+import numpy as np
+
+from somcore import bmu
+
+# rows of every checked query compared with the exact search
+CHECK_ROWS = 10000
+
+# results of the comparisons, written to the output folder
+CHECK_FILE = "bmu_check.json"
+
+# default relative error bound of the KD-tree queries, 0 = exact
+KDTREE_EPS = 0.0
+
+# approximate number of nodes per side of the coarse sub-grid seeding the local search,
+# and number of its best nodes every row starts from
+SEED_NODES = 16
+SEED_STARTS = 3
+
+
+class ExactSearch(object):
+    name = "exact"
+
+    def __init__(self, grid, chunk_elements=bmu.CHUNK_ELEMENTS, check_rows=CHECK_ROWS):
+        self.grid = grid
+        self.chunk_elements = chunk_elements
+        self.check_rows = check_rows
+        self.checks = []
+
+    # best matching unit and squared distance of every data row
+    def query(self, data, codebook):
+        return bmu.best_matching_units(data, codebook, self.chunk_elements)
+
+    # sums of the data rows and number of hits per best matching unit
+    def node_sums(self, data, codebook):
+        bmus, _ = self.query(data, codebook)
+        nodes = codebook.shape[0]
+        sums = np.empty((nodes, data.shape[1]), dtype=np.float64)
+        for dimension in range(data.shape[1]):
+            sums[:, dimension] = np.bincount(bmus, weights=data[:, dimension], minlength=nodes)
+        return sums, np.bincount(bmus, minlength=nodes).astype(np.float64)
+
+    # compares the BMUs of a sample of the rows with the exact search
+    def check(self, data, codebook, bmus, distances):
+        if not len(bmus):
+            return None
+        sample = np.arange(len(bmus))
+        if len(sample) > self.check_rows:
+            sample = np.sort(np.random.RandomState(len(self.checks)).choice(sample, self.check_rows, replace=False))
+        exact, exact_distances = bmu.best_matching_units(data[sample], codebook, self.chunk_elements)
+        excess = np.sqrt(distances[sample]) - np.sqrt(exact_distances)
+        result = {"search": self.name, "rows": int(len(sample)),
+                  "disagreement": float(np.mean(bmus[sample] != exact)),
+                  "distance_excess": float(np.mean(np.maximum(excess, 0.0)))}
+        self.checks.append(result)
+        return result
+
+    def save_checks(self, path):
+        with open(path, "w") as check_file:
+            json.dump(self.checks, check_file, indent=1)
+        return path
+
+
+class KdTreeSearch(ExactSearch):
+    name = "kdtree"
+
+    def __init__(self, grid, chunk_elements=bmu.CHUNK_ELEMENTS, check_rows=CHECK_ROWS, eps=KDTREE_EPS):
+        super(KdTreeSearch, self).__init__(grid, chunk_elements, check_rows)
+        if eps < 0:
+            raise ValueError("The error bound of the KD-tree search must not be negative, got {}.".format(eps))
+        self.eps = eps
+
+    def query(self, data, codebook):
+        from scipy.spatial import cKDTree
+        tree = cKDTree(np.asarray(codebook, dtype=np.float64))
+        bmus = np.empty(data.shape[0], dtype=np.int32)
+        distances = np.empty(data.shape[0], dtype=np.float32)
+        for start, chunk in bmu.iter_chunks(data, codebook.shape[0], self.chunk_elements):
+            stop = start + chunk.shape[0]
+            found, nearest = tree.query(chunk, eps=self.eps)
+            bmus[start:stop] = nearest
+            distances[start:stop] = found ** 2
+        return bmus, distances
+
+
+class LocalSearch(ExactSearch):
+    name = "local"
+
+    def __init__(self, grid, chunk_elements=bmu.CHUNK_ELEMENTS, check_rows=CHECK_ROWS):
+        super(LocalSearch, self).__init__(grid, chunk_elements, check_rows)
+        self.data = None                                    # data of the previous query and its BMUs
+        self.previous = None
+        stride_x = max(1, grid.som_x // SEED_NODES)
+        stride_y = max(1, grid.som_y // SEED_NODES)
+        self.seed_nodes = np.flatnonzero((grid.x % stride_x == 0) & (grid.y % stride_y == 0))
+
+    # (rows x starts) nodes the rows start from
+    def seeds(self, data, codebook):
+        if self.data is data and self.previous is not None:
+            return self.previous[:, np.newaxis].copy()
+        nodes = codebook[self.seed_nodes]
+        norms = (nodes * nodes).sum(axis=1)
+        starts = min(SEED_STARTS, len(self.seed_nodes))
+        seeds = np.empty((data.shape[0], starts), dtype=np.int32)
+        for start, chunk in bmu.iter_chunks(data, len(self.seed_nodes), self.chunk_elements):
+            products = np.dot(chunk, nodes.T)
+            products *= -2.0
+            products += norms
+            seeds[start:start + chunk.shape[0]] = self.seed_nodes[np.argsort(products, axis=1)[:, :starts]]
+        return seeds
+
+    # moves every row of a chunk to the closest of its map neighbours until none is closer
+    def descend(self, chunk, codebook, current):
+        neighbours = self.grid.neighbours()
+        best = ((chunk - codebook[current]) ** 2).sum(axis=1)
+        active = np.arange(chunk.shape[0])
+        while active.size:
+            candidates = neighbours[current[active]]
+            candidates = np.where(candidates >= 0, candidates, current[active][:, np.newaxis])
+            difference = codebook[candidates] - chunk[active][:, np.newaxis, :]
+            distances = np.einsum("ijk,ijk->ij", difference, difference)
+            closest = distances.argmin(axis=1)
+            found = distances[np.arange(active.size), closest]
+            moved = found < best[active]
+            current[active[moved]] = candidates[moved, closest[moved]]
+            best[active[moved]] = found[moved]
+            active = active[moved]
+        return current, best
+
+    def query(self, data, codebook):
+        codebook = np.asarray(codebook, dtype=np.float32)
+        seeds = self.seeds(data, codebook)
+        bmus = np.empty(data.shape[0], dtype=np.int32)
+        distances = np.full(data.shape[0], np.inf, dtype=np.float32)
+        columns = self.grid.neighbours().shape[1] * codebook.shape[1]
+        step = max(1, self.chunk_elements // columns)
+        for start in range(0, data.shape[0], step):
+            chunk = np.ascontiguousarray(data[start:start + step], dtype=np.float32)
+            stop = start + chunk.shape[0]
+            for column in range(seeds.shape[1]):
+                found, found_distances = self.descend(chunk, codebook, seeds[start:stop, column])
+                better = found_distances < distances[start:stop]
+                bmus[start:stop][better] = found[better]
+                distances[start:stop][better] = found_distances[better]
+        self.data, self.previous = data, bmus
+        return bmus, distances
+
+
+# available searches by the name used in SOM.xml
+SEARCHES = {"exact": ExactSearch, "kdtree": KdTreeSearch, "local": LocalSearch}
+
+
+# kdtree_eps: error bound of the kdtree search
+def get_search(name, grid, chunk_elements=bmu.CHUNK_ELEMENTS, kdtree_eps=KDTREE_EPS):
+    if name not in SEARCHES:
+        raise ValueError("Unknown BMU search '{}', use one of {}.".format(name, ", ".join(sorted(SEARCHES))))
+    if name == "kdtree":
+        return KdTreeSearch(grid, chunk_elements, eps=kdtree_eps)
+    return SEARCHES[name](grid, chunk_elements)
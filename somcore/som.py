@@ -0,0 +1,642 @@
+# -*- coding: utf8 -*-
+
+"""
+Trains the SOM on 'SOM.lrn' (or 'SOM.npy') with the parameters of 'SOM.xml'
+and writes 'somspace.txt' and 'geospace.txt' (replaces nextsom_wrap.exe).
+
+The numpy backend runs batch-SOM epochs as matrix products: the best matching
+units are searched with BLAS (see somcore.bmu), the data rows are summed per
+best matching unit and the new codebook is (H . sums) / (H . hits) with the
+neighbourhood weights H between the nodes.
+The somoclu backend trains with the somoclu package (as nextsom_wrap.exe
+does) and is used as reference.
+
+The output files follow nextsom_wrap.exe:
+
+    geospace.txt  % x y z som_x som_y cluster b_<band> ... <band> ... q_error
+    somspace.txt  % som_x som_y b_<band> ... umatrix cluster
+
+The trained codebook is saved as 'codebook.npy' in the output folder, and
+during training as checkpoint every 'checkpoint_every' epochs. The assignment
+saves the codebook with its grid, clusters and band statistics as model
+('model.npz', see somcore.model) for scoring new rasters.
+
+The final assignment adds up the quantization and topographic error and the
+hits per node ('quality.json'), and with a convergence tolerance the training
+stops early once the error of the epochs levels off ('convergence.json', see
+somcore.quality).
+
+Training data normalized by somcore.lrn is trained and clustered as it is;
+the band values of somspace.txt and geospace.txt are mapped back to the
+original units with the saved normalization (somcore.normalize), the ones
+written by nextsom_wrap.exe with invert_result_files(). The quantization
+error and the U-matrix stay in normalized units.
+"""
+
+from __future__ import division
+
+import io
+import itertools
+import math
+import os
+import sys
+import xml.dom.minidom as dom
+
+import numpy as np
+
+from somcore import bmu, cache, cluster, lrn, model, normalize, parallel, quality, search
+from somcore.grid import Grid
+
+# nodes whose neighbourhood weights are computed at once in the batch update
+NODE_BLOCK = 256
+
+# nodes whose distances to their neighbours are computed at once for the U-matrix
+UMATRIX_BLOCK = 4096
+
+# trained codebook written to the output folder
+CODEBOOK_FILE = "codebook.npy"
+
+# codebook of an unfinished training, written every 'checkpoint_every' epochs
+CHECKPOINT_FILE = "codebook_checkpoint.npz"
+
+# rows of geospace.txt formatted and written at once
+WRITE_ROWS = 20000
+
+# gaussian updates are cut off beyond the radius (somoclu's default)
+COMPACT_SUPPORT = True
+
+# seed of the random initialization
+SEED = 0
+
+# default values of optional SOM.xml elements
+DEFAULTS = {"input_format": "lrn", "mapType": "planar", "gridType": "rectangular", "neighborhood": "gaussian",
+            "std_coeff": "0.5", "initialization": "random", "radius0": "0", "radiusN": "1",
+            "radiuscooling": "linear", "scale0": "0.1", "scaleN": "0.01", "scalecooling": "linear",
+            "number": "0", "number_min": "2", "number_max": "25", "warm_start": "false", "backend": "numpy",
+            "seed": str(SEED), "workers": "1", "pool_type": "thread", "training_mode": "batch",
+            "batch_size": str(lrn.STREAM_ROWS), "planned_training_mode": "", "planned_batch_size": "",
+            "checkpoint_every": "5", "bmu_search": "exact", "kdtree_eps": "0", "tolerance": "0"}
+
+
+# parameters of SOM.xml
+class SomConfig(object):
+    def __init__(self, path):
+        document = dom.parse(path)
+
+        def text(name, default=None):
+            elements = document.getElementsByTagName(name)
+            if not elements or elements[0].firstChild is None:
+                if default is None and name not in DEFAULTS:
+                    raise ValueError("'{}' is missing in {}.".format(name, path))
+                return DEFAULTS[name] if default is None else default
+            return elements[0].firstChild.data.strip()
+
+        self.input = text("input")
+        self.input_format = text("input_format")
+        self.output_somspace = text("output_somspace")
+        self.output_geospace = text("output_geospace")
+        self.output_folder = text("output_folder", "")
+        self.som_x = int(text("som_x"))
+        self.som_y = int(text("som_y"))
+        self.n_epoch = int(text("nEpoch"))
+        self.map_type = text("mapType")
+        self.grid_type = text("gridType")
+        self.neighborhood = text("neighborhood")
+        self.std_coeff = float(text("std_coeff"))
+        self.initialization = text("initialization")
+        self.radius0 = float(text("radius0"))
+        self.radius_n = float(text("radiusN"))
+        self.radius_cooling = text("radiuscooling")
+        self.scale0 = float(text("scale0"))
+        self.scale_n = float(text("scaleN"))
+        self.scale_cooling = text("scalecooling")
+        self.kmeans_number = int(text("number"))
+        self.kmeans_min = int(text("number_min"))
+        self.kmeans_max = int(text("number_max"))
+        self.kmeans_warm_start = text("warm_start") == "true"
+        self.backend = text("backend")
+        self.seed = int(text("seed"))
+        self.workers = int(text("workers"))                     # 0: one per core
+        self.pool_type = text("pool_type")
+        # batch or minibatch and the rows per mini-batch as requested; the ones planned for the memory
+        # budget (somcore.memory) are used for training but vary from run to run and aren't hashed
+        self.requested_training = (text("training_mode"), text("batch_size"))
+        self.training_mode = text("planned_training_mode") or text("training_mode")
+        self.batch_size = int(text("planned_batch_size") or text("batch_size")) or lrn.STREAM_ROWS
+        self.checkpoint_every = int(text("checkpoint_every"))  # epochs, 0: no checkpoints
+        self.bmu_search = text("bmu_search")                   # exact, kdtree or local (somcore.search)
+        self.kdtree_eps = float(text("kdtree_eps"))            # error bound of the kdtree search, 0: exact
+        self.tolerance = float(text("tolerance"))              # relative change of the epoch error, 0: all epochs
+        if self.radius0 == 0:                                   # 0 triggers half the smaller map side
+            self.radius0 = min(self.som_x, self.som_y) / 2.0
+        if self.radius_n == 0:                                  # and 1 as final radius (like somoclu)
+            self.radius_n = 1.0
+
+    def grid(self):
+        return Grid(self.som_x, self.som_y, self.map_type, self.grid_type)
+
+    # hash of the training data and everything the trained codebook depends on
+    def training_key(self):
+        return cache.cache_key(self.input, cache.modification_time(self.input), self.som_x, self.som_y,
+                               self.n_epoch, self.map_type, self.grid_type, self.neighborhood, self.std_coeff,
+                               self.initialization, self.radius0, self.radius_n, self.radius_cooling, self.scale0,
+                               self.scale_n, self.scale_cooling, self.backend, self.seed, self.requested_training,
+                               self.bmu_search, self.kdtree_eps, self.tolerance)
+
+
+# value of a linear or exponential cooling schedule in an epoch (like somoclu)
+def cooling(start, end, epoch, n_epoch, kind):
+    if n_epoch <= 1:
+        return start
+    if kind == "exponential":
+        if end == 0:
+            decay = -math.log(0.1) / n_epoch
+        else:
+            decay = -math.log(end / start) / n_epoch
+        return start * math.exp(-epoch * decay)
+    return start - epoch * (start - end) / (n_epoch - 1)
+
+
+# radius and scale of the last of 'steps' cooling steps (radiusN and scaleN with linear cooling)
+def final_cooling(config, steps):
+    return (cooling(config.radius0, config.radius_n, steps - 1, steps, config.radius_cooling),
+            cooling(config.scale0, config.scale_n, steps - 1, steps, config.scale_cooling))
+
+
+# neighbourhood weights of map distances
+def neighbourhood(distances, radius, scale, kind="gaussian", std_coeff=0.5, compact_support=COMPACT_SUPPORT):
+    if kind == "bubble":
+        return scale * (distances <= radius)
+    weights = np.exp(-distances ** 2 / (2.0 * (std_coeff * radius) ** 2))
+    if compact_support:
+        weights[distances > radius] = 0.0
+    return scale * weights
+
+
+# initial codebook: random within the range of the data, or spanned by the first two principal components
+def initialize_codebook(data, grid, initialization="random", seed=SEED):
+    return streamed_codebook([data], grid, initialization, seed)
+
+
+# float64 copies of the data given in parts, at most normalize.CHUNK_ROWS rows at once
+def float64_chunks(parts, rows=normalize.CHUNK_ROWS):
+    for part in parts:
+        for start in range(0, len(part), rows):
+            yield np.asarray(part[start:start + rows], dtype=np.float64)
+
+
+# initial codebook from data given in parts, with statistics gathered in one pass
+def streamed_codebook(parts, grid, initialization="random", seed=SEED):
+    if initialization == "pca":
+        count, mean, scatter = 0, None, None
+        for part in float64_chunks(parts):
+            part_mean = part.mean(axis=0)
+            centered = part - part_mean
+            part_scatter = np.dot(centered.T, centered)
+            if mean is None:
+                count, mean, scatter = part.shape[0], part_mean, part_scatter
+                continue
+            total = count + part.shape[0]                         # pairwise merge (Chan et al.)
+            delta = part_mean - mean
+            scatter = scatter + part_scatter + np.outer(delta, delta) * count * part.shape[0] / total
+            mean = mean + delta * part.shape[0] / total
+            count = total
+        return pca_codebook(mean, scatter / max(count - 1, 1), grid)
+    low, high = None, None
+    for part in parts:
+        part_low, part_high = np.min(part, axis=0), np.max(part, axis=0)
+        low = part_low if low is None else np.minimum(low, part_low)
+        high = part_high if high is None else np.maximum(high, part_high)
+    low, high = np.asarray(low, dtype=np.float64), np.asarray(high, dtype=np.float64)
+    random_state = np.random.RandomState(seed)
+    return (low + random_state.random_sample((grid.size, len(low))) * (high - low)).astype(np.float32)
+
+
+# codebook on the plane of the first two principal components (like somoclu)
+def pca_codebook(mean, covariance, grid):
+    variances, vectors = np.linalg.eigh(covariance)
+    order = np.argsort(variances)[::-1][:2]
+    variances, vectors = variances[order], vectors[:, order].T
+    vectors *= np.sign(vectors[np.arange(len(order)), np.abs(vectors).argmax(axis=1)])[:, np.newaxis]
+    coordinates = np.column_stack((grid.y / max(grid.som_y - 1, 1), grid.x / max(grid.som_x - 1, 1)))
+    coordinates = (coordinates - 0.5) * 2.0
+    return (mean + np.dot(coordinates[:, :len(order)], vectors * variances[:, np.newaxis])).astype(np.float32)
+
+
+# batch SOM trained with NumPy/BLAS
+class NumpyBackend(object):
+    name = "numpy"
+
+    def __init__(self, chunk_elements=bmu.CHUNK_ELEMENTS, workers=1, pool_type="thread", bmu_search=None):
+        self.chunk_elements = chunk_elements
+        self.workers = workers
+        self.pool_type = pool_type
+        self.pool = None
+        self.bmu_search = bmu_search                        # approximate search of somcore.search, in-thread
+        self.convergence = None                             # quality.Convergence of the last training
+
+    # pool of workers sharing the data, kept until the data changes or close() is called
+    def shard_pool(self, data):
+        if self.workers == 1:
+            return None
+        if self.pool is not None and self.pool.data is not data and self.pool.pool_type == "thread":
+            self.pool.set_data(data)
+        if self.pool is None or self.pool.data is not data:
+            self.close()
+            self.pool = parallel.ShardPool(data, self.workers, self.pool_type, self.chunk_elements)
+        return self.pool
+
+    # best matching unit and squared distance of every data row
+    def best_matching_units(self, data, codebook):
+        if self.bmu_search is not None:
+            return self.bmu_search.query(data, codebook)
+        pool = self.shard_pool(data)
+        if pool is not None:
+            return pool.best_matching_units(codebook)
+        return bmu.best_matching_units(data, codebook, self.chunk_elements)
+
+    # best and second best matching unit and squared distance of every data row; an approximate
+    # search finds no second unit (None)
+    def best_two_units(self, data, codebook):
+        if self.bmu_search is not None:
+            bmus, distances = self.bmu_search.query(data, codebook)
+            return bmus, None, distances
+        pool = self.shard_pool(data)
+        if pool is not None:
+            return pool.best_two_units(codebook)
+        return bmu.best_two_units(data, codebook, self.chunk_elements)
+
+    # sums of the data rows and number of hits per best matching unit
+    def node_sums(self, data, codebook):
+        if self.bmu_search is not None:
+            return self.bmu_search.node_sums(data, codebook)
+        pool = self.shard_pool(data)
+        if pool is not None:
+            return pool.node_sums(codebook)
+        return bmu.node_sums(data, codebook, self.chunk_elements)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
+    # neighbourhood weighted mean of the data for every node with data in its neighbourhood
+    def neighbourhood_means(self, grid, sums, hits, radius, config):
+        for start in range(0, grid.size, NODE_BLOCK):
+            nodes = np.arange(start, min(start + NODE_BLOCK, grid.size))
+            weights = neighbourhood(grid.distances(nodes), radius, 1.0, config.neighborhood, config.std_coeff)
+            numerator = np.dot(weights, sums)
+            denominator = np.dot(weights, hits)
+            updated = denominator > 0
+            yield nodes[updated], numerator[updated] / denominator[updated, np.newaxis], denominator[updated]
+
+    # adds the error of an epoch or a batch to the convergence tracking (data_norm: quality.squared_norm)
+    def track(self, data_norm, sums, hits, codebook):
+        if self.convergence is not None and data_norm is not None:
+            self.convergence.add(data_norm, sums, hits, codebook)
+
+    # one batch epoch: every node becomes the neighbourhood weighted mean of the data
+    def epoch(self, data, codebook, grid, radius, scale, config, data_norm=None):
+        sums, hits = self.node_sums(data, codebook)
+        self.track(data_norm, sums, hits, codebook)
+        new_codebook = np.array(codebook, dtype=np.float32)
+        for nodes, means, _ in self.neighbourhood_means(grid, sums, hits, radius, config):
+            new_codebook[nodes] = means
+        return new_codebook
+
+    # one mini-batch step: the online update w += scale * h * (x - w) summed over the batch, i.e. every
+    # node moves towards the neighbourhood weighted mean of the batch by scale * weight (at most all the way)
+    def minibatch_step(self, data, codebook, grid, radius, scale, config, data_norm=None):
+        sums, hits = self.node_sums(data, codebook)
+        self.track(data_norm, sums, hits, codebook)
+        new_codebook = np.array(codebook, dtype=np.float32)
+        for nodes, means, weights in self.neighbourhood_means(grid, sums, hits, radius, config):
+            rate = np.minimum(scale * weights, 1.0)[:, np.newaxis]
+            new_codebook[nodes] += rate * (means - new_codebook[nodes])
+        return new_codebook
+
+    # stops early once the convergence tolerance of the configuration is reached; the epochs left are
+    # skipped but the last one, the codebook still ends with the radius and scale of the full schedule
+    def train(self, data, codebook, grid, config, callback=None, first_epoch=0):
+        self.convergence = quality.Convergence(config.tolerance) if config.tolerance > 0 else None
+        data_norm = quality.squared_norm(data) if self.convergence is not None else None
+        for epoch in range(first_epoch, config.n_epoch):
+            radius = cooling(config.radius0, config.radius_n, epoch, config.n_epoch, config.radius_cooling)
+            scale = cooling(config.scale0, config.scale_n, epoch, config.n_epoch, config.scale_cooling)
+            codebook = self.epoch(data, codebook, grid, radius, scale, config, data_norm)
+            if callback is not None:
+                callback(epoch, codebook)
+            if self.convergence is not None and self.convergence.end_epoch(epoch):
+                if epoch < config.n_epoch - 1:
+                    radius, scale = final_cooling(config, config.n_epoch)
+                    codebook = self.epoch(data, codebook, grid, radius, scale, config)
+                    if callback is not None:
+                        callback(config.n_epoch - 1, codebook)
+                break
+        return codebook
+
+    # trains on data streamed in batches; parts() returns a new iterator over the batches of one epoch,
+    # radius and scale cool down from batch to batch over all the batches of the training, so that the
+    # last batch of the last epoch gets radiusN and scaleN; an early stop ends with an epoch at them
+    def train_minibatch(self, parts, count, codebook, grid, config, callback=None, first_epoch=0):
+        self.convergence = quality.Convergence(config.tolerance) if config.tolerance > 0 else None
+        batches = max(1, -(-count // config.batch_size))
+        steps = config.n_epoch * batches
+        for epoch in range(first_epoch, config.n_epoch):
+            for batch, part in enumerate(parts()):
+                step = min(epoch * batches + batch, steps - 1)
+                radius = cooling(config.radius0, config.radius_n, step, steps, config.radius_cooling)
+                scale = cooling(config.scale0, config.scale_n, step, steps, config.scale_cooling)
+                data_norm = quality.squared_norm(part.data) if self.convergence is not None else None
+                codebook = self.minibatch_step(part.data, codebook, grid, radius, scale, config, data_norm)
+            if callback is not None:
+                callback(epoch, codebook)
+            if self.convergence is not None and self.convergence.end_epoch(epoch):
+                if epoch < config.n_epoch - 1:
+                    radius, scale = final_cooling(config, steps)
+                    for part in parts():
+                        codebook = self.minibatch_step(part.data, codebook, grid, radius, scale, config)
+                    if callback is not None:
+                        callback(config.n_epoch - 1, codebook)
+                break
+        return codebook
+
+
+# training with the somoclu package (the trainer bundled in nextsom_wrap.exe)
+class SomocluBackend(NumpyBackend):
+    name = "somoclu"
+
+    # trains all epochs in one go: no checkpoints and no early stop, so a training can't resume after
+    # an epoch; callback(epoch, codebook) gets the codebook of the last epoch only
+    def train(self, data, codebook, grid, config, callback=None, first_epoch=0):
+        if first_epoch > 0:
+            raise ValueError("The somoclu backend cannot resume a training after epoch {}.".format(first_epoch))
+        import somoclu
+        som = somoclu.Somoclu(grid.som_x, grid.som_y, initialcodebook=np.array(codebook, dtype=np.float32),
+                              maptype=config.map_type, gridtype=config.grid_type,
+                              compactsupport=COMPACT_SUPPORT, neighborhood=config.neighborhood,
+                              std_coeff=config.std_coeff)
+        som.train(np.ascontiguousarray(data, dtype=np.float32), epochs=config.n_epoch,
+                  radius0=config.radius0, radiusN=config.radius_n, radiuscooling=config.radius_cooling,
+                  scale0=config.scale0, scaleN=config.scale_n, scalecooling=config.scale_cooling)
+        codebook = som.codebook.reshape(grid.size, -1)
+        if callback is not None:
+            callback(config.n_epoch - 1, codebook)
+        return codebook
+
+    def train_minibatch(self, parts, count, codebook, grid, config, callback=None, first_epoch=0):
+        raise ValueError("The somoclu backend supports batch training only.")
+
+
+# available trainers by the name used in SOM.xml
+BACKENDS = {"numpy": NumpyBackend, "somoclu": SomocluBackend}
+
+
+def get_backend(name, workers=1, pool_type="thread", bmu_search=None):
+    if name not in BACKENDS:
+        raise ValueError("Unknown SOM backend '{}', use one of {}.".format(name, ", ".join(sorted(BACKENDS))))
+    return BACKENDS[name](workers=workers, pool_type=pool_type, bmu_search=bmu_search)
+
+
+# trains a codebook, the initial codebook is created when not given
+def train(data, config, backend=None, codebook=None, callback=None):
+    grid = config.grid()
+    if codebook is None:
+        codebook = initialize_codebook(data, grid, config.initialization, config.seed)
+    if hasattr(backend, "train"):
+        return backend.train(data, codebook, grid, config, callback)
+    backend = get_backend(backend or config.backend, config.workers, config.pool_type)
+    try:
+        return backend.train(data, codebook, grid, config, callback)
+    finally:
+        backend.close()
+
+
+# mean distance of every codebook vector to its direct neighbours on the map (0 for a node without
+# neighbours), from the neighbour index table of the grid
+def umatrix(codebook, grid):
+    codebook = np.asarray(codebook, dtype=np.float64)
+    neighbours = grid.neighbours()
+    valid = neighbours >= 0
+    result = np.zeros(grid.size, dtype=np.float64)
+    for start in range(0, grid.size, UMATRIX_BLOCK):
+        stop = min(start + UMATRIX_BLOCK, grid.size)
+        table = np.where(valid[start:stop], neighbours[start:stop], np.arange(start, stop)[:, np.newaxis])
+        difference = codebook[table] - codebook[start:stop, np.newaxis, :]
+        distances = np.sqrt(np.einsum("ijk,ijk->ij", difference, difference))
+        count = valid[start:stop].sum(axis=1)
+        result[start:stop] = distances.sum(axis=1) / np.maximum(count, 1)
+    return result
+
+
+# mean distance of the data rows to their best matching unit
+def quantization_error(distances):
+    return float(np.sqrt(distances).mean()) if len(distances) else 0.0
+
+
+# share of the data rows whose best and second best matching units are not neighbours on the map
+def topographic_error(grid, first, second):
+    return float(np.mean(~grid.adjacent(first, second))) if len(first) else 0.0
+
+
+# writes somspace.txt: one row per node
+def write_somspace(path, codebook, grid, umatrix_values, labels, names):
+    header = "% som_x som_y " + " ".join("b_" + name for name in names) + " umatrix cluster\n"
+    line = "%d %d" + " %.7g" * codebook.shape[1] + " %.7g %d\n"
+    table = np.column_stack((grid.x, grid.y, codebook, umatrix_values, labels)).astype(np.float64)
+    with io.open(path, "wb") as somspace_file:
+        somspace_file.write(header.encode("utf8"))
+        somspace_file.write(((line * grid.size) % tuple(table.ravel().tolist())).encode("ascii"))
+    return path
+
+
+# best matching units and quantization errors of training data streamed in parts;
+# the parts are added to the band statistics and the quality metrics if given
+def assign_parts(parts, backend, codebook, statistics=None, metrics=None):
+    for part in parts:
+        if statistics is not None:
+            statistics.add(part.data)
+        bmus, second, distances = backend.best_two_units(part.data, codebook)
+        if backend.bmu_search is not None:
+            backend.bmu_search.check(part.data, codebook, bmus, distances)
+        if metrics is not None:
+            metrics.add(bmus, second, distances)
+        yield part, bmus, np.sqrt(distances)
+
+
+# writes geospace.txt: one row per valid cell with its best matching unit;
+# assignments are (training data, bmus, quantization errors) of consecutive parts;
+# codebook and data are written in the original units of a normalization
+def write_geospace(path, names, assignments, codebook, grid, labels, write_rows=WRITE_ROWS, scaling=None):
+    scaling = scaling or normalize.Normalization()
+    codebook = scaling.invert(codebook)
+    bands = codebook.shape[1]
+    header = ("% x y z som_x som_y cluster " + " ".join("b_" + name for name in names) + " " +
+              " ".join(names) + " q_error\n")
+    line = "%d %d 0 %d %d %d" + " %.7g" * (2 * bands) + " %.7g\n"
+    with io.open(path, "wb") as geospace_file:
+        geospace_file.write(header.encode("utf8"))
+        for training, bmus, q_error in assignments:
+            for start in range(0, len(bmus), write_rows):
+                stop = min(start + write_rows, len(bmus))
+                best = bmus[start:stop]
+                table = np.column_stack((training.cols[start:stop], training.rows[start:stop],
+                                         grid.x[best], grid.y[best], labels[best], codebook[best],
+                                         scaling.invert(training.data[start:stop]),
+                                         q_error[start:stop])).astype(np.float64)
+                geospace_file.write(((line * (stop - start)) % tuple(table.ravel().tolist())).encode("ascii"))
+    return path
+
+
+# maps the band columns of a somspace.txt or geospace.txt in normalized units ('b_<band>' and, in geospace.txt,
+# '<band>') to the original units of a normalization; the other columns are kept as they are written
+def invert_result_file(path, scaling, write_rows=WRITE_ROWS):
+    temporary = path + ".tmp"
+    with io.open(path, "rb") as result_file, io.open(temporary, "wb") as inverted_file:
+        header_line = result_file.readline()
+        header = header_line.decode("utf8").split()[1:]
+        codebook_columns = [i for i, name in enumerate(header) if name.startswith("b_")]
+        data_columns = [header.index(header[i][2:]) for i in codebook_columns if header[i][2:] in header]
+        inverted_file.write(header_line)
+        while True:
+            lines = list(itertools.islice(result_file, write_rows))
+            if not lines:
+                break
+            table = np.array(b" ".join(lines).split(), dtype=object).reshape(len(lines), len(header))
+            for columns in (codebook_columns, data_columns):
+                if columns:
+                    values = scaling.invert(table[:, columns].astype(np.float64))
+                    table[:, columns] = np.char.encode(np.char.mod("%.7g", values), "ascii")
+            inverted_file.write(b"".join(b" ".join(row) + b"\n" for row in table.tolist()))
+    os.remove(path)
+    os.rename(temporary, path)
+    return path
+
+
+# maps the result files of nextsom_wrap.exe to the original units of a normalization
+def invert_result_files(paths, scaling, write_rows=WRITE_ROWS):
+    if scaling.identity:
+        return paths
+    return [invert_result_file(path, scaling, write_rows) for path in paths]
+
+
+# writes a checkpoint of the training (replacing the previous one only when it is complete)
+def save_checkpoint(path, codebook, epoch, key):
+    temporary = path + ".tmp.npz"
+    np.savez(temporary, codebook=codebook, epoch=epoch, key=key)
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(temporary, path)
+
+
+# codebook and number of trained epochs of a checkpoint of the same training, or (None, 0)
+def load_checkpoint(path, key):
+    if not os.path.exists(path):
+        return None, 0
+    checkpoint = np.load(path)
+    try:
+        if str(checkpoint["key"]) != key:
+            return None, 0
+        return checkpoint["codebook"], int(checkpoint["epoch"]) + 1
+    finally:
+        checkpoint.close()
+
+
+# trains the codebook of a configuration; with checkpoints a broken-off training resumes
+# after the last checkpoint of the same training; callback(epoch, codebook) follows the epochs
+def train_codebook(config, backend, training=None, callback=None):
+    grid = config.grid()
+    checkpoint = None
+    if config.output_folder and config.checkpoint_every > 0:
+        checkpoint = os.path.join(config.output_folder, CHECKPOINT_FILE)
+    key = config.training_key()
+    codebook, first_epoch = load_checkpoint(checkpoint, key) if checkpoint else (None, 0)
+
+    def save(epoch, trained):
+        if callback is not None:
+            callback(epoch, trained)
+        if checkpoint and (epoch + 1) % config.checkpoint_every == 0 and epoch + 1 < config.n_epoch:
+            save_checkpoint(checkpoint, trained, epoch, key)
+
+    if config.training_mode == "minibatch":
+        def parts():
+            return lrn.stream_training_data(config.input, config.batch_size)
+
+        count, _ = lrn.training_info(config.input)
+        if codebook is None:
+            codebook = streamed_codebook((part.data for part in parts()), grid, config.initialization, config.seed)
+        codebook = backend.train_minibatch(parts, count, codebook, grid, config, save, first_epoch)
+    else:
+        if codebook is None:
+            codebook = initialize_codebook(training.data, grid, config.initialization, config.seed)
+        codebook = backend.train(training.data, codebook, grid, config, save, first_epoch)
+    if config.output_folder:
+        np.save(os.path.join(config.output_folder, CODEBOOK_FILE), codebook)
+        if getattr(backend, "convergence", None) is not None:
+            backend.convergence.save(os.path.join(config.output_folder, quality.CONVERGENCE_FILE))
+    if checkpoint and os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return codebook
+
+
+# k-means clusters of the codebook nodes with the settings of SOM.xml
+def cluster_labels(config, codebook):
+    return cluster.cluster_codebook(codebook, config.kmeans_number, config.kmeans_min, config.kmeans_max,
+                                    config.seed, config.workers, config.pool_type, config.kmeans_warm_start)
+
+
+# clusters a trained codebook (unless its labels are given), assigns the training data and writes
+# somspace.txt and geospace.txt, and the model (somcore.model) to the output folder
+def assign_codebook(config, codebook, backend, training=None, labels=None):
+    grid = config.grid()
+    scaling = normalize.load_normalization(lrn.normalization_file(config.input))
+    statistics = normalize.BandStatistics(codebook.shape[1])
+    metrics = quality.QualityMetrics(grid)
+    if config.training_mode == "minibatch":
+        names = lrn.training_info(config.input)[1]
+        assignments = assign_parts(lrn.stream_training_data(config.input, config.batch_size), backend, codebook,
+                                   statistics, metrics)
+    else:
+        names = training.names
+        assignments = list(assign_parts([training], backend, codebook, statistics, metrics))
+    if labels is None:
+        labels = cluster_labels(config, codebook)
+    write_somspace(config.output_somspace, scaling.invert(codebook), grid, umatrix(codebook, grid), labels, names)
+    write_geospace(config.output_geospace, names, assignments, codebook, grid, labels, scaling=scaling)
+    if config.output_folder:
+        model.save_model(os.path.join(config.output_folder, model.MODEL_FILE),
+                         model.SomModel(codebook, grid, labels, names, scaling, statistics.as_dict()))
+        metrics.save(os.path.join(config.output_folder, quality.QUALITY_FILE))
+    return metrics
+
+
+# runs the SOM step of SOM.xml: training (skipped when a trained codebook is given) and
+# assignment (skipped with assign=False, clustered unless labels are given). In minibatch mode
+# the training data is streamed from disk (with a thread pool, processes would restart for every batch).
+def run(xml_file, backend=None, codebook=None, assign=True, callback=None, labels=None):
+    config = SomConfig(xml_file)
+    minibatch = config.training_mode == "minibatch"
+    training = None if minibatch else lrn.read_training_data(config.input)
+    bmu_search = None
+    if config.bmu_search != "exact":
+        bmu_search = search.get_search(config.bmu_search, config.grid(), kdtree_eps=config.kdtree_eps)
+    backend = get_backend(backend or config.backend, config.workers, "thread" if minibatch else config.pool_type,
+                          bmu_search)
+    try:
+        if codebook is None:
+            codebook = train_codebook(config, backend, training, callback)
+        if assign:
+            assign_codebook(config, codebook, backend, training, labels)
+    finally:
+        backend.close()
+    if bmu_search is not None and config.output_folder:
+        bmu_search.save_checks(os.path.join(config.output_folder, search.CHECK_FILE))
+    return codebook
+
+
+# same argument as nextsom_wrap.exe: --xmlfile=<SOM.xml>
+if __name__ == "__main__":
+    arguments = [argument for argument in sys.argv[1:] if argument.startswith("--xmlfile=")]
+    if not arguments:
+        sys.exit("usage: python -m somcore.som --xmlfile=<SOM.xml>")
+    run(arguments[0].split("=", 1)[1].strip('"'))
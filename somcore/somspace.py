@@ -0,0 +1,76 @@
+# -*- coding: utf8 -*-
+
+"""
+SomSpace rasters straight from the trained codebook.
+
+SOM_cluster, umatrix and one component plane per band are computed from
+the trained codebook instead of being parsed back from 'somspace.txt'. The
+codebook rows are in node order (node = som_y * som_x + som_x), so the
+planes are one reshape of the (nodes x planes) table [cluster, umatrix,
+bands] and all of them are written in one pass. The U-matrix uses the
+neighbour index table of the grid (somcore.grid), rectangular or hexagonal,
+planar or toroid. The component planes are in the original units of
+normalized training data.
+
+Runs on its own to rebuild the SomSpace rasters of an earlier run without
+training again. Everything comes from its 'model.npz' (somcore.model): the
+codebook, the clusters, the band names and the normalization, so it works
+after the intermediates (SOM.xml, 'somspace.txt', the training data) have
+been deleted:
+
+    python -m somcore.somspace <model.npz> <som folder> [--driver GTiff] [--compressed]
+"""
+
+from __future__ import print_function
+
+import argparse
+import sys
+
+import numpy as np
+
+from somcore import model, som
+from somcore.raster import DRIVER_EXTENSIONS
+from somcore.rasterize import somspace_paths, write_som_planes
+
+
+# (planes x som_y x som_x) float32 array of SOM_cluster, umatrix and the bands, highest som_y in the top row
+def som_planes(codebook, grid, labels, umatrix_values=None):
+    if umatrix_values is None:
+        umatrix_values = som.umatrix(codebook, grid)
+    table = np.column_stack((labels, umatrix_values, codebook)).astype(np.float32)
+    return table.T.reshape(table.shape[1], grid.som_y, grid.som_x)[:, ::-1, :]
+
+
+# writes the somspace rasters of a codebook; names are the band names of the training data,
+# scaling its normalization (normalize.Normalization)
+def rasterize_codebook(codebook, grid, labels, names, som_folder, driver="GTiff", umatrix_values=None,
+                       scaling=None, compressed=False):
+    if scaling is not None:
+        if umatrix_values is None:
+            umatrix_values = som.umatrix(codebook, grid)
+        codebook = scaling.invert(codebook)
+    planes = som_planes(codebook, grid, labels, umatrix_values)
+    return write_som_planes(planes, somspace_paths(som_folder, ["b_" + name for name in names]), driver, compressed)
+
+
+# writes the somspace rasters of a saved model (somcore.model.MODEL_FILE)
+def rebuild(model_file, som_folder, driver="GTiff", compressed=False):
+    saved = model.load_model(model_file)
+    return rasterize_codebook(saved.codebook, saved.grid, saved.labels, saved.names, som_folder, driver,
+                              scaling=saved.normalization, compressed=compressed)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Rebuilds the SomSpace rasters from a trained codebook.")
+    parser.add_argument("model", help="model.npz of the run")
+    parser.add_argument("som_folder", help="folder of the rasters")
+    parser.add_argument("--driver", default="GTiff", choices=sorted(DRIVER_EXTENSIONS))
+    parser.add_argument("--compressed", action="store_true", help="tiled, DEFLATE compressed GeoTIFFs with overviews")
+    arguments = parser.parse_args(arguments)
+    writers = rebuild(arguments.model, arguments.som_folder, arguments.driver, arguments.compressed)
+    print("{} SomSpace rasters written to '{}'.".format(len(writers), arguments.som_folder))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+# -*- coding: utf8 -*-
+
+"""
+Hyperparameter sweep: many SOM configurations trained on one prepared dataset.
+
+The mask and the training data are created once (stages mask and lrn of
+somcore.workflow). Text training data is converted once to 'SOM.npy', which
+the worker processes memory-map read-only, so all of them share one copy in
+the page cache. Every configuration of the grid (the product of the values
+given per SOM.xml parameter) is trained in a pool of processes and scored:
+
+    qe      quantization error, mean distance of the data rows to their BMU
+    te      topographic error, share of data rows whose two best matching
+            units are not neighbours on the map
+    rank    sum of the ranks of qe and te among the configurations
+    k       number of clusters the k-means sweep picks (Davies-Bouldin)
+
+The scores go into one table ('sweep/sweep.csv' in the workspace). Only the
+best configuration is clustered and rasterized. The quantization error alone
+always favours the largest map (more nodes lie closer to the data) while the
+topographic error grows with the map, so by default the lowest rank wins;
+--criterion qe or te ranks by one of them:
+
+    python -m somcore.sweep <the 20 tool parameters> --grid som_x=10,20 som_y=10,20 nEpoch=10,30
+        radiuscooling=linear,exponential [--sweep-workers 0] [--criterion rank]
+"""
+
+from __future__ import division, print_function
+
+import csv
+import itertools
+import os
+import sys
+import time
+import xml.dom.minidom as dom
+from collections import OrderedDict
+from os.path import join
+
+from somcore import bmu, cluster, lrn, parallel, som, workflow
+from somcore.raster_io import get_raster_io
+
+# folder of the sweep in the workspace and its table
+SWEEP_FOLDER = "sweep"
+TABLE_FILE = "sweep.csv"
+
+# SOM.xml parameters that can be swept and the tool parameters they come from
+SWEEP_PARAMETERS = OrderedDict([("som_x", "cellsize_x"), ("som_y", "cellsize_y"), ("nEpoch", "num_epochs"),
+                                ("mapType", "map_type"), ("gridType", "grid_shape"),
+                                ("neighborhood", "neigh_func"), ("std_coeff", "Gaussian_coeff"),
+                                ("initialization", "inits"), ("radius0", "initial_neigh"),
+                                ("radiusN", "final_neigh"), ("radiuscooling", "radius_cooling"),
+                                ("scale0", "initial_trainingrate"), ("scaleN", "final_trainingrate"),
+                                ("scalecooling", "scale_cooling")])
+
+# columns of the scores in the table; the criteria are minimized
+SCORES = ["qe", "te", "rank", "k", "seconds"]
+CRITERIA = ("rank", "qe", "te")
+
+# errors whose ranks add up to the rank of a configuration
+RANKED_ERRORS = ("qe", "te")
+
+
+# {parameter: [values]} of "name=value,value,..." items
+def parse_grid(items):
+    grid = OrderedDict()
+    for item in items:
+        name, _, values = item.partition("=")
+        if name not in SWEEP_PARAMETERS or not values:
+            raise ValueError("Cannot sweep '{}', use name=value,value,... with a name of {}.".format(
+                item, ", ".join(SWEEP_PARAMETERS)))
+        grid[name] = values.split(",")
+    return grid
+
+
+# all combinations of the grid values as {parameter: value}
+def configurations(grid):
+    return [OrderedDict(zip(grid, values)) for values in itertools.product(*grid.values())]
+
+
+# text training data converted once to the memory-mappable binary form
+def prepare_data(path, folder):
+    if path.lower().endswith(lrn.INPUT_FORMATS["npy"]):
+        return path
+    prepared = join(folder, "SOM" + lrn.INPUT_FORMATS["npy"])
+    if not os.path.exists(prepared) or os.path.getmtime(prepared) < os.path.getmtime(path):
+        lrn.write_npy(prepared, lrn.read_lrn(path))
+    return prepared
+
+
+# writes the SOM.xml of a configuration: the base SOM.xml with the swept values, the prepared
+# data and an output folder of its own; every configuration trains on one core in batch mode
+# (the training mode planned for the tool's run is cleared, it would take precedence)
+def write_configuration(base_xml, values, data_file, folder):
+    tree = dom.parse(base_xml)
+    settings = dict(values, input=data_file, input_format="npy", output_folder=folder,
+                    output_somspace=join(folder, "somspace.txt"), output_geospace=join(folder, "geospace.txt"),
+                    workers="1", training_mode="batch", planned_training_mode="", planned_batch_size="",
+                    checkpoint_every="0")
+    for name, value in settings.items():
+        elements = tree.getElementsByTagName(name)
+        if elements:
+            element = elements[0]
+            while element.firstChild is not None:
+                element.removeChild(element.firstChild)
+        else:
+            parent = "som_files" if name.startswith(("input", "output")) else "som_parameters"
+            element = tree.createElement(name)
+            tree.getElementsByTagName(parent)[0].appendChild(element)
+        element.appendChild(tree.createTextNode(str(value)))
+    path = join(folder, "SOM.xml")
+    with open(path, "w") as xml_file:
+        tree.writexml(xml_file)
+    return path
+
+
+# trains and scores one configuration (runs in a worker process)
+def evaluate(xml_file):
+    started = time.time()
+    config = som.SomConfig(xml_file)
+    training = lrn.read_training_data(config.input)
+    backend = som.get_backend(config.backend)
+    try:
+        codebook = som.train_codebook(config, backend, training)
+    finally:
+        backend.close()
+    first, second, distances = bmu.best_two_units(training.data, codebook)
+    labels = cluster.cluster_codebook(codebook, config.kmeans_number, config.kmeans_min, config.kmeans_max,
+                                      config.seed, 1, "thread", config.kmeans_warm_start)
+    return {"qe": som.quantization_error(distances), "te": som.topographic_error(config.grid(), first, second),
+            "k": len(set(labels.tolist())), "seconds": time.time() - started}
+
+
+# trains and scores all configurations in a pool of processes; returns the rows of the table
+def run_sweep(base_xml, grid, data_file, folder, workers=0, log=print):
+    tasks = []
+    rows = []
+    for number, values in enumerate(configurations(grid)):
+        configuration_folder = join(folder, "config_{:03d}".format(number))
+        if not os.path.isdir(configuration_folder):
+            os.makedirs(configuration_folder)
+        tasks.append(write_configuration(base_xml, values, data_file, configuration_folder))
+        rows.append(OrderedDict([("config", number)] + list(values.items()) +
+                                [("codebook", join(configuration_folder, som.CODEBOOK_FILE))]))
+    log("Training {} SOM configurations.".format(len(tasks)))
+    for row, scores in zip(rows, parallel.map_tasks(evaluate, tasks, workers, "process")):
+        row.update(scores)
+    return rows
+
+
+# adds the rank of every row: the sum of its ranks (1 = lowest, ties share one) by qe and by te
+def rank_rows(rows):
+    for row in rows:
+        row["rank"] = 0
+    for name in RANKED_ERRORS:
+        values = sorted(row[name] for row in rows)
+        for row in rows:
+            row["rank"] += values.index(row[name]) + 1
+    return rows
+
+
+# rows ordered by a criterion (ties broken by qe, then te)
+def ranked(rows, criterion="rank"):
+    order = [criterion] + [name for name in RANKED_ERRORS if name != criterion]
+    return sorted(rows, key=lambda row: tuple(row[name] for name in order))
+
+
+def write_table(path, rows):
+    with open(path, "w") as table_file:
+        writer = csv.writer(table_file, lineterminator="\n")
+        columns = [name for name in rows[0] if name != "codebook"]
+        writer.writerow(columns)
+        for row in rows:
+            writer.writerow([row[name] for name in columns])
+    return path
+
+
+# tool parameters with the values of a configuration
+def winner_parameters(params, row, grid):
+    for name in grid:
+        setattr(params, SWEEP_PARAMETERS[name], row[name])
+    return params
+
+
+def parse_arguments(arguments=None):
+    parser = workflow.tool_argument_parser("Trains a grid of SOM configurations and rasterizes the best one.")
+    parser.add_argument("--grid", nargs="+", required=True, metavar="NAME=VALUES",
+                        help="values per SOM.xml parameter, e.g. som_x=10,20 radiuscooling=linear,exponential")
+    parser.add_argument("--sweep-workers", type=int, default=0, help="configurations trained at once, 0 = cores")
+    parser.add_argument("--criterion", default="rank", choices=CRITERIA)
+    return parser.parse_args(arguments)
+
+
+def main(arguments=None):
+    arguments = parse_arguments(arguments)
+    grid = parse_grid(arguments.grid)
+    params = workflow.tool_parameters(arguments)
+    if params.som_backend not in som.BACKENDS:
+        params.som_backend = "numpy"                        # the configurations are trained in-process
+    raster_io = get_raster_io(arguments.raster_io)
+
+    # mask and training data, created once
+    tool = workflow.SomTool(params, raster_io, error=workflow.print_error)
+    if not tool.run(until="lrn"):
+        return 1
+    folder = join(params.workspace, SWEEP_FOLDER)
+    if not os.path.isdir(folder):
+        os.makedirs(folder)
+    data_file = prepare_data(workflow.training_data_file(params), folder)
+
+    rows = ranked(rank_rows(run_sweep(join(params.workspace, "SOM.xml"), grid, data_file, folder,
+                                      arguments.sweep_workers)), arguments.criterion)
+    write_table(join(folder, TABLE_FILE), rows)
+    best = rows[0]
+    print("Best configuration: " + ", ".join("{}={}".format(name, best[name]) for name in grid) +
+          " (qe {:.6g}, te {:.4f}, rank {}, k {})".format(best["qe"], best["te"], best["rank"], best["k"]))
+
+    # clusters and rasterizes the winner with its trained codebook
+    tool = workflow.SomTool(winner_parameters(params, best, grid), raster_io, error=workflow.print_error)
+    tool.trained_codebook = best["codebook"]
+    return 0 if tool.run() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,790 @@
+# -*- coding: utf8 -*-
+
+"""
+Processing chain of the SOM tool, independent of ArcMap.
+
+SomTool runs the stages of SOM_Clustering.py (mask, lrn, train, cluster,
+rasterize and optionally loading the results into a map) for the 20 tool
+parameters, with its raster I/O behind somcore.raster_io. ArcMap uses it
+with arcpy; headless it runs with GDAL/NumPy and the in-repo replacements of
+the executables, e.g. many jobs in parallel on a server, each in its own
+workspace:
+
+    python -m somcore.workflow <workspace> "<raster>;<raster>;..." <som_x> <som_y> <epochs>
+        <min clusters> <max clusters> <initial centroids> <planar|toroid> <rectangular|hexagonal>
+        <delete intermediates: true|false> <random|pca> <gaussian|bubble> <std coeff>
+        <radius0> <radiusN> <linear|exponential> <scale0> <scaleN> <linear|exponential>
+        [--input-format npy] [--backend numpy] [--workers 0] [--raster-io gdal] ...
+
+The executables run with their output streamed to the log and the progress
+callback as it arrives; a non-zero exit code fails the stage at once.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import xml.dom.minidom as dom
+from os.path import join
+
+import numpy as np
+
+from somcore import (cache, lrn, mask, memory, model, normalize, parallel, pipeline, quality, rasterize, report,
+                     search, som, somspace)
+from somcore.raster import DRIVER_EXTENSIONS
+from somcore.raster_io import RASTER_IO, get_raster_io
+
+# folder of SOM_Clustering.py and the executables
+TOOL_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATH_TO_NEXTSOM_WRAP = join(TOOL_FOLDER, "nextsom_wrap_neu", "nextsom_wrap.exe")
+PATH_TO_CREATE_SOM_RESULT_RASTER = join(TOOL_FOLDER, "Release_CreateSOMResultRaster", "CreateSOMResultRaster.exe")
+
+# the 20 parameters of the toolbox in their order
+PARAMETERS = ["workspace", "input_raster", "cellsize_x", "cellsize_y", "num_epochs", "min_num_clusters",
+              "max_num_clusters", "num_initital_centroids", "map_type", "grid_shape", "is_checked_del", "inits",
+              "neigh_func", "Gaussian_coeff", "initial_neigh", "final_neigh", "radius_cooling",
+              "initial_trainingrate", "final_trainingrate", "scale_cooling"]
+
+# optional parameters following them (toolboxes of older versions don't define them) and their defaults
+OPTIONAL_PARAMETERS = [("input_format", "lrn"),            # lrn (text) or npy (binary)
+                       ("som_backend", "nextsom_wrap"),    # nextsom_wrap (exe), numpy or somoclu
+                       ("som_workers", "1"),               # workers of the numpy backend, 0 = all cores
+                       ("som_training_mode", "batch"),     # batch or minibatch (streams the training data)
+                       ("cache_size", "0"),                # MB of cached masks, training data and SOMs, 0 = no cache
+                       ("som_checkpoint_every", "5"),      # epochs between training checkpoints, 0 = none
+                       ("trace_epochs", "false"),          # adds the duration of every epoch to the run report
+                       ("bmu_search", "exact"),            # exact, kdtree or local (somcore.search)
+                       ("result_layers", "all"),           # all or summary, the layers loaded into the map
+                       ("normalization", "none"),          # none, zscore, minmax or robust (somcore.normalize)
+                       ("convergence_tolerance", "0"),     # relative epoch error change ending the training, 0 = off
+                       ("memory_limit", "0"),              # MB a run may use, 0 = most of the available memory
+                       ("som_batch_size", "0"),            # rows per mini-batch, 0 = chosen for the memory budget
+                       ("result_format", "grid"),          # grid (ESRI GRIDs) or gtiff (compressed, tiled, overviews)
+                       ("kdtree_eps", "0")]                # error bound of the kdtree BMU search, 0 = exact
+
+
+# tool parameters as texts, like arcpy.GetParameterAsText() returns them
+class ToolParameters(object):
+    def __init__(self, values):
+        values = list(values)
+        if len(values) < len(PARAMETERS):
+            raise ValueError("The SOM tool needs {} parameters, got {}.".format(len(PARAMETERS), len(values)))
+        for name, value in zip(PARAMETERS, values):
+            setattr(self, name, value)
+        optional = values[len(PARAMETERS):] + [""] * len(OPTIONAL_PARAMETERS)
+        for (name, default), value in zip(OPTIONAL_PARAMETERS, optional):
+            setattr(self, name, value if value else default)
+        # nextsom_wrap.exe reads the text SOM.lrn only
+        if self.input_format != "lrn" and self.som_backend not in som.BACKENDS:
+            raise ValueError("The input format '{}' needs an in-repo SOM backend ({}), nextsom_wrap.exe reads "
+                             "'lrn' only.".format(self.input_format, ", ".join(sorted(som.BACKENDS))))
+        # training mode and batch size chosen for the memory budget (SomTool.plan_memory); unlike the
+        # requested ones they don't go into the keys of the stages and the checkpoints
+        self.planned_training_mode = ""
+        self.planned_batch_size = ""
+
+    def rasters(self):
+        return self.input_raster.split(";")
+
+
+# path of the training data written by create_lrn() ('SOM.lrn' or 'SOM.npy')
+def training_data_file(params):
+    return join(params.workspace, "SOM" + lrn.INPUT_FORMATS[params.input_format])
+
+
+# parameters the trained SOM depends on
+def training_parameters(params):
+    return [params.cellsize_x, params.cellsize_y, params.num_epochs, params.map_type, params.grid_shape,
+            params.inits, params.neigh_func, params.Gaussian_coeff, params.initial_neigh, params.final_neigh,
+            params.radius_cooling, params.initial_trainingrate, params.final_trainingrate, params.scale_cooling,
+            params.som_backend, params.som_training_mode, params.som_batch_size, params.bmu_search,
+            params.kdtree_eps, params.convergence_tolerance]
+
+
+# startup info hiding the cmd windows of external processes (Windows only)
+def hidden_window():
+    if not hasattr(subprocess, "STARTUPINFO"):
+        return None
+    sinfo = subprocess.STARTUPINFO()
+    sinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW #si.wShowWindow = subprocess.SW_HIDE # default
+    return sinfo
+
+
+# creates an xml file for transferring parameters
+def write_xml(params, log):
+    tree = dom.Document()
+    som_configuration = dom.Element("som_configuration")
+
+    som_files = dom.Element("som_files")
+
+    som_input = dom.Element("input")
+    text = dom.Text()
+    text.data = training_data_file(params)
+    som_input.appendChild(text)
+
+    som_input_format = dom.Element("input_format")
+    text = dom.Text()
+    text.data = params.input_format
+    som_input_format.appendChild(text)
+
+    output_somspace = dom.Element("output_somspace")
+    text = dom.Text()
+    text.data = join(params.workspace,"somspace.txt")
+    output_somspace.appendChild(text)
+
+    output_geospace = dom.Element("output_geospace")
+    text = dom.Text()
+    text.data = join(params.workspace,"geospace.txt")
+    output_geospace.appendChild(text) 
+
+    output_folder = dom.Element("output_folder") 
+    text = dom.Text()
+    text.data = join(params.workspace,"output_folder")                     
+    output_folder.appendChild(text) 
+
+    som_files.appendChild(som_input)
+    som_files.appendChild(som_input_format)
+    som_files.appendChild(output_somspace)
+    som_files.appendChild(output_geospace)
+    som_files.appendChild(output_folder)
+
+    som_parameters = dom.Element("som_parameters")
+
+    som_x = dom.Element("som_x") 
+    text = dom.Text()
+    text.data = params.cellsize_x
+    som_x.appendChild(text) 
+
+    som_y = dom.Element("som_y")
+    text = dom.Text()
+    text.data = params.cellsize_y
+    som_y.appendChild(text) 
+
+    nEpoch = dom.Element("nEpoch")
+    text = dom.Text()
+    text.data = params.num_epochs
+    nEpoch.appendChild(text) 
+
+    mapType = dom.Element("mapType")
+    text = dom.Text()
+    text.data = params.map_type
+    mapType.appendChild(text) 
+
+    gridType = dom.Element("gridType")
+    text = dom.Text()
+    text.data = params.grid_shape
+    gridType.appendChild(text) 
+
+    neighborhood = dom.Element("neighborhood")
+    text = dom.Text()
+    text.data = params.neigh_func
+    neighborhood.appendChild(text) 
+
+    std_coeff = dom.Element("std_coeff")
+    text = dom.Text()
+    text.data = params.Gaussian_coeff.replace(",",".")
+    std_coeff.appendChild(text) 
+
+    initialization = dom.Element("initialization")
+    text = dom.Text()
+    text.data = params.inits
+    initialization.appendChild(text) 
+
+    radius0 = dom.Element("radius0")
+    text = dom.Text()
+    text.data = params.initial_neigh
+    radius0.appendChild(text) 
+
+    radiusN = dom.Element("radiusN")
+    text = dom.Text()
+    text.data = params.final_neigh
+    radiusN.appendChild(text) 
+
+    radiuscooling = dom.Element("radiuscooling")
+    text = dom.Text()
+    text.data = params.radius_cooling
+    radiuscooling.appendChild(text) 
+
+    scale0 = dom.Element("scale0")
+    text = dom.Text()
+    text.data = params.initial_trainingrate.replace(",",".")
+    scale0.appendChild(text) 
+
+    scaleN = dom.Element("scaleN")
+    text = dom.Text()
+    text.data = params.final_trainingrate.replace(",",".")
+    scaleN.appendChild(text) 
+
+    scalecooling = dom.Element("scalecooling")
+    text = dom.Text()
+    text.data = params.scale_cooling
+    scalecooling.appendChild(text) 
+
+    backend = dom.Element("backend")
+    text = dom.Text()
+    text.data = params.som_backend
+    backend.appendChild(text)
+
+    workers = dom.Element("workers")
+    text = dom.Text()
+    text.data = params.som_workers
+    workers.appendChild(text)
+
+    training_mode = dom.Element("training_mode")
+    text = dom.Text()
+    text.data = params.som_training_mode
+    training_mode.appendChild(text)
+
+    batch_size = dom.Element("batch_size")
+    text = dom.Text()
+    text.data = params.som_batch_size
+    batch_size.appendChild(text)
+
+    planned_training_mode = dom.Element("planned_training_mode")
+    text = dom.Text()
+    text.data = params.planned_training_mode
+    planned_training_mode.appendChild(text)
+
+    planned_batch_size = dom.Element("planned_batch_size")
+    text = dom.Text()
+    text.data = params.planned_batch_size
+    planned_batch_size.appendChild(text)
+
+    checkpoint_every = dom.Element("checkpoint_every")
+    text = dom.Text()
+    text.data = params.som_checkpoint_every
+    checkpoint_every.appendChild(text)
+
+    bmu_search = dom.Element("bmu_search")
+    text = dom.Text()
+    text.data = params.bmu_search
+    bmu_search.appendChild(text)
+
+    kdtree_eps = dom.Element("kdtree_eps")
+    text = dom.Text()
+    text.data = params.kdtree_eps.replace(",",".")
+    kdtree_eps.appendChild(text)
+
+    tolerance = dom.Element("tolerance")
+    text = dom.Text()
+    text.data = params.convergence_tolerance.replace(",",".")
+    tolerance.appendChild(text)
+   
+    som_parameters.appendChild(som_x)
+    som_parameters.appendChild(som_y)
+    som_parameters.appendChild(nEpoch)
+    som_parameters.appendChild(mapType)
+    som_parameters.appendChild(gridType)
+    som_parameters.appendChild(neighborhood)
+    som_parameters.appendChild(std_coeff)
+    som_parameters.appendChild(initialization)
+    som_parameters.appendChild(radius0)
+    som_parameters.appendChild(radiusN)
+    som_parameters.appendChild(radiuscooling)
+    som_parameters.appendChild(scale0)
+    som_parameters.appendChild(scaleN)
+    som_parameters.appendChild(scalecooling)
+    som_parameters.appendChild(backend)
+    som_parameters.appendChild(workers)
+    som_parameters.appendChild(training_mode)
+    som_parameters.appendChild(batch_size)
+    som_parameters.appendChild(planned_training_mode)
+    som_parameters.appendChild(planned_batch_size)
+    som_parameters.appendChild(checkpoint_every)
+    som_parameters.appendChild(bmu_search)
+    som_parameters.appendChild(kdtree_eps)
+    som_parameters.appendChild(tolerance)
+    
+    Kmeans = dom.Element("kMeans")
+
+    number = dom.Element("number")
+    text = dom.Text()
+    text.data = params.num_initital_centroids
+    number.appendChild(text) 
+
+    number_min = dom.Element("number_min")
+    text = dom.Text()
+    text.data = params.min_num_clusters
+    number_min.appendChild(text) 
+
+    number_max = dom.Element("number_max")
+    text = dom.Text()
+    text.data = params.max_num_clusters
+    number_max.appendChild(text) 
+
+    Kmeans.appendChild(number)
+    Kmeans.appendChild(number_min)
+    Kmeans.appendChild(number_max)
+        
+    som_parameters.appendChild(Kmeans)
+    
+    som_configuration.appendChild(som_files)
+    som_configuration.appendChild(som_parameters)
+
+    tree.appendChild(som_configuration)
+
+    f = open(join(params.workspace,"SOM.xml"), "w")
+    tree.writexml(f, "", "\t", "\n")
+    f.close()
+    path_to_somxml = join(params.workspace,"SOM.xml") 
+    if os.path.exists(path_to_somxml):
+        log("File 'SOM.xml' is written.")
+    return path_to_somxml
+
+
+class SomTool(object):
+    # progress(message, percent=None) shows the running stage, the epochs of the training and the
+    # output of the executables (arcpy.SetProgressorLabel / SetProgressorPosition in ArcMap)
+    def __init__(self, params, raster_io, log=print, error=None, executables=None, progress=None):
+        self.params = params
+        self.raster_io = raster_io
+        self.log = log
+        self.error = error or log
+        self.progress = progress or (lambda message, percent=None: None)
+        self.path_to_nextsom_wrap, self.path_to_CreateSomResultRaster = executables or (
+            PATH_TO_NEXTSOM_WRAP, PATH_TO_CREATE_SOM_RESULT_RASTER)
+        self.sinfo = hidden_window()
+        self.trained_codebook = None                        # codebook trained by somcore.sweep (in-repo backends)
+        self.rasterize_chunk = rasterize.CHUNK_SIZE         # geospace rows rasterized at once (plan_memory)
+        self._descriptions = None
+        self.artifact_cache = None                          # cache of intermediate results, kept in the workspace
+        if float(params.cache_size) > 0:
+            self.artifact_cache = cache.ArtifactCache(join(params.workspace, "cache"),
+                                                      int(float(params.cache_size) * 2 ** 20), log)
+        # timing, memory and I/O of the stages
+        self.run_report = report.RunReport(join(params.workspace, "output_folder", report.REPORT_FILE))
+
+    # descriptions of the input rasters, one describe() per raster and run
+    def descriptions(self):
+        if self._descriptions is None:
+            self._descriptions = [self.raster_io.describe(layers) for layers in self.params.rasters()]
+        return self._descriptions
+
+    # modification time and extent of every input raster, the inputs of the cached stages
+    def raster_fingerprints(self):
+        return [[description.path, cache.modification_time(description.path), str(description.extent)]
+                for description in self.descriptions()]
+
+    # number of cells of the input rasters and number of valid cells (rows of the training data)
+    def raster_cells(self):
+        rows, cols = self.descriptions()[0].shape
+        return rows * cols
+
+    def training_cells(self):
+        return lrn.training_info(training_data_file(self.params))[0]
+
+    # runs a stage unless the cache holds its outputs ({name: path}) for the same key
+    def cached_stage(self, stage, key, outputs, run_stage, copy=cache.copy_path):
+        if self.artifact_cache is not None and self.artifact_cache.fetch(stage, key, outputs, copy):
+            return True
+        run_stage()
+        if self.artifact_cache is not None and all(self.raster_io.exists(path) for path in outputs.values()):
+            self.artifact_cache.store(stage, key, outputs, copy)
+        return False
+
+    # creates a folder in the workspace unless it exists (a resumed run keeps its contents)
+    def createfolder(self, name):
+        path_to_folder = join(self.params.workspace, name)
+        if not self.raster_io.exists(path_to_folder):
+            self.raster_io.create_folder(self.params.workspace, name)
+            if self.raster_io.exists(path_to_folder):
+                self.log("Folder '{}' is created.".format(name))
+        return path_to_folder
+
+    # creates the folders 'Temp', 'GeoSpace', 'SomSpace' and 'output_folder' in the workspace
+    def createfolders(self):
+        path_to_temp0 = self.createfolder("Temp")
+        path_to_geofolder0 = self.createfolder("GeoSpace")
+        path_to_somfolder0 = self.createfolder("SomSpace")
+        path_to_outputfolder0 = self.createfolder("output_folder")
+        return path_to_temp0, path_to_geofolder0, path_to_somfolder0, path_to_outputfolder0
+
+    def write_xml(self):
+        return write_xml(self.params, self.log)
+
+    # creates the mask: 1 where all input rasters have data, and the flat index of its valid cells
+    def create_mask(self, path_to_temp):
+        self.log("Creating mask.")
+        path_to_mask = self.raster_io.raster_path(path_to_temp, "mask")
+        valid_mask = self.raster_io.create_mask(self.params.rasters(), path_to_mask)
+        valid_mask.save_index(join(path_to_temp, mask.MASK_INDEX_FILE))
+        self.log("The mask has {} of {} cells with data.".format(valid_mask.count, self.raster_cells()))
+        return path_to_mask
+
+    # flat index of the valid cells saved with the mask, None for a mask of an older run
+    def mask_index(self, path_to_temp):
+        path = join(path_to_temp, mask.MASK_INDEX_FILE)
+        return mask.load_index(path) if os.path.exists(path) else None
+
+    # copies the mask raster with the raster I/O and its index as a file
+    def copy_mask(self, source, destination):
+        if source.endswith(".npy"):
+            cache.copy_path(source, destination)
+        else:
+            self.raster_io.copy_raster(source, destination)
+
+    # creates 'SOM.lrn' (or 'SOM.npy') from the mask and the input rasters (replaces Run_CreateSOMLrnFile.exe),
+    # normalized with the band statistics gathered on the way
+    def create_lrn(self, path_to_temp):
+        output_lrn_file = training_data_file(self.params)
+        self.log("Creating '{}'.".format(os.path.basename(output_lrn_file)))
+        lrn.create_lrn(output_lrn_file, self.raster_io.raster_path(path_to_temp, "mask"), self.params.rasters(),
+                       index=self.mask_index(path_to_temp), normalization=self.params.normalization)
+        if self.params.normalization != "none":
+            self.log("The bands are normalized ({}), the statistics are saved in '{}'.".format(
+                self.params.normalization, os.path.basename(lrn.normalization_file(output_lrn_file))))
+        return None
+
+    # runs an external executable, its usage goes to the run report; its output is logged as it
+    # arrives and a non-zero exit code fails the stage (report.ProcessError)
+    def call(self, command):
+        return self.run_report.call(command, self.output, True, startupinfo=self.sinfo)
+
+    # a line of output of an executable
+    def output(self, line):
+        self.log(line)
+        self.progress(line)
+
+    # trainer callback: epoch progress and, with trace_epochs, the epoch trace of the run report
+    def epoch_callback(self):
+        n_epoch = int(self.params.num_epochs)
+        trace = str(self.params.trace_epochs) == 'true'
+
+        def epoch(number, codebook):
+            if trace:
+                self.run_report.epoch(number, codebook)
+            self.progress("Training the SOM: epoch {} of {}.".format(number + 1, n_epoch))
+        return epoch
+
+    # executes nextsom_wrap.exe or trains the SOM in-process with a backend of somcore.som;
+    # a cached codebook (or for the exe the cached result files) skips the training
+    def wrap(self, path_to_somxml, key):
+        workspace = self.params.workspace
+        if self.trained_codebook is not None:
+            self.log("Using the SOM trained in '{}'.".format(self.trained_codebook))
+            cache.copy_path(self.trained_codebook, join(workspace, "output_folder", som.CODEBOOK_FILE))
+            return None
+        if self.params.som_backend in som.BACKENDS:
+            outputs = {som.CODEBOOK_FILE: join(workspace, "output_folder", som.CODEBOOK_FILE)}
+            self.log("Training the SOM with the '{}' SOM backend.".format(self.params.som_backend))
+            if self.params.bmu_search != "exact" and self.params.som_workers != "1":
+                self.log("The {} BMU search runs in one thread, the SOM workers apply to the clustering only.".format(
+                    self.params.bmu_search))
+            self.cached_stage("train", key, outputs,
+                              lambda: som.run(path_to_somxml, assign=False, callback=self.epoch_callback()))
+            self.log_convergence()
+            return None
+        if self.sinfo is None:
+            raise RuntimeError("nextsom_wrap.exe runs on Windows only, use the numpy or somoclu SOM backend.")
+        outputs = {"geospace.txt": join(workspace, "geospace.txt"), "somspace.txt": join(workspace, "somspace.txt")}
+        proc_command = '{} --xmlfile="{}"'.format(self.path_to_nextsom_wrap, path_to_somxml)
+
+        # nextsom_wrap.exe writes the bands of normalized training data in normalized units
+        def train():
+            self.call(proc_command)
+            scaling = normalize.load_normalization(lrn.normalization_file(training_data_file(self.params)))
+            som.invert_result_files(list(outputs.values()), scaling)
+
+        self.log("Processing 'SOM.xml' and executing 'nextsom_wrap.exe'.")
+        self.cached_stage("train", key, outputs, train)
+        return None
+
+    # clusters the trained codebook and writes 'geospace.txt' and 'somspace.txt' (nextsom_wrap.exe already did)
+    def cluster(self, path_to_somxml):
+        if self.params.som_backend in som.BACKENDS:
+            self.log("Clustering the SOM and assigning the training data.")
+            som.run(path_to_somxml,
+                    codebook=np.load(join(self.params.workspace, "output_folder", som.CODEBOOK_FILE)))
+            self.log_bmu_checks()
+            self.log_quality()
+        return None
+
+    # epochs trained when the training stopped early (somcore.quality)
+    def log_convergence(self):
+        path = join(self.params.workspace, "output_folder", quality.CONVERGENCE_FILE)
+        if float(self.params.convergence_tolerance.replace(",", ".")) <= 0 or not os.path.exists(path):
+            return
+        with open(path) as convergence_file:
+            convergence = json.load(convergence_file)
+        if not convergence["stopped"]:
+            return
+        epochs = convergence["epochs"][-1]["epoch"] + 1
+        if epochs < int(self.params.num_epochs):
+            self.log("The training converged after {} of {} epochs and ended with one epoch at the final "
+                     "radius and training rate.".format(epochs, self.params.num_epochs))
+
+    # quantization and topographic error of the training data (somcore.quality); the kdtree and local
+    # BMU searches find no second BMU, the topographic error is n/a then
+    def log_quality(self):
+        path = join(self.params.workspace, "output_folder", quality.QUALITY_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path) as quality_file:
+            metrics = json.load(quality_file)
+        topographic_error = metrics["topographic_error"]
+        if topographic_error is None:
+            topographic_error = "n/a (the {} BMU search finds no second BMU)".format(self.params.bmu_search)
+        else:
+            topographic_error = "{:.4f}".format(topographic_error)
+        self.log("Quantization error {:.6g}, topographic error {}, {} of {} nodes without data.".format(
+            metrics["quantization_error"], topographic_error, metrics["empty_nodes"], len(metrics["hits"])))
+
+    # disagreement of an approximate BMU search with the exact one (somcore.search)
+    def log_bmu_checks(self):
+        path = join(self.params.workspace, "output_folder", search.CHECK_FILE)
+        if self.params.bmu_search == "exact" or not os.path.exists(path):
+            return
+        with open(path) as check_file:
+            checks = json.load(check_file)
+        rows = sum(check["rows"] for check in checks)          # one check per assigned part
+        if rows:
+            disagreement = sum(check["disagreement"] * check["rows"] for check in checks) / float(rows)
+            excess = sum(check["distance_excess"] * check["rows"] for check in checks) / float(rows)
+            self.log("The {} BMU search differs from the exact one for {:.2%} of the checked cells "
+                     "(mean distance excess {:.4g}).".format(self.params.bmu_search, disagreement, excess))
+
+    # creates the result rasters with somcore.rasterize (the SomSpace rasters of in-repo backends straight
+    # from model.npz, somcore.somspace), or with CreateSOMResultRaster.exe for ESRI GRIDs; the result
+    # format 'gtiff' writes compressed GeoTIFFs with overviews with either raster I/O
+    def resultraster(self, path_to_temp, path_to_geofolder, path_to_somfolder):
+        params = self.params
+        maskRasterFullFileName = self.raster_io.raster_path(path_to_temp, "mask")
+        GeoSpaceTxtFullFileName = join(params.workspace,"geospace.txt")
+        GeoClusterFullFileName = join(path_to_geofolder, "Geo_cluster")
+        SomSpaceTxtFullFileName = join(params.workspace,"somspace.txt")
+        SomClusterFullFileName = join(path_to_somfolder, "SOM_cluster")
+        SomDim_X = params.cellsize_x # number of cells in x-direction
+        SomDim_Y = params.cellsize_y # number of cells in y-direction
+        NumberMID = len(params.rasters())
+
+        self.log("Creating results. This can take a few minutes.")
+        arguments = [params.workspace, path_to_geofolder, path_to_somfolder, maskRasterFullFileName,
+                     GeoSpaceTxtFullFileName, GeoClusterFullFileName, SomSpaceTxtFullFileName,
+                     SomClusterFullFileName, SomDim_X, SomDim_Y, NumberMID]
+        compressed = params.result_format == "gtiff"
+        driver = "GTiff" if compressed else self.raster_io.driver
+        if compressed and self.raster_io.driver is None:
+            try:
+                import osgeo.gdal  # noqa: F401
+            except ImportError:
+                raise RuntimeError("Compressed GeoTIFF results need the GDAL Python bindings, use the result "
+                                   "format 'grid'.")
+        if driver is not None:
+            model_file = join(params.workspace, "output_folder", model.MODEL_FILE)
+            if params.som_backend in som.BACKENDS and os.path.exists(model_file):
+                # the geospace and the somspace rasters are independent and written at the same time
+                largest = rasterize.largest_cluster(SomSpaceTxtFullFileName)
+                tasks = [lambda: rasterize.rasterize_geospace(GeoSpaceTxtFullFileName, maskRasterFullFileName,
+                                                              path_to_geofolder, NumberMID, self.rasterize_chunk,
+                                                              driver=driver, index=self.mask_index(path_to_temp),
+                                                              compressed=compressed, largest=largest),
+                         lambda: somspace.rebuild(model_file, path_to_somfolder, driver, compressed)]
+                parallel.map_tasks(lambda task: task(), tasks, len(tasks), "thread")
+                return None
+            rasterize.create_result_rasters(*arguments, chunk_size=self.rasterize_chunk, driver=driver,
+                                            index=self.mask_index(path_to_temp), compressed=compressed)
+            return None
+        if self.sinfo is None:
+            raise RuntimeError("CreateSOMResultRaster.exe runs on Windows only, use the GDAL raster I/O.")
+        self.call(" ".join([self.path_to_CreateSomResultRaster] + [str(argument) for argument in arguments]))
+        return None
+
+    # number of valid cells: the count of the mask of an earlier run, or at most all cells
+    def valid_cells(self, path_to_temp):
+        index = self.mask_index(path_to_temp)
+        return len(index) if index is not None else self.raster_cells()
+
+    # estimates the peak memory before anything runs (somcore.memory): switches batch training that doesn't
+    # fit to mini-batches, chooses the batch size and the rasterize chunk; False if the run can't fit
+    def plan_memory(self, path_to_temp):
+        params = self.params
+        cells = self.valid_cells(path_to_temp)
+        budget = memory.memory_budget(float(params.memory_limit))
+        try:
+            plan = memory.plan_memory(cells, len(params.rasters()), int(params.cellsize_x) * int(params.cellsize_y),
+                                      self.descriptions()[0].shape[1], budget, params.som_training_mode,
+                                      int(params.som_batch_size), params.input_format,
+                                      params.som_backend in som.BACKENDS, params.result_format == "gtiff")
+        except memory.MemoryBudgetError as error:
+            self.error(str(error))
+            self.log("Use fewer bands or a smaller map, or raise the memory limit.")
+            return False
+        if plan.budget is not None:
+            self.log("Estimated peak memory {} (stage '{}') of a budget of {}.".format(
+                memory.format_bytes(max(plan.stages.values())), max(plan.stages, key=plan.stages.get),
+                memory.format_bytes(plan.budget)))
+        if plan.warning:
+            self.log(plan.warning)
+        if plan.training_mode != params.som_training_mode:
+            self.log("The training data doesn't fit into memory, the SOM is trained in mini-batches of {} rows.".format(
+                plan.batch_rows))
+        params.planned_training_mode = plan.training_mode
+        params.planned_batch_size = str(plan.batch_rows)
+        self.rasterize_chunk = plan.rasterize_chunk
+        return True
+
+    # resolution and projection of the input rasters must be the same
+    def check_data(self):
+        descriptions = self.descriptions()
+        for description in descriptions:
+            self.log("The name of the raster: " + str(description.name))
+            self.log("The resolution of the raster: x " + str(description.cell_width) + ', y ' +
+                     str(description.cell_height))
+            self.log("The extent of the raster: " + " ".join(str(value) for value in description.extent))
+            self.log("The name of the spatial reference: " + str(description.spatial_reference))
+            self.log("The type of the spatial reference: " + str(description.spatial_reference_type))
+            self.log("The projected coordinate system code: " + str(description.pcs_code))
+        testres1 = all(x.cell_width == descriptions[0].cell_width for x in descriptions)
+        testres2 = all(x.spatial_reference == descriptions[0].spatial_reference for x in descriptions)
+        testres3 = all(x.shape == descriptions[0].shape for x in descriptions)
+        return testres1 and testres2 and testres3
+
+    # path of a result raster: a GeoTIFF for the result format 'gtiff', else one of the raster I/O
+    def result_path(self, folder, name):
+        if self.params.result_format == "gtiff":
+            return join(folder, name + DRIVER_EXTENSIONS["GTiff"])
+        return self.raster_io.raster_path(folder, name)
+
+    # result rasters in the geospace and SOM space folders
+    def result_rasters(self, path_to_geofolder, path_to_somfolder):
+        raster_path = self.result_path
+        return [raster_path(path_to_geofolder, "Geo_cluster"), raster_path(path_to_geofolder, "quant_error"),
+                raster_path(path_to_somfolder, "SOM_cluster"), raster_path(path_to_somfolder, "umatrix")]
+
+    # checks the data and runs the stages (or the first ones up to the stage 'until');
+    # load(path_to_geofolder, path_to_somfolder) adds the results to a map; returns True if all stages succeeded
+    def run(self, load=None, until=None):
+        params = self.params
+        workspace = params.workspace
+        if not self.check_data():
+            self.log("The resolution, the projection or the size of input files doesn't fit together")
+            return False
+        if params.result_format not in rasterize.RESULT_FORMATS:
+            self.error("Unknown result format '{}', use one of {}.".format(params.result_format,
+                                                                            ", ".join(rasterize.RESULT_FORMATS)))
+            return False
+
+        # create folders
+        path_to_temp, path_to_geofolder, path_to_somfolder, out = self.createfolders()       #(access from VB)
+        if not self.plan_memory(path_to_temp):
+            return False
+        path_to_somxml = self.write_xml()
+
+        # the key of every stage hashes its inputs and parameters, a stage runs again when its key changes;
+        # the mask and the training data depend on the input rasters only
+        fingerprints = self.raster_fingerprints()
+        mask_key = cache.cache_key("mask", fingerprints)
+        lrn_key = cache.cache_key("lrn", fingerprints, params.input_format, params.normalization)
+        train_key = cache.cache_key("train", lrn_key, training_parameters(params))
+        cluster_key = cache.cache_key("cluster", train_key, params.num_initital_centroids, params.min_num_clusters,
+                                      params.max_num_clusters)
+        if params.som_backend not in som.BACKENDS:           # nextsom_wrap.exe trains and clusters in one go
+            train_key = cluster_key
+        rasterize_key = cache.cache_key("rasterize", cluster_key, params.result_format)
+        path_to_mask = self.raster_io.raster_path(path_to_temp, "mask")
+        mask_outputs = {"mask.tif": path_to_mask, mask.MASK_INDEX_FILE: join(path_to_temp, mask.MASK_INDEX_FILE)}
+        training_outputs = dict((os.path.basename(path), path) for path in lrn.training_files(training_data_file(params)))
+        somspace_outputs = [join(workspace,"geospace.txt"), join(workspace,"somspace.txt")]
+        if params.som_backend in som.BACKENDS:
+            train_outputs = [join(out, som.CODEBOOK_FILE)]
+        else:
+            train_outputs = somspace_outputs
+
+        stages = [pipeline.stage("mask", mask_key, list(mask_outputs.values()),
+                                 lambda: self.cached_stage("mask", mask_key, mask_outputs,
+                                                           lambda: self.create_mask(path_to_temp),
+                                                           self.copy_mask),
+                                 cells=self.raster_cells),
+                  pipeline.stage("lrn", lrn_key, list(training_outputs.values()),
+                                 lambda: self.cached_stage("lrn", lrn_key, training_outputs,
+                                                           lambda: self.create_lrn(path_to_temp)),
+                                 cells=self.training_cells),
+                  pipeline.stage("train", train_key, train_outputs, lambda: self.wrap(path_to_somxml, train_key),
+                                 cells=self.training_cells),
+                  pipeline.stage("cluster", cluster_key, somspace_outputs, lambda: self.cluster(path_to_somxml),
+                                 cells=self.training_cells),
+                  pipeline.stage("rasterize", rasterize_key, self.result_rasters(path_to_geofolder, path_to_somfolder),
+                                 lambda: self.resultraster(path_to_temp, path_to_geofolder, path_to_somfolder),
+                                 cells=self.training_cells)]
+        if load is not None:
+            stages.append(pipeline.stage("load", cluster_key, [],
+                                         lambda: load(path_to_geofolder, path_to_somfolder), always=True))
+        if until is not None:
+            stages = stages[:[current.name for current in stages].index(until) + 1]
+
+        # runs the stages; stages completed by an earlier run with the same key are skipped;
+        # timing, memory and I/O of every stage go to 'run_report.json' in the output folder
+        manifest = pipeline.Manifest(join(workspace, pipeline.MANIFEST_FILE))
+        try:
+            pipeline.run_stages(manifest, stages, self.log, self.raster_io.exists, self.run_report, self.progress)
+        except pipeline.StageError as error:
+            self.error(str(error))
+            if error.details:
+                self.log(error.details.rstrip())
+            self.log("Run the tool again with the same workspace to resume from this stage.")
+            return False
+        finally:
+            self.run_report.save()
+        self.progress("All stages are complete.", 100)
+        for stage_report in self.run_report.stages:
+            if "wall_time" in stage_report:
+                self.log("Stage '{}': {:.1f} s.".format(stage_report["name"], stage_report["wall_time"]))
+        if until is not None:
+            return True
+        self.log("Files 'Geo_cluster', 'quant_error', 'SOM_cluster' and 'umatrix' successfully created.")
+        if os.path.exists(join(out, model.MODEL_FILE)):
+            self.log("The model '{}' scores new rasters (python -m somcore.model).".format(join(out, model.MODEL_FILE)))
+
+        # delete intermediate results
+        if str(params.is_checked_del) == 'true':
+            self.raster_io.delete(path_to_temp)
+            self.raster_io.delete(join(workspace,"somspace.txt"))
+            self.raster_io.delete(join(workspace,"geospace.txt"))
+            for path_to_training_file in lrn.training_files(training_data_file(params)):
+                self.raster_io.delete(path_to_training_file)
+            self.raster_io.delete(join(workspace,"SOM.xml"))
+            if self.artifact_cache is not None:
+                cache.remove_path(self.artifact_cache.folder)
+        return True
+
+
+# parser of the 20 tool parameters and the optional ones as options
+def tool_argument_parser(description="Runs the SOM tool without ArcMap."):
+    parser = argparse.ArgumentParser(description=description)
+    for name in PARAMETERS:
+        parser.add_argument(name)
+    defaults = dict(OPTIONAL_PARAMETERS)
+    defaults["som_backend"] = "numpy"                       # nextsom_wrap.exe needs Windows
+    for name, _ in OPTIONAL_PARAMETERS:
+        option = "--" + name.replace("som_", "").replace("_", "-")
+        parser.add_argument(option, dest=name, default=defaults[name])
+    parser.add_argument("--raster-io", default="gdal", choices=sorted(RASTER_IO))
+    return parser
+
+
+# tool parameters of parsed command line arguments
+def tool_parameters(arguments):
+    return ToolParameters([getattr(arguments, name) for name in PARAMETERS] +
+                          [getattr(arguments, name) for name, _ in OPTIONAL_PARAMETERS])
+
+
+def print_error(message):
+    print(message, file=sys.stderr)
+
+
+def main(arguments=None):
+    arguments = tool_argument_parser().parse_args(arguments)
+    try:
+        params = tool_parameters(arguments)
+    except ValueError as error:
+        print_error(str(error))
+        return 1
+    tool = SomTool(params, get_raster_io(arguments.raster_io), error=print_error)
+    return 0 if tool.run() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
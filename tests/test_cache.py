@@ -0,0 +1,74 @@
+# -*- coding: utf8 -*-
+
+"""
+Tests of the artifact cache (somcore.cache).
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from somcore import cache
+
+
+class ArtifactCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.workspace = tempfile.mkdtemp()
+        self.artifacts = cache.ArtifactCache(os.path.join(self.workspace, "cache"), size=2500)
+        self.copies = []
+
+    def tearDown(self):
+        shutil.rmtree(self.workspace)
+
+    def output(self, name, size):
+        path = os.path.join(self.workspace, name)
+        with open(path, "wb") as output_file:
+            output_file.write(b"x" * size)
+        return {name: path}
+
+    def copy(self, source, destination):
+        self.copies.append(source)
+        cache.copy_path(source, destination)
+
+    def test_fetch_after_store(self):
+        outputs = self.output("SOM.npy", 100)
+        self.assertTrue(self.artifacts.store("lrn", "a", outputs))
+        os.remove(outputs["SOM.npy"])
+        self.assertTrue(self.artifacts.fetch("lrn", "a", outputs))
+        self.assertEqual(os.path.getsize(outputs["SOM.npy"]), 100)
+        self.assertFalse(self.artifacts.fetch("lrn", "b", outputs))
+
+    def test_least_recently_used_entries_are_evicted(self):
+        for key in "abc":
+            self.artifacts.store("lrn", key, self.output("SOM.npy", 1000))
+            time.sleep(0.01)
+        self.assertEqual(sorted(self.artifacts.index), ["b", "c"])
+        self.artifacts.fetch("lrn", "b", self.output("SOM.npy", 0))
+        time.sleep(0.01)
+        self.artifacts.store("lrn", "d", self.output("SOM.npy", 1000))
+        self.assertEqual(sorted(self.artifacts.index), ["b", "d"])
+        self.assertFalse(os.path.exists(os.path.join(self.artifacts.folder, "c")))
+        self.assertLessEqual(sum(entry["size"] for entry in self.artifacts.index.values()), self.artifacts.size)
+
+    def test_oversized_outputs_are_not_copied(self):
+        self.artifacts.store("lrn", "a", self.output("SOM.npy", 1000))
+        self.assertFalse(self.artifacts.store("lrn", "b", self.output("big.npy", 3000), self.copy))
+        self.assertEqual(self.copies, [])
+        self.assertEqual(sorted(self.artifacts.index), ["a"])
+        self.assertFalse(os.path.exists(os.path.join(self.artifacts.folder, "b")))
+
+    def test_index_is_persistent(self):
+        self.artifacts.store("mask", "a", self.output("mask.tif", 10))
+        reopened = cache.ArtifactCache(self.artifacts.folder, size=2500)
+        self.assertEqual(reopened.index["a"]["stage"], "mask")
+
+    def test_cache_key(self):
+        self.assertEqual(cache.cache_key("lrn", [1, 2], {"b": 1, "a": 2}),
+                         cache.cache_key("lrn", [1, 2], {"a": 2, "b": 1}))
+        self.assertNotEqual(cache.cache_key("lrn", 1), cache.cache_key("lrn", 2))
+
+
+if __name__ == "__main__":
+    unittest.main()
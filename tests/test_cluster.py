@@ -0,0 +1,148 @@
+# -*- coding: utf8 -*-
+
+"""
+Tests of the k-means clustering of the codebook (somcore.cluster) against the single-threaded
+sweep it replaced (the reference_* and serial_* functions): the same labels and the same best
+number of clusters for fixed seeds.
+"""
+
+import unittest
+
+import numpy as np
+
+from somcore import cluster
+
+
+# initial means by k-means++, every distance computed from the data
+def reference_initial_means(data, k, random_state):
+    count = data.shape[0]
+    index = [random_state.randint(count)]
+    closest = cluster.squared_distances(data, data[index])[:, 0]
+    for _ in range(1, k):
+        total = closest.sum()
+        if total > 0:
+            next_index = int(np.searchsorted(np.cumsum(closest), random_state.random_sample() * total))
+        else:
+            next_index = random_state.randint(count)
+        next_index = min(next_index, count - 1)
+        index.append(next_index)
+        closest = np.minimum(closest, cluster.squared_distances(data, data[[next_index]])[:, 0])
+    return data[index].copy()
+
+
+# Lloyd's k-means until the centers stop moving
+def reference_kmeans(data, centers):
+    centers = centers.copy()
+    k = centers.shape[0]
+    threshold = cluster.TOLERANCE * data.var(axis=0).mean()
+    for _ in range(cluster.MAX_ITERATIONS):
+        labels = cluster.squared_distances(data, centers).argmin(axis=1)
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centers)
+        for dimension in range(data.shape[1]):
+            sums[:, dimension] = np.bincount(labels, weights=data[:, dimension], minlength=k)
+        filled = counts > 0
+        new_centers = centers.copy()
+        new_centers[filled] = sums[filled] / counts[filled, np.newaxis]
+        shift = ((new_centers - centers) ** 2).sum()
+        centers = new_centers
+        if shift <= threshold:
+            break
+    return cluster.squared_distances(data, centers).argmin(axis=1), centers
+
+
+# Davies-Bouldin index from the distances of the data to the centers of its clusters
+def serial_davies_bouldin(data, labels, centers):
+    used = np.unique(labels)
+    if len(used) < 2:
+        return np.inf
+    centers = centers[used]
+    labels = np.searchsorted(used, labels)
+    spread = np.sqrt(((data - centers[labels]) ** 2).sum(axis=1))
+    scatter = np.bincount(labels, weights=spread) / np.bincount(labels)
+    separation = np.sqrt(cluster.squared_distances(centers, centers))
+    np.fill_diagonal(separation, np.inf)
+    ratio = (scatter[:, np.newaxis] + scatter[np.newaxis, :]) / separation
+    return ratio.max(axis=1).mean()
+
+
+# Davies-Bouldin index, cluster by cluster
+def reference_davies_bouldin(data, labels, centers):
+    used = np.unique(labels)
+    if len(used) < 2:
+        return np.inf
+    scatter = [np.sqrt(((data[labels == i] - centers[i]) ** 2).sum(axis=1)).mean() for i in used]
+    ratios = []
+    for i in range(len(used)):
+        ratios.append(max((scatter[i] + scatter[j]) / np.sqrt(((centers[used[i]] - centers[used[j]]) ** 2).sum())
+                          for j in range(len(used)) if j != i))
+    return np.mean(ratios)
+
+
+# best (number of clusters, labels) of the serial sweep
+def reference_sweep(codebook, number, number_min, number_max, seed=cluster.SEED):
+    codebook = np.asarray(codebook, dtype=np.float64)
+    numbers = cluster.cluster_numbers(codebook.shape[0], number_min, number_max)
+    seeds = cluster.run_seeds(seed, numbers, number)
+    best_score, best = np.inf, None
+    for i, k in enumerate(numbers):
+        for run_seed in seeds[i]:
+            labels, centers = reference_kmeans(codebook, reference_initial_means(codebook, k,
+                                                                                 np.random.RandomState(run_seed)))
+            score = serial_davies_bouldin(codebook, labels, centers)
+            if best is None or score < best_score:
+                best_score, best = score, (k, labels)
+    return best
+
+
+def sample_codebook(seed, nodes=60, bands=4):
+    random_state = np.random.RandomState(seed)
+    centers = random_state.rand(random_state.randint(2, 7), bands) * 10
+    return centers[random_state.randint(0, len(centers), nodes)] + random_state.standard_normal((nodes, bands))
+
+
+class KmeansTest(unittest.TestCase):
+    def test_kmeans_and_davies_bouldin(self):
+        for seed in range(5):
+            codebook = sample_codebook(seed)
+            shared = cluster.SharedCodebook(codebook)
+            for k in (2, 5):
+                centers = cluster.initial_means(shared, k, np.random.RandomState(seed))
+                np.testing.assert_array_equal(centers, reference_initial_means(codebook, k,
+                                                                               np.random.RandomState(seed)))
+                labels, centers, distances = cluster.kmeans(shared, centers)
+                expected_labels, expected_centers = reference_kmeans(codebook, centers)
+                np.testing.assert_array_equal(labels, expected_labels)
+                np.testing.assert_allclose(distances, cluster.squared_distances(codebook, centers), atol=1e-9)
+                self.assertAlmostEqual(cluster.davies_bouldin(labels, centers, distances),
+                                       reference_davies_bouldin(codebook, labels, centers))
+
+    # runs that end in the same clusters numbered differently get Davies-Bouldin indexes that differ by
+    # rounding only, the sweeps may keep another of them
+    def test_sweep_matches_the_serial_sweep(self):
+        for seed in range(10):
+            codebook = sample_codebook(seed)
+            k, expected = reference_sweep(codebook, 3, 2, 8, seed)
+            for workers in (1, 2):
+                labels = cluster.cluster_codebook(codebook, 3, 2, 8, seed, workers)
+                self.assertEqual(len(np.unique(labels)), k)
+                self.assertEqual(len(set(zip(labels, expected))), k)        # the same clusters
+
+    def test_warm_sweep(self):
+        codebook = sample_codebook(0)
+        shared = cluster.SharedCodebook(codebook)
+        results = cluster._sweep_warm((shared, [2, 3, 4, 5], 7))
+        self.assertEqual([len(np.unique(labels)) for _, labels in results], [2, 3, 4, 5])
+        for score, labels in results:
+            centers = np.array([codebook[labels == i].mean(axis=0) for i in range(labels.max() + 1)])
+            self.assertAlmostEqual(score, reference_davies_bouldin(codebook, labels, centers))
+        labels = cluster.cluster_codebook(codebook, 2, 2, 5, warm_start=True)
+        np.testing.assert_array_equal(labels, cluster.cluster_codebook(codebook, 2, 2, 5, workers=2,
+                                                                       warm_start=True))
+
+    def test_without_kmeans_every_node_is_a_cluster(self):
+        np.testing.assert_array_equal(cluster.cluster_codebook(sample_codebook(0), 0, 2, 8), np.arange(60))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+# -*- coding: utf8 -*-
+
+"""
+Tests of somcore.layers against the arcpy.mapping mock of benchmarks/arcpy_stub.py.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import arcpy_stub  # noqa: E402
+from somcore import layers  # noqa: E402
+
+
+def refresh():
+    arcpy_stub.RefreshActiveView()
+    arcpy_stub.RefreshTOC()
+
+
+class ResultLoaderTest(unittest.TestCase):
+    def setUp(self):
+        arcpy_stub.reset()
+        self.workspace = tempfile.mkdtemp()
+        self.geo_folder = os.path.join(self.workspace, "GeoSpace")
+        self.som_folder = os.path.join(self.workspace, "SomSpace")
+        for folder, names in ((self.geo_folder, ["Geo_cluster", "quant_error", "b1", "b2", "info"]),
+                              (self.som_folder, ["SOM_cluster", "umatrix", "b1", "b2", "info"])):
+            for name in names:
+                os.makedirs(os.path.join(folder, name))
+
+    def tearDown(self):
+        shutil.rmtree(self.workspace)
+
+    def load(self, empty_layer="EmptyLayer.lyr", summary_only=False):
+        return layers.load_results(arcpy_stub, refresh, lambda folder: sorted(os.listdir(folder)), empty_layer,
+                                   "ColorSource.lyr", self.geo_folder, self.som_folder, summary_only)
+
+    def tree(self, layer_list=None):
+        layer_list = arcpy_stub.MapDocument.frame.layers if layer_list is None else layer_list
+        return [(layer.name, self.tree(layer.layers)) if layer.isGroupLayer else layer.name for layer in layer_list]
+
+    def test_all_layers_grouped(self):
+        self.assertEqual(self.load(), [])
+        self.assertEqual(self.tree(), [
+            ("Geospace Data", ["Geo Cluster", "Quantization Error", ("BMU Data", ["b1", "b2"])]),
+            ("SOM Space Data", ["SOM Cluster", "U-Matrix", ("BMU Data", ["b1", "b2"])])])
+        self.assertEqual(arcpy_stub.symbology_updates, ["SOM Cluster", "U-Matrix", "b1", "b2"])
+        self.assertEqual(arcpy_stub.refreshes, ["view", "toc"])
+
+    def test_summary_leaves_out_the_bands(self):
+        left_out = self.load(summary_only=True)
+        self.assertEqual(self.tree(), [("Geospace Data", ["Geo Cluster", "Quantization Error"]),
+                                       ("SOM Space Data", ["SOM Cluster", "U-Matrix"])])
+        self.assertEqual(arcpy_stub.symbology_updates, ["SOM Cluster", "U-Matrix"])
+        self.assertEqual(left_out, [os.path.join(self.geo_folder, "b1"), os.path.join(self.geo_folder, "b2"),
+                                    os.path.join(self.som_folder, "b1"), os.path.join(self.som_folder, "b2")])
+        self.assertEqual(arcpy_stub.refreshes, ["view", "toc"])
+
+    def test_summary_without_group_layer(self):
+        left_out = self.load(empty_layer=None, summary_only=True)
+        self.assertEqual(self.tree(), ["Geo Cluster", "Quantization Error", "SOM Cluster", "U-Matrix"])
+        self.assertEqual(len(left_out), 4)
+        self.assertEqual(arcpy_stub.refreshes, ["view", "toc"])
+
+    def test_all_layers_without_group_layer(self):
+        self.load(empty_layer=None)
+        self.assertEqual(self.tree(), ["Geo Cluster", "Quantization Error", "b1", "b2",
+                                       "SOM Cluster", "U-Matrix", "b1", "b2"])
+
+    def test_geotiff_results(self):
+        files = ["Geo_cluster.tif", "Geo_cluster.tif.aux.xml", "quant_error.tif", "b1.tif", "b1.tif.xml",
+                 "bands.lyr"]
+        groups = layers.result_groups("geo", "som", lambda folder: files)
+        self.assertEqual(groups[0].summary, [("Geo_cluster.tif", "Geo Cluster"),
+                                             ("quant_error.tif", "Quantization Error")])
+        self.assertEqual(groups[0].bands, ["b1.tif"])
+
+
+if __name__ == "__main__":
+    unittest.main()
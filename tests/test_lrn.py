@@ -0,0 +1,141 @@
+# -*- coding: utf8 -*-
+
+"""
+Tests of the training data (somcore.lrn): round trips of SOM.lrn and SOM.npy, and SOM.lrn against
+a golden file with the number formatting of Run_CreateSOMLrnFile.exe (tests/data/SOM_lrn.fsx).
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from somcore import lrn, normalize
+from somcore.raster import ArrayRaster
+
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def sample_training(count=50, bands=3, seed=0, first_col=0):
+    random_state = np.random.RandomState(seed)
+    data = (random_state.standard_normal((count, bands)) * 10 ** np.arange(bands)).astype(np.float32)
+    rows = random_state.randint(0, 1000, count).astype(np.int32)
+    cols = (first_col + random_state.randint(0, 1000, count)).astype(np.int32)
+    names = ["band{}.tif{}".format(band, band + 1) for band in range(bands)]
+    return lrn.TrainingData(np.asfortranarray(data), rows, cols, names)
+
+
+class RoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def round_trip(self, name, training):
+        path = lrn.write_training_data(os.path.join(self.folder, name), training)
+        return lrn.read_training_data(path)
+
+    def assert_same(self, read, training):
+        np.testing.assert_array_equal(read.data, training.data)
+        np.testing.assert_array_equal(read.rows, training.rows)
+        np.testing.assert_array_equal(read.cols, training.cols)
+        self.assertEqual(list(read.names), training.names)
+
+    def test_lrn(self):
+        training = sample_training()
+        self.assert_same(self.round_trip("SOM.lrn", training), training)
+
+    def test_npy(self):
+        training = sample_training()
+        self.assert_same(self.round_trip("SOM.npy", training), training)
+
+    def test_lrn_positions_beyond_float32(self):
+        training = sample_training(first_col=2 ** 24 + 1)
+        self.assertTrue(np.any(training.cols.astype(np.float32).astype(np.int64) != training.cols))
+        self.assert_same(self.round_trip("SOM.lrn", training), training)
+
+    def test_streamed_parts(self):
+        training = sample_training(count=23)
+        for name in ("SOM.lrn", "SOM.npy"):
+            path = lrn.write_training_data(os.path.join(self.folder, name), training)
+            parts = list(lrn.stream_training_data(path, rows=5))
+            self.assertEqual([len(part.data) for part in parts], [5, 5, 5, 5, 3])
+            self.assertEqual(lrn.training_info(path), (23, training.names))
+            np.testing.assert_array_equal(np.concatenate([part.data for part in parts]), training.data)
+            np.testing.assert_array_equal(np.concatenate([part.cols for part in parts]), training.cols)
+
+    def test_lrn_text(self):
+        training = lrn.TrainingData(np.array([[0.5, -0.0], [np.nan, 1e-7]], dtype=np.float32),
+                                    np.array([0, 1], dtype=np.int32), np.array([2, 3], dtype=np.int32), ["a1", "b2"])
+        path = lrn.write_lrn(os.path.join(self.folder, "SOM.lrn"), training)
+        with io.open(path, "rb") as lrn_file:
+            text = lrn_file.read().decode("ascii")
+        self.assertEqual(text, "%2\r\n%6\r\n%\t9\t0\t0\t0\t1\t1\r\nID\tX\tY\tZ\ta1\tb2\r\n"
+                               "0\t2\t0\t0\t0.5\t0\r\n1\t3\t1\t0\tNaN\t1.0000000116861E-07\r\n")
+
+    def test_create_lrn(self):
+        mask = np.array([[1, 0, 1], [1, 1, 0]], dtype=np.uint8)
+        bands = [ArrayRaster(np.arange(6, dtype=np.float32).reshape(2, 3) * (band + 1), name="r{}.tif".format(band))
+                 for band in range(2)]
+        for name in ("SOM.lrn", "SOM.npy"):
+            path = lrn.create_lrn(os.path.join(self.folder, name), ArrayRaster(mask, nodata=0), bands)
+            training = lrn.read_training_data(path)
+            np.testing.assert_array_equal(training.data, [[0, 0], [2, 4], [3, 6], [4, 8]])
+            np.testing.assert_array_equal(training.rows, [0, 0, 1, 1])
+            np.testing.assert_array_equal(training.cols, [0, 2, 0, 1])
+            self.assertEqual(list(training.names), ["r0.tif1", "r1.tif2"])
+
+    # the text output is written block by block; normalized, the rasters are read twice
+    def test_create_normalized_lrn(self):
+        random_state = np.random.RandomState(0)
+        mask = (random_state.rand(9, 7) < 0.7).astype(np.uint8)
+        bands = [ArrayRaster((random_state.rand(9, 7) * 100).astype(np.float32), name="r{}.tif".format(band))
+                 for band in range(3)]
+        for normalization in ("none", "robust"):
+            read = []
+            for name, block_rows in (("SOM.npy", 4), ("SOM.lrn", 2), ("SOM.lrn", 100)):
+                path = lrn.create_lrn(os.path.join(self.folder, name), ArrayRaster(mask, nodata=0), bands,
+                                      block_rows=block_rows, normalization=normalization)
+                read.append(lrn.read_training_data(path, mmap_mode=None))
+                saved = normalize.load_normalization(lrn.normalization_file(path))
+                self.assertEqual(saved.method, normalization)
+                self.assertEqual(bool(saved.statistics), normalization != "none")
+            for training in read[1:]:
+                np.testing.assert_allclose(training.data, read[0].data, rtol=1e-6)
+                np.testing.assert_array_equal(training.rows, read[0].rows)
+                np.testing.assert_array_equal(training.cols, read[0].cols)
+
+
+class GoldenFileTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    # the rasters of tests/data/SOM_lrn.fsx: ties at the 15th digit, negative zero, exponents, a subnormal
+    def test_golden_file(self):
+        mask = np.array([[1, 1, 0, 1], [0, 1, 1, 1], [1, 0, 1, 1]], dtype=np.uint8)
+        elev = np.array([[1000.000244140625, -1000.000244140625, 5.0, 0.1],
+                         [6.0, 1e-7, -0.0, 3.4e38],
+                         [123456789.0, 7.0, np.float32(1) / np.float32(3), -2.5e-5]], dtype=np.float32)
+        grav = np.array([[100.0001220703125, 1.5, 8.0, 65504.0],
+                         [9.0, 1e20, 1e-40, 0.0],
+                         [-10.00006103515625, 10.0, np.float32(2) / np.float32(3), 1.000030517578125]],
+                        dtype=np.float32)
+        with io.open(os.path.join(DATA_FOLDER, "SOM.lrn"), "rb") as golden_file:
+            golden = golden_file.read()
+        for block_rows in (1, 2, 3):
+            path = lrn.create_lrn(os.path.join(self.folder, "SOM.lrn"), ArrayRaster(mask, nodata=0),
+                                  [ArrayRaster(elev, name="elev.tif"), ArrayRaster(grav, name="grav.tif")],
+                                  block_rows=block_rows)
+            with io.open(path, "rb") as lrn_file:
+                self.assertEqual(lrn_file.read(), golden)
+
+
+if __name__ == "__main__":
+    unittest.main()
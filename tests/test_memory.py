@@ -0,0 +1,169 @@
+# -*- coding: utf8 -*-
+
+"""
+Tests of the memory plan (somcore.memory) and of its use by the SOM tool (somcore.workflow): the
+planned training mode and batch size must not change the keys of the stages.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import arcpy_stub  # noqa: E402
+from somcore import lrn, memory, raster_io, rasterize, som, workflow  # noqa: E402
+
+try:
+    import osgeo.gdal  # noqa: F401
+    GDAL = True
+except ImportError:
+    GDAL = False
+
+# cells, bands, nodes and raster width of the planned runs
+CELLS, BANDS, NODES, WIDTH = 1000000, 8, 400, 1000
+
+
+def peak(stages):
+    return max(stages["train"], stages["cluster"])
+
+
+class PlanMemoryTest(unittest.TestCase):
+    def test_budget(self):
+        self.assertEqual(memory.memory_budget(512), 512 * 2 ** 20)
+        budget = memory.memory_budget(0)
+        self.assertTrue(budget is None or budget > 0)
+
+    # a 32-bit process (ArcMap's Python) gets no more than its address space
+    def test_address_space(self):
+        bits = memory.PROCESS_BITS
+        try:
+            memory.PROCESS_BITS = 32
+            available = memory.available_memory()
+            budget = memory.memory_budget(0)
+        finally:
+            memory.PROCESS_BITS = bits
+        self.assertTrue(0 < available <= memory.available_address_space() <= 2 ** 32)
+        self.assertTrue(0 < budget <= memory.available_address_space() * memory.MEMORY_FRACTION)
+
+    def test_minibatch_needs_less_memory(self):
+        batch = memory.stage_memory(CELLS, BANDS, NODES, WIDTH, None, "npy")
+        minibatch = memory.stage_memory(CELLS, BANDS, NODES, WIDTH, 50000, "npy")
+        self.assertLess(peak(minibatch), peak(batch))
+        self.assertEqual(minibatch["lrn"], batch["lrn"])
+        self.assertGreater(memory.stage_memory(CELLS, BANDS, NODES, WIDTH, None, "lrn")["train"], batch["train"])
+
+    def test_unknown_budget_keeps_the_mode(self):
+        plan = memory.plan_memory(CELLS, BANDS, NODES, WIDTH, None)
+        self.assertEqual((plan.training_mode, plan.batch_rows, plan.budget), ("batch", lrn.STREAM_ROWS, None))
+
+    def test_batch_training_that_fits(self):
+        budget = peak(memory.stage_memory(CELLS, BANDS, NODES, WIDTH, None, "npy"))
+        plan = memory.plan_memory(CELLS, BANDS, NODES, WIDTH, budget, input_format="npy")
+        self.assertEqual(plan.training_mode, "batch")
+        self.assertTrue(peak(plan.stages) <= budget)
+
+    def test_largest_fitting_minibatch(self):
+        budget = peak(memory.stage_memory(CELLS, BANDS, NODES, WIDTH, 300000, "npy")) + 10
+        plan = memory.plan_memory(CELLS, BANDS, NODES, WIDTH, budget, input_format="npy")
+        self.assertEqual((plan.training_mode, plan.batch_rows), ("minibatch", 300000))
+        self.assertTrue(peak(plan.stages) <= budget)
+
+    def test_requested_batch_shrinks_to_fit(self):
+        budget = peak(memory.stage_memory(CELLS, BANDS, NODES, WIDTH, 30000, "lrn"))
+        plan = memory.plan_memory(CELLS, BANDS, NODES, WIDTH, budget, "minibatch", 100000, "lrn")
+        self.assertEqual((plan.training_mode, plan.batch_rows), ("minibatch", 30000))
+
+    def assert_refused(self, message, *arguments):
+        try:
+            memory.plan_memory(*arguments, input_format="npy")
+        except memory.MemoryBudgetError as error:
+            self.assertTrue(message in str(error), str(error))
+        else:
+            self.fail("The run isn't refused.")
+
+    def test_refused_runs(self):
+        stages = memory.stage_memory(CELLS, BANDS, 4, WIDTH, None, "npy")
+        self.assert_refused("training data", CELLS, BANDS, 4, WIDTH, stages["lrn"] - 1)
+        stages = memory.stage_memory(100000, BANDS, 10000, WIDTH, memory.MIN_BATCH_ROWS, "npy")
+        self.assert_refused("mini-batches", 100000, BANDS, 10000, WIDTH, stages["lrn"] + 1)
+
+    def test_executables_get_a_warning(self):
+        budget = memory.stage_memory(CELLS, BANDS, NODES, WIDTH)["lrn"]
+        plan = memory.plan_memory(CELLS, BANDS, NODES, WIDTH, budget, in_process=False)
+        self.assertEqual(plan.training_mode, "batch")
+        self.assertTrue("nextsom_wrap.exe" in plan.warning)
+
+    def test_rasterize_chunk_fits(self):
+        chunk = rasterize.CHUNK_SIZE // 4
+        budget = memory.stage_memory(CELLS, BANDS, NODES, WIDTH, rasterize_chunk=chunk)["rasterize"]
+        plan = memory.plan_memory(CELLS, BANDS, 4, WIDTH, budget, "minibatch", memory.MIN_BATCH_ROWS, "npy")
+        self.assertEqual(plan.rasterize_chunk, chunk)
+        self.assertTrue(max(plan.stages.values()) <= budget)
+
+    def test_format_bytes(self):
+        self.assertEqual(memory.format_bytes(100), "100 bytes")
+        self.assertEqual(memory.format_bytes(3 * 2 ** 20), "3.0 MB")
+        self.assertEqual(memory.format_bytes(5 * 2 ** 40), "5120.0 GB")
+
+
+# the stub rasters are read with arcpy, somcore.raster opens paths with GDAL when it is installed
+@unittest.skipIf(GDAL, "the arcpy stub rasters are opened with GDAL")
+class PlannedTrainingTest(unittest.TestCase):
+    def setUp(self):
+        arcpy_stub.install()
+        self.folder = tempfile.mkdtemp()
+        random_state = np.random.RandomState(0)
+        paths = []
+        for band in range(3):
+            paths.append(os.path.join(self.folder, "band_{}".format(band)))
+            np.save(arcpy_stub.raster_file(paths[-1]), random_state.rand(30, 20).astype(np.float32))
+        self.workspace = os.path.join(self.folder, "workspace")
+        os.makedirs(self.workspace)
+        self.values = [self.workspace, ";".join(paths), "4", "3", "3", "2", "4", "3", "planar", "rectangular",
+                       "false", "random", "gaussian", "0.5", "0", "1", "linear", "0.1", "0.01", "linear", "npy",
+                       "numpy", "1", "batch", "0", "0"]
+        self.plan_memory = memory.plan_memory
+
+    def tearDown(self):
+        memory.plan_memory = self.plan_memory
+        shutil.rmtree(self.folder)
+
+    # stages up to the clustering that ran, with the training planned in mini-batches of batch_rows
+    def run_tool(self, batch_rows=None):
+        def planned(*arguments, **keywords):
+            plan = self.plan_memory(*arguments, **keywords)
+            return plan._replace(training_mode="minibatch", batch_rows=batch_rows) if batch_rows else plan
+
+        memory.plan_memory = planned
+        messages = []
+        tool = workflow.SomTool(workflow.ToolParameters(self.values), raster_io.ArcpyRasterIO(), log=messages.append)
+        self.assertTrue(tool.run(until="cluster"), messages)
+        self.assertEqual(tool.params.som_training_mode, "batch")
+        return tool, [stage["name"] for stage in tool.run_report.stages if stage["status"] != "skipped"]
+
+    def test_planned_minibatches_keep_the_stage_keys(self):
+        tool, stages = self.run_tool(batch_rows=100)
+        self.assertEqual(stages, ["mask", "lrn", "train", "cluster"])
+        config = som.SomConfig(os.path.join(self.workspace, "SOM.xml"))
+        self.assertEqual((config.training_mode, config.batch_size), ("minibatch", 100))
+        self.assertEqual(config.requested_training, ("batch", "0"))
+        self.assertEqual(self.run_tool()[1], [])
+        self.assertEqual(self.run_tool(batch_rows=200)[1], [])
+
+    def test_training_key_ignores_the_plan(self):
+        tool, _ = self.run_tool()
+        key = som.SomConfig(os.path.join(self.workspace, "SOM.xml")).training_key()
+        tool.params.planned_training_mode, tool.params.planned_batch_size = "minibatch", "100"
+        tool.write_xml()
+        config = som.SomConfig(os.path.join(self.workspace, "SOM.xml"))
+        self.assertEqual(config.training_mode, "minibatch")
+        self.assertEqual(config.training_key(), key)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+# -*- coding: utf8 -*-
+
+"""
+Tests of the saved SOM model (somcore.model): the round trip through 'model.npz' and the scoring
+of the training rasters against the Geo_cluster and quant_error of a run of the SOM tool, the
+latter with the arcpy stub of benchmarks/arcpy_stub.py.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import arcpy_stub  # noqa: E402
+from somcore import model, raster_io, rasterize, workflow  # noqa: E402
+from somcore.grid import Grid  # noqa: E402
+from somcore.normalize import Normalization  # noqa: E402
+from somcore.raster import FLOAT_NODATA  # noqa: E402
+
+try:
+    import osgeo.gdal  # noqa: F401
+    GDAL = True
+except ImportError:
+    GDAL = False
+
+
+class SaveModelTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_round_trip(self):
+        grid = Grid(5, 3, "toroid", "hexagonal")
+        codebook = np.random.RandomState(0).rand(grid.size, 2).astype(np.float32)
+        statistics = {"count": np.array([10, 10]), "median": np.array([0.5, -1.5])}
+        for normalization in (Normalization(), Normalization("robust", [1.0, 2.0], [3.0, 0.25])):
+            saved = model.SomModel(codebook, grid, np.arange(grid.size) % 4, ["band a", "b\\c"], normalization,
+                                   statistics)
+            path = os.path.join(self.folder, model.MODEL_FILE)
+            model.save_model(path, saved)
+            model.save_model(path, saved)                       # replaces the older one
+            loaded = model.load_model(path)
+            np.testing.assert_array_equal(loaded.codebook, codebook)
+            np.testing.assert_array_equal(loaded.labels, saved.labels)
+            self.assertEqual(loaded.names, ["band a", "b\\c"])
+            self.assertEqual((loaded.grid.som_x, loaded.grid.som_y, loaded.grid.map_type, loaded.grid.grid_type),
+                             (5, 3, "toroid", "hexagonal"))
+            self.assertEqual(loaded.normalization.as_dict(), normalization.as_dict())
+            self.assertEqual(sorted(loaded.statistics), ["count", "median"])
+            np.testing.assert_array_equal(loaded.statistics["median"], statistics["median"])
+            self.assertEqual(os.listdir(self.folder), [model.MODEL_FILE])
+
+    def test_band_count(self):
+        saved = model.SomModel(np.zeros((4, 2)), Grid(2, 2), np.arange(4), ["a", "b"])
+        self.assertRaises(ValueError, model.score_rasters, saved, [np.zeros((3, 3))], self.folder, driver="array")
+
+
+# the stub rasters are read with arcpy, somcore.raster opens paths with GDAL when it is installed
+@unittest.skipIf(GDAL, "the arcpy stub rasters are opened with GDAL")
+class ScoreRastersTest(unittest.TestCase):
+    def setUp(self):
+        arcpy_stub.install()
+        self.folder = tempfile.mkdtemp()
+        random_state = np.random.RandomState(0)
+        self.paths = []
+        for band in range(3):
+            values = (random_state.rand(30, 20) * (band + 1) * 10).astype(np.float32)
+            values[random_state.rand(*values.shape) < 0.1] = np.nan
+            self.paths.append(os.path.join(self.folder, "band_{}".format(band)))
+            np.save(arcpy_stub.raster_file(self.paths[-1]), values)
+        self.workspace = os.path.join(self.folder, "workspace")
+        os.makedirs(self.workspace)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    # the rasters the model was trained on get the clusters and errors of the run
+    def test_training_rasters(self):
+        values = [self.workspace, ";".join(self.paths), "4", "3", "3", "2", "4", "3", "planar", "rectangular",
+                  "false", "random", "gaussian", "0.5", "0", "1", "linear", "0.1", "0.01", "linear", "npy",
+                  "numpy", "1", "batch", "0", "0", "false", "exact", "all", "zscore"]
+        messages = []
+        tool = workflow.SomTool(workflow.ToolParameters(values), raster_io.ArcpyRasterIO(), log=messages.append)
+        self.assertTrue(tool.run(until="cluster"), messages)
+        path_to_temp = os.path.join(self.workspace, "Temp")
+        expected = rasterize.rasterize_geospace(os.path.join(self.workspace, "geospace.txt"),
+                                                tool.raster_io.raster_path(path_to_temp, "mask"), self.folder, 3,
+                                                driver="array", index=tool.mask_index(path_to_temp))
+        saved = model.load_model(os.path.join(self.workspace, "output_folder", model.MODEL_FILE))
+        self.assertEqual(saved.normalization.method, "zscore")
+        scored = model.score_rasters(saved, self.paths, os.path.join(self.folder, "scored"), driver="array",
+                                     block_rows=7)
+        np.testing.assert_array_equal(scored[0].array, expected[0].array)
+        valid = expected[1].array != FLOAT_NODATA
+        np.testing.assert_array_equal(scored[1].array != FLOAT_NODATA, valid)
+        np.testing.assert_allclose(scored[1].array[valid], expected[1].array[valid], rtol=1e-4, atol=1e-4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+# -*- coding: utf8 -*-
+
+"""
+Tests of the band statistics and normalizations (somcore.normalize) and of the
+mapping of nextsom_wrap.exe results back to the original units (somcore.som).
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from somcore import normalize, som
+
+
+def sample_data(rows=5000, seed=0):
+    random_state = np.random.RandomState(seed)
+    data = random_state.standard_normal((rows, 3)) * [1.0, 50.0, 0.01] + [0.0, 1e4, -3.0]
+    return data.astype(np.float32)
+
+
+def statistics_of(data, parts=1, sample_rows=normalize.QUANTILE_SAMPLE):
+    statistics = normalize.BandStatistics(data.shape[1], sample_rows)
+    for part in np.array_split(data, parts):
+        statistics.add(part)
+    return statistics
+
+
+class BandStatisticsTest(unittest.TestCase):
+    def test_parts_match_whole_data(self):
+        data = sample_data()
+        values = statistics_of(data, parts=7).as_dict()
+        exact = data.astype(np.float64)
+        self.assertEqual(values["count"], len(data))
+        np.testing.assert_allclose(values["mean"], exact.mean(axis=0), rtol=1e-9, atol=1e-9)
+        np.testing.assert_allclose(values["std"], exact.std(axis=0), rtol=1e-9)
+        np.testing.assert_array_equal(values["minimum"], exact.min(axis=0))
+        np.testing.assert_array_equal(values["maximum"], exact.max(axis=0))
+
+    def test_quartiles_exact_below_sample_size(self):
+        data = sample_data()
+        values = statistics_of(data, parts=3).as_dict()
+        np.testing.assert_allclose(values["median"], np.median(data.astype(np.float64), axis=0))
+
+    def test_quartiles_of_sample_are_approximate(self):
+        data = sample_data(20000)
+        values = statistics_of(data, parts=4, sample_rows=2000).as_dict()
+        exact = np.percentile(data.astype(np.float64), [25, 50, 75], axis=0)
+        spread = exact[2] - exact[0]
+        for estimate, quartile in zip((values["q25"], values["median"], values["q75"]), exact):
+            self.assertTrue(np.all(np.abs(estimate - quartile) < 0.1 * spread))
+
+
+class NormalizationTest(unittest.TestCase):
+    def test_methods_round_trip(self):
+        data = sample_data()
+        statistics = statistics_of(data)
+        for method in normalize.NORMALIZATIONS:
+            scaling = normalize.fit_normalization(method, statistics)
+            normalized = scaling.transform(data)
+            np.testing.assert_allclose(scaling.invert(normalized), data, rtol=1e-5, atol=1e-5)
+
+    def test_zscore_and_minmax(self):
+        data = sample_data()
+        statistics = statistics_of(data)
+        normalized = normalize.fit_normalization("zscore", statistics).transform(data)
+        np.testing.assert_allclose(normalized.mean(axis=0), 0, atol=1e-4)
+        np.testing.assert_allclose(normalized.std(axis=0), 1, rtol=1e-4)
+        normalized = normalize.fit_normalization("minmax", statistics).transform(data)
+        np.testing.assert_allclose(normalized.min(axis=0), 0, atol=1e-6)
+        np.testing.assert_allclose(normalized.max(axis=0), 1, rtol=1e-5)
+
+    def test_band_without_spread_keeps_scale(self):
+        data = np.ones((10, 2), dtype=np.float32)
+        scaling = normalize.fit_normalization("zscore", statistics_of(data))
+        np.testing.assert_array_equal(scaling.scale, [1.0, 1.0])
+
+    def test_no_rows(self):
+        statistics = normalize.BandStatistics(2)
+        for method in ("zscore", "minmax", "robust"):
+            self.assertRaises(ValueError, normalize.fit_normalization, method, statistics)
+        self.assertTrue(normalize.fit_normalization("none", statistics).identity)
+
+    def test_unknown_method(self):
+        self.assertRaises(ValueError, normalize.Normalization, "log")
+
+    def test_saved_normalization(self):
+        folder = tempfile.mkdtemp()
+        try:
+            data = sample_data()
+            scaling = normalize.fit_normalization("robust", statistics_of(data))
+            path = normalize.save_normalization(os.path.join(folder, "SOM_normalization.json"), scaling)
+            loaded = normalize.load_normalization(path)
+            self.assertEqual(loaded.method, "robust")
+            np.testing.assert_array_equal(loaded.center, scaling.center)
+            np.testing.assert_array_equal(loaded.scale, scaling.scale)
+            self.assertTrue(normalize.load_normalization(os.path.join(folder, "missing.json")).identity)
+        finally:
+            shutil.rmtree(folder)
+
+
+class InvertResultFilesTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.scaling = normalize.Normalization("zscore", [10.0, -5.0], [2.0, 1000.0])
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def write(self, name, text):
+        path = os.path.join(self.folder, name)
+        with io.open(path, "wb") as result_file:
+            result_file.write(text.encode("ascii"))
+        return path
+
+    def test_geospace_bands(self):
+        path = self.write("geospace.txt", "% x y z som_x som_y cluster b_a b_b a b q_error\n" +
+                          "".join("{} 123456789 0 1 2 3 0.5 -1.25 {} 2 0.3\n".format(i, i / 10.0) for i in range(5)))
+        som.invert_result_files([path], self.scaling, write_rows=2)
+        table = np.loadtxt(path, skiprows=1)
+        np.testing.assert_array_equal(table[:, :6], [[i, 123456789, 0, 1, 2, 3] for i in range(5)])
+        np.testing.assert_allclose(table[:, 6:8], [[11, -1255]] * 5)
+        np.testing.assert_allclose(table[:, 8], 10 + np.arange(5) / 5.0)
+        np.testing.assert_allclose(table[:, 9], 1995)
+        np.testing.assert_allclose(table[:, 10], 0.3)
+
+    def test_somspace_bands(self):
+        path = self.write("somspace.txt", "% som_x som_y b_a b_b umatrix cluster\n0 0 1 0 0.25 2\n1 0 -1 1 0.5 1\n")
+        som.invert_result_files([path], self.scaling)
+        np.testing.assert_allclose(np.loadtxt(path, skiprows=1), [[0, 0, 12, -5, 0.25, 2], [1, 0, 8, 995, 0.5, 1]])
+
+    def test_identity_keeps_file(self):
+        text = "% som_x som_y b_a umatrix cluster\n0 0 1.0 0.25 2\n"
+        path = self.write("somspace.txt", text)
+        som.invert_result_files([path], normalize.Normalization())
+        with io.open(path, "rb") as result_file:
+            self.assertEqual(result_file.read().decode("ascii"), text)
+
+
+if __name__ == "__main__":
+    unittest.main()
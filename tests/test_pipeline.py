@@ -0,0 +1,162 @@
+# -*- coding: utf8 -*-
+
+"""
+Tests of the resumable pipeline (somcore.pipeline) and of the stage keys of the SOM tool
+(somcore.workflow), the latter with the arcpy stub of benchmarks/arcpy_stub.py.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import arcpy_stub  # noqa: E402
+from somcore import pipeline, raster_io, som, workflow  # noqa: E402
+
+try:
+    import osgeo.gdal  # noqa: F401
+    GDAL = True
+except ImportError:
+    GDAL = False
+
+
+class RunStagesTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.manifest_path = os.path.join(self.folder, pipeline.MANIFEST_FILE)
+        self.calls = []
+        self.failing = None
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def output(self, name):
+        return os.path.join(self.folder, name + ".out")
+
+    def stage_function(self, name):
+        def run():
+            self.calls.append(name)
+            if name == self.failing:
+                raise RuntimeError("broken")
+            with open(self.output(name), "w") as output_file:
+                output_file.write(name)
+        return run
+
+    def stages(self, keys=None, always=()):
+        keys = keys or {}
+        return [pipeline.stage(name, keys.get(name, name), [self.output(name)], self.stage_function(name),
+                               always=name in always)
+                for name in ("mask", "lrn", "train", "cluster")]
+
+    def run_stages(self, stages):
+        del self.calls[:]
+        return pipeline.run_stages(pipeline.Manifest(self.manifest_path), stages)
+
+    def test_complete_stages_are_skipped(self):
+        self.run_stages(self.stages())
+        self.assertEqual(self.calls, ["mask", "lrn", "train", "cluster"])
+        self.run_stages(self.stages())
+        self.assertEqual(self.calls, [])
+        entries = pipeline.Manifest(self.manifest_path).stages
+        self.assertEqual(sorted(entries), ["cluster", "lrn", "mask", "train"])
+        self.assertTrue(all(entry["status"] == "done" for entry in entries.values()))
+
+    def test_changed_key_runs_the_following_stages(self):
+        self.run_stages(self.stages())
+        self.run_stages(self.stages({"lrn": "other"}))
+        self.assertEqual(self.calls, ["lrn", "train", "cluster"])
+
+    def test_missing_output_runs_the_stage_again(self):
+        self.run_stages(self.stages())
+        os.remove(self.output("train"))
+        self.run_stages(self.stages())
+        self.assertEqual(self.calls, ["train", "cluster"])
+
+    def test_resume_after_a_failed_stage(self):
+        self.failing = "train"
+        with self.assertRaises(pipeline.StageError) as raised:
+            self.run_stages(self.stages())
+        self.assertEqual(str(raised.exception), "Stage 'train' failed: broken")
+        self.assertIsInstance(raised.exception.cause, RuntimeError)
+        self.assertIs(raised.exception.__cause__, raised.exception.cause)
+        self.assertIn("raise RuntimeError(\"broken\")", raised.exception.details)
+        self.assertEqual(self.calls, ["mask", "lrn", "train"])
+        entry = pipeline.Manifest(self.manifest_path).stages["train"]
+        self.assertEqual((entry["status"], entry["message"]), ("failed", "broken"))
+        self.failing = None
+        self.run_stages(self.stages())
+        self.assertEqual(self.calls, ["train", "cluster"])
+
+    def test_stage_without_its_outputs_fails(self):
+        stages = self.stages()
+        stages[1] = pipeline.stage("lrn", "lrn", [self.output("missing")], self.stage_function("lrn"))
+        self.assertRaises(pipeline.StageError, self.run_stages, stages)
+        self.assertEqual(pipeline.Manifest(self.manifest_path).stages["lrn"]["status"], "failed")
+
+    def test_always_stage_runs_on_every_run(self):
+        self.run_stages(self.stages())
+        self.run_stages(self.stages(always=("train",)))
+        self.assertEqual(self.calls, ["train", "cluster"])
+
+
+# the stub rasters are read with arcpy, somcore.raster opens paths with GDAL when it is installed
+@unittest.skipIf(GDAL, "the arcpy stub rasters are opened with GDAL")
+class StageKeyTest(unittest.TestCase):
+    def setUp(self):
+        arcpy_stub.install()
+        self.folder = tempfile.mkdtemp()
+        random_state = np.random.RandomState(0)
+        paths = []
+        for band in range(3):
+            values = random_state.rand(30, 20).astype(np.float32)
+            values[random_state.rand(*values.shape) < 0.1] = np.nan
+            paths.append(os.path.join(self.folder, "band_{}".format(band)))
+            np.save(arcpy_stub.raster_file(paths[-1]), values)
+        self.workspace = os.path.join(self.folder, "workspace")
+        os.makedirs(self.workspace)
+        self.values = [self.workspace, ";".join(paths), "4", "3", "3", "2", "4", "3", "planar", "rectangular",
+                       "false", "random", "gaussian", "0.5", "0", "1", "linear", "0.1", "0.01", "linear", "npy",
+                       "numpy", "1", "batch", "0", "0"]
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    # stages up to the clustering that ran with the changed parameters
+    def run_tool(self, **changes):
+        params = workflow.ToolParameters(self.values)
+        for name, value in changes.items():
+            setattr(params, name, value)
+        messages = []
+        tool = workflow.SomTool(params, raster_io.ArcpyRasterIO(), log=messages.append)
+        self.assertTrue(tool.run(until="cluster"), messages)
+        return [stage["name"] for stage in tool.run_report.stages if stage["status"] != "skipped"]
+
+    def test_rerun_skips_all_stages(self):
+        self.assertEqual(self.run_tool(), ["mask", "lrn", "train", "cluster"])
+        self.assertEqual(self.run_tool(), [])
+
+    def test_clusters_keep_the_trained_som(self):
+        self.run_tool()
+        self.assertEqual(self.run_tool(num_initital_centroids="2"), ["cluster"])
+
+    def test_training_parameters_keep_the_training_data(self):
+        self.run_tool()
+        self.assertEqual(self.run_tool(num_epochs="4"), ["train", "cluster"])
+
+    def test_normalization_changes_the_training_data(self):
+        self.run_tool()
+        self.assertEqual(self.run_tool(normalization="zscore"), ["lrn", "train", "cluster"])
+
+    def test_missing_codebook_resumes_the_training(self):
+        self.run_tool()
+        os.remove(os.path.join(self.workspace, "output_folder", som.CODEBOOK_FILE))
+        self.assertEqual(self.run_tool(), ["train", "cluster"])
+
+
+if __name__ == "__main__":
+    unittest.main()
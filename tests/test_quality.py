@@ -0,0 +1,92 @@
+# -*- coding: utf8 -*-
+
+"""
+Tests of the quality metrics (somcore.quality) against errors computed row by row: the quantization
+and topographic error and the hits of data assigned in parts, and the epoch errors and the early
+stop of the convergence tracking.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from somcore import bmu, quality
+from somcore.grid import Grid
+
+
+def sample(rows=300, bands=3, nodes=20, seed=0):
+    random_state = np.random.RandomState(seed)
+    return random_state.rand(rows, bands).astype(np.float32), random_state.rand(nodes, bands).astype(np.float32)
+
+
+class QualityMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_parts(self):
+        grid = Grid(5, 4, "toroid", "hexagonal")
+        data, codebook = sample()
+        metrics = quality.QualityMetrics(grid)
+        for start in range(0, len(data), 70):
+            metrics.add(*bmu.best_two_units(data[start:start + 70], codebook))
+        metrics.add(np.empty(0, dtype=int), None, np.empty(0))
+        distances = ((data[:, np.newaxis, :].astype(np.float64) - codebook[np.newaxis, :, :]) ** 2).sum(axis=2)
+        order = distances.argsort(axis=1)
+        map_distances = grid.distances()
+        result = metrics.as_dict()
+        self.assertEqual(result["rows"], len(data))
+        self.assertAlmostEqual(result["quantization_error"], np.sqrt(distances.min(axis=1)).mean(), places=5)
+        self.assertAlmostEqual(result["topographic_error"],
+                               np.mean([map_distances[first, second] > 1 + 1e-6 for first, second in order[:, :2]]))
+        self.assertEqual(result["hits"], np.bincount(order[:, 0], minlength=grid.size).tolist())
+        self.assertEqual(result["empty_nodes"], grid.size - len(np.unique(order[:, 0])))
+        with open(metrics.save(os.path.join(self.folder, quality.QUALITY_FILE))) as quality_file:
+            self.assertEqual(json.load(quality_file)["rows"], len(data))
+
+    # an approximate BMU search finds no second BMU
+    def test_without_second_unit(self):
+        data, codebook = sample()
+        metrics = quality.QualityMetrics(Grid(5, 4))
+        first, second, distances = bmu.best_two_units(data, codebook)
+        metrics.add(first[:100], second[:100], distances[:100])
+        metrics.add(first[100:], None, distances[100:])
+        self.assertIsNone(metrics.as_dict()["topographic_error"])
+        self.assertEqual(metrics.as_dict()["rows"], len(data))
+
+
+class ConvergenceTest(unittest.TestCase):
+    def test_error_from_node_sums(self):
+        data, codebook = sample()
+        convergence = quality.Convergence(0.01)
+        for start in range(0, len(data), 70):
+            part = data[start:start + 70]
+            sums, hits = bmu.node_sums(part, codebook)
+            convergence.add(quality.squared_norm(part, rows=16), sums, hits, codebook)
+        convergence.end_epoch(0)
+        distances = bmu.best_matching_units(data, codebook)[1]
+        self.assertAlmostEqual(convergence.epochs[0]["error"], float(distances.mean()), places=5)
+        self.assertIsNone(convergence.epochs[0]["change"])
+        self.assertEqual((convergence.squared, convergence.rows), (0.0, 0.0))
+
+    # the training stops after PATIENCE epochs in a row below the tolerance
+    def test_end_epoch(self):
+        convergence = quality.Convergence(0.1, patience=2)
+        stops = []
+        for epoch, error in enumerate([10.0, 5.0, 4.8, 3.0, 2.9, 2.85]):
+            convergence.squared, convergence.rows = error * 4, 4.0
+            stops.append(convergence.end_epoch(epoch))
+        self.assertEqual(stops, [False, False, False, False, False, True])
+        self.assertAlmostEqual(convergence.epochs[2]["change"], 0.04)
+        self.assertEqual([epoch["epoch"] for epoch in convergence.epochs], list(range(6)))
+        self.assertTrue(convergence.stopped)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+# -*- coding: utf8 -*-
+
+"""
+Tests of the compressed GeoTIFF writing of somcore.raster: the overview levels, the tile rows and
+the nearest neighbour decimation into the overviews, with in-memory bands and, when GDAL is
+installed, with GdalWriter.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from somcore import raster
+
+try:
+    from osgeo import gdal
+except ImportError:
+    gdal = None
+
+
+# band of a GDAL dataset held in an array; the writes are recorded as (first row, rows)
+class ArrayBand(object):
+    def __init__(self, shape, dtype=np.float32):
+        self.array = np.zeros(shape, dtype=dtype)
+        self.writes = []
+
+    def WriteArray(self, block, xoff, yoff):
+        self.array[yoff:yoff + block.shape[0], xoff:xoff + block.shape[1]] = block
+        self.writes.append((yoff, block.shape[0]))
+
+
+# overview of an array sampled cell by cell: the centre cell of every factor x factor block, or the last
+# row or column of the array
+def reference_overview(array, factor):
+    rows, columns = -(-array.shape[0] // factor), -(-array.shape[1] // factor)
+    overview = np.empty((rows, columns), dtype=array.dtype)
+    for i in range(rows):
+        for j in range(columns):
+            overview[i, j] = array[min(i * factor + factor // 2, array.shape[0] - 1),
+                                   min(j * factor + factor // 2, array.shape[1] - 1)]
+    return overview
+
+
+# row strips of irregular height
+def strips(array, heights=(37, 100, 3, 64)):
+    row, heights = 0, list(heights)
+    while row < array.shape[0]:
+        height = heights[0]
+        heights = heights[1:] + heights[:1]
+        yield row, array[row:row + height]
+        row += height
+
+
+class OverviewTest(unittest.TestCase):
+    def test_overview_factors(self):
+        self.assertEqual(raster.overview_factors((256, 256)), [])
+        self.assertEqual(raster.overview_factors((257, 10)), [2])
+        self.assertEqual(raster.overview_factors((1000, 300)), [2, 4])
+        self.assertEqual(raster.overview_factors((100, 5000), tile_size=64), [2, 4, 8, 16, 32, 64, 128])
+        for shape in ((1000, 300), (3000, 2000)):
+            factors = raster.overview_factors(shape)
+            self.assertTrue(-(-max(shape) // factors[-1]) <= raster.TILE_SIZE)
+            self.assertTrue(-(-max(shape) // (factors[-1] // 2)) > raster.TILE_SIZE)
+
+    def test_tile_rows(self):
+        array = np.arange(300 * 7, dtype=np.float32).reshape(300, 7)
+        band = ArrayBand(array.shape)
+        tiles = raster.TileRows(band, 7, np.float32, tile_size=64)
+        for _, block in strips(array):
+            tiles.write(block)
+        self.assertEqual(band.writes, [(0, 64), (64, 64), (128, 64), (192, 64)])
+        tiles.flush()
+        self.assertEqual(band.writes[-1], (256, 44))
+        np.testing.assert_array_equal(band.array, array)
+
+    def test_overview_levels(self):
+        array = np.random.RandomState(0).rand(301, 203).astype(np.float32)
+        for factor in (2, 4, 8, 16):
+            expected = reference_overview(array, factor)
+            level = raster.OverviewLevel(ArrayBand(expected.shape), array.shape, factor, np.float32)
+            for row, block in strips(array):
+                level.write(row, block)
+            level.tiles.flush()
+            np.testing.assert_array_equal(level.tiles.band.array, expected)
+
+
+@unittest.skipIf(gdal is None, "GDAL is not installed")
+class GdalWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_compressed_geotiff(self):
+        array = np.random.RandomState(0).randint(0, 40, (700, 530)).astype(np.uint8)
+        writer = raster.create_raster(os.path.join(self.folder, "clusters"), array.shape, dtype=np.uint8, nodata=255,
+                                      compressed=True)
+        for row, block in strips(array):
+            writer.write_rows(row, block)
+        writer.close()
+        dataset = gdal.Open(writer.path)
+        band = dataset.GetRasterBand(1)
+        np.testing.assert_array_equal(band.ReadAsArray(), array)
+        self.assertEqual(band.GetNoDataValue(), 255)
+        self.assertEqual(band.GetBlockSize(), [raster.TILE_SIZE, raster.TILE_SIZE])
+        factors = raster.overview_factors(array.shape)
+        self.assertEqual(band.GetOverviewCount(), len(factors))
+        for i, factor in enumerate(factors):
+            np.testing.assert_array_equal(band.GetOverview(i).ReadAsArray(), reference_overview(array, factor))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+# -*- coding: utf8 -*-
+
+"""
+Tests of the mask written by somcore.raster_io.ArcpyRasterIO against the arcpy stub of
+benchmarks/arcpy_stub.py.
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import arcpy_stub  # noqa: E402
+from somcore import raster_io  # noqa: E402
+
+try:
+    import osgeo.gdal  # noqa: F401
+    GDAL = True
+except ImportError:
+    GDAL = False
+
+
+# the stub rasters are read with arcpy, somcore.raster opens paths with GDAL when it is installed
+@unittest.skipIf(GDAL, "the arcpy stub rasters are opened with GDAL")
+class ArcpyMaskTest(unittest.TestCase):
+    def setUp(self):
+        arcpy_stub.install()
+        self.folder = tempfile.mkdtemp()
+        random_state = np.random.RandomState(0)
+        self.paths = []
+        for band in range(3):
+            values = random_state.rand(23, 17).astype(np.float32)
+            values[random_state.rand(*values.shape) < 0.1] = np.nan
+            self.paths.append(os.path.join(self.folder, "band_{}".format(band)))
+            np.save(arcpy_stub.raster_file(self.paths[-1]), values)
+        self.expected = np.all([~np.isnan(np.load(arcpy_stub.raster_file(path))) for path in self.paths], axis=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def create_mask(self, block_cells):
+        mask_path = os.path.join(self.folder, "mask")
+        mask = raster_io.ArcpyRasterIO().create_mask(self.paths, mask_path, block_cells)
+        return mask, np.load(arcpy_stub.raster_file(mask_path))
+
+    def test_one_block(self):
+        mask, written = self.create_mask(raster_io.ARCPY_BLOCK_CELLS)
+        np.testing.assert_array_equal(~np.isnan(written), self.expected)
+        self.assertEqual(mask.count, self.expected.sum())
+
+    def test_blocks_are_mosaicked(self):
+        _, written = self.create_mask(5 * 17 + 3)
+        np.testing.assert_array_equal(~np.isnan(written), self.expected)
+        self.assertEqual(sorted(os.listdir(self.folder)), ["band_0.npy", "band_1.npy", "band_2.npy", "mask.npy"])
+
+
+if __name__ == "__main__":
+    unittest.main()
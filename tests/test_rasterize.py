@@ -0,0 +1,108 @@
+# -*- coding: utf8 -*-
+
+"""
+Tests of the result rasters written by somcore.rasterize from 'geospace.txt' and 'somspace.txt',
+with in-memory rasters (driver 'array').
+"""
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from somcore import rasterize, som
+from somcore.grid import Grid
+from somcore.raster import FLOAT_NODATA, ArrayRaster
+
+MASK = np.array([[1, 0, 1, 1], [0, 0, 1, 0], [1, 1, 1, 0]], dtype=np.uint8)
+
+
+# writes a geospace.txt for the valid cells of a mask (row by row) with two bands; returns its rows
+def write_geospace(path, mask, labels):
+    rows, cols = np.nonzero(mask)
+    table = np.column_stack((cols, rows, np.zeros(len(rows)), rows % 2, cols % 3, labels,
+                             rows * 10.0, cols * 10.0, rows + 0.5, cols + 0.5, (rows + cols) / 10.0))
+    with io.open(path, "wb") as geospace_file:
+        geospace_file.write(b"% x y z som_x som_y cluster b_r1 b_r2 r1 r2 q_error\n")
+        for row in table:
+            geospace_file.write((" ".join("%.7g" % value for value in row) + "\n").encode("ascii"))
+    return table
+
+
+class ClusterTypeTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_cluster_type(self):
+        self.assertEqual(rasterize.cluster_type(254, True), (np.uint8, 255))
+        self.assertEqual(rasterize.cluster_type(255, True), (np.uint16, 65535))
+        self.assertEqual(rasterize.cluster_type(70000, True), (np.uint32, 2 ** 32 - 1))
+        self.assertEqual(rasterize.cluster_type(None, True), (np.uint32, 2 ** 32 - 1))
+        self.assertEqual(rasterize.cluster_type(3, False), (np.float32, FLOAT_NODATA))
+
+    # without k-means every node is a cluster, a 30 x 20 map has cluster numbers up to 599
+    def test_som_planes_of_every_node(self):
+        grid = Grid(30, 20)
+        path = som.write_somspace(os.path.join(self.folder, "somspace.txt"), np.zeros((grid.size, 1)), grid,
+                                  np.zeros(grid.size), np.arange(grid.size), ["r1"])
+        self.assertEqual(rasterize.largest_cluster(path), grid.size - 1)
+        writers = rasterize.rasterize_somspace(path, self.folder, 30, 20, "array", compressed=True)
+        self.assertEqual(writers[0].array.dtype, np.uint16)
+        np.testing.assert_array_equal(writers[0].array[::-1].ravel(), np.arange(grid.size))
+
+    def test_cluster_numbers_beyond_the_type(self):
+        path = os.path.join(self.folder, "geospace.txt")
+        write_geospace(path, MASK, np.arange(MASK.sum()) * 100)
+        writers = rasterize.rasterize_geospace(path, ArrayRaster(MASK, nodata=0), self.folder, 2, driver="array",
+                                               compressed=True, largest=600)
+        self.assertEqual(writers[0].array.dtype, np.uint16)
+        self.assertRaises(ValueError, rasterize.rasterize_geospace, path, ArrayRaster(MASK, nodata=0), self.folder,
+                          2, driver="array", compressed=True, largest=200)
+
+
+class GeospaceTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "geospace.txt")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def rasterize(self, mask, chunk_size=rasterize.CHUNK_SIZE):
+        return rasterize.rasterize_geospace(self.path, ArrayRaster(mask, nodata=0), self.folder, 2, chunk_size,
+                                            driver="array")
+
+    # every value of a row lands in the cell of its x and y, the other cells are NoData
+    def test_round_trip(self):
+        table = write_geospace(self.path, MASK, np.arange(MASK.sum()))
+        rows, cols = table[:, 1].astype(int), table[:, 0].astype(int)
+        for chunk_size in (4, 8, rasterize.CHUNK_SIZE):
+            writers = self.rasterize(MASK, chunk_size)
+            self.assertEqual([os.path.basename(writer.path) for writer in writers],
+                             ["Geo_cluster", "quant_error", "r1", "r2"])
+            for writer, column in zip(writers, (5, 10, 6, 7)):
+                expected = np.full(MASK.shape, FLOAT_NODATA, dtype=np.float32)
+                expected[rows, cols] = table[:, column]
+                np.testing.assert_array_equal(writer.array, expected)
+
+    def test_other_mask(self):
+        write_geospace(self.path, MASK, np.zeros(MASK.sum()))
+        shifted = np.roll(MASK, 1, axis=1)                      # as many valid cells in other columns
+        self.assertRaises(ValueError, self.rasterize, shifted)
+        self.assertRaises(ValueError, self.rasterize, MASK[:, :3])
+        fewer = MASK.copy()
+        fewer[2, 2] = 0                                         # the last row of the file is left over
+        self.assertRaises(ValueError, self.rasterize, fewer)
+        more = MASK.copy()
+        more[2, 3] = 1
+        self.assertRaises(ValueError, self.rasterize, more)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,125 @@
+# -*- coding: utf8 -*-
+
+"""
+Tests of the run report (somcore.report): the wall time, memory and I/O of the stages and of the
+executables they start, and the streamed output and exit codes of the executables, with Python
+child processes (sys.executable -c).
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+from somcore import report
+
+
+class RunReportTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, report.REPORT_FILE)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_stage_fields(self):
+        run_report = report.RunReport(self.path)
+        with run_report.measure("train", lambda: 1000):
+            time.sleep(0.05)
+            array = np.ones(8 << 20, dtype=np.uint8)             # 8 MB touched in the stage
+            array.sum()
+        run_report.skip("cluster")
+        stage = run_report.stages[0]
+        self.assertEqual((stage["name"], stage["status"], stage["cells"], stage["processes"]),
+                         ("train", "done", 1000, []))
+        self.assertTrue(0.05 <= stage["wall_time"] < 5)
+        self.assertAlmostEqual(stage["cells_per_second"], 1000 / stage["wall_time"])
+        self.assertTrue(stage["peak_rss"] is None or stage["peak_rss"] >= 8 << 20)
+        for name in ("read_bytes", "write_bytes"):
+            self.assertTrue(stage[name] is None or stage[name] >= 0)
+        self.assertEqual(run_report.stages[1], {"name": "cluster", "status": "skipped", "processes": []})
+        with open(self.path) as report_file:
+            saved = json.load(report_file)                  # saved after every stage
+        self.assertEqual([saved_stage["name"] for saved_stage in saved["stages"]], ["train"])
+        self.assertTrue(saved["started"] <= saved["finished"])
+
+    def test_failed_stage(self):
+        run_report = report.RunReport()
+
+        def fail():
+            raise ValueError("broken")
+
+        with self.assertRaises(RuntimeError):
+            with run_report.measure("lrn", fail):
+                raise RuntimeError("stopped")
+        stage = run_report.stages[0]
+        self.assertEqual((stage["status"], stage["cells"], stage["cells_per_second"]), ("failed", None, None))
+        self.assertTrue(stage["wall_time"] >= 0)
+        self.assertIsNone(run_report.current)
+
+    def test_epochs(self):
+        run_report = report.RunReport()
+        with run_report.measure("train"):
+            for epoch in range(3):
+                time.sleep(0.01)
+                run_report.epoch(epoch)
+        self.assertEqual([epoch["epoch"] for epoch in run_report.epochs], [0, 1, 2])
+        self.assertTrue(all(epoch["seconds"] >= 0.01 for epoch in run_report.epochs))
+        self.assertEqual(run_report.as_dict()["epochs"], run_report.epochs)
+
+    # the process of an executable gets its own wall time and peak RSS
+    def test_call(self):
+        run_report = report.RunReport()
+        with run_report.measure("train"):
+            run_report.call([sys.executable, "-c", "import time; data = bytearray(32 << 20); time.sleep(0.1)"])
+        process = run_report.stages[0]["processes"][0]
+        self.assertEqual((process["returncode"], process["command"].split()[0]), (0, sys.executable))
+        self.assertTrue(0.1 <= process["wall_time"] <= run_report.stages[0]["wall_time"])
+        self.assertTrue(process["peak_rss"] is None or process["peak_rss"] >= 32 << 20)
+
+
+class RunProcessTest(unittest.TestCase):
+    # the lines arrive while the process runs, before it exits
+    def test_streamed_output(self):
+        script = ("import sys, time\n"
+                  "for i in range(3):\n"
+                  "    sys.stdout.write('line %d\\n' % i); sys.stdout.flush(); time.sleep(0.2)\n"
+                  "sys.stderr.write('done\\n')\n")
+        started = time.time()
+        arrivals = []
+        returncode, usage = report.run_process([sys.executable, "-c", script],
+                                               lambda line: arrivals.append((line, time.time() - started)))
+        self.assertEqual(returncode, 0)
+        self.assertEqual([line for line, _ in arrivals], ["line 0", "line 1", "line 2", "done"])
+        self.assertTrue(arrivals[0][1] < arrivals[-1][1] - 0.3)
+        self.assertEqual(usage["output"], ["line 0", "line 1", "line 2", "done"])
+        self.assertTrue(usage["wall_time"] >= 0.6)
+
+    def test_output_tail(self):
+        script = "for i in range({}): print(i)".format(report.OUTPUT_TAIL + 5)
+        lines = []
+        returncode, usage = report.run_process([sys.executable, "-c", script], lines.append)
+        self.assertEqual(len(lines), report.OUTPUT_TAIL + 5)
+        self.assertEqual(usage["output"], [str(i) for i in range(5, report.OUTPUT_TAIL + 5)])
+
+    def test_exit_code(self):
+        returncode, usage = report.run_process([sys.executable, "-c", "import sys; sys.exit(3)"])
+        self.assertEqual(returncode, 3)
+        self.assertNotIn("output", usage)
+        run_report = report.RunReport()
+        command = [sys.executable, "-c", "import sys; print('failing'); sys.exit(2)"]
+        self.assertEqual(run_report.call(command), 2)
+        with self.assertRaises(report.ProcessError) as raised:
+            run_report.call(command, output=lambda line: None, check=True)
+        self.assertEqual((raised.exception.returncode, raised.exception.output), (2, ["failing"]))
+        self.assertIn("exited with code 2", str(raised.exception))
+        self.assertIn("failing", str(raised.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+# -*- coding: utf8 -*-
+
+"""
+Tests of the BMU searches (somcore.search): the local search and the KD-tree search against the
+exact one, and the comparisons with the exact search that go to 'bmu_check.json'.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from somcore import bmu, search
+from somcore.grid import Grid
+
+try:
+    import scipy.spatial  # noqa: F401
+    SCIPY = True
+except ImportError:
+    SCIPY = False
+
+
+# codebook of a trained map of two-band data: the nodes spread evenly over the data
+def ordered_codebook(grid):
+    return np.column_stack((grid.positions, np.zeros(grid.size))).astype(np.float32)
+
+
+def sample_data(grid, rows=500, seed=0):
+    random_state = np.random.RandomState(seed)
+    low, high = grid.positions.min(axis=0), grid.positions.max(axis=0)
+    data = np.column_stack((random_state.uniform(low[0], high[0], rows), random_state.uniform(low[1], high[1], rows),
+                            random_state.standard_normal(rows) * 0.1))
+    return data.astype(np.float32)
+
+
+class LocalSearchTest(unittest.TestCase):
+    # on an ordered map the descent from the seeds ends at the exact BMU
+    def test_ordered_map(self):
+        for grid in (Grid(40, 30), Grid(40, 30, "planar", "hexagonal")):
+            codebook = ordered_codebook(grid)
+            data = sample_data(grid)
+            distances = ((data[:, np.newaxis, :].astype(np.float64) - codebook[np.newaxis, :, :]) ** 2).sum(axis=2)
+            local = search.LocalSearch(grid)
+            found = local.query(data, codebook)
+            np.testing.assert_array_equal(found[0], distances.argmin(axis=1))
+            np.testing.assert_allclose(found[1], distances.min(axis=1), rtol=1e-5, atol=1e-6)
+            np.testing.assert_array_equal(local.query(data, codebook)[0], found[0])     # seeded with the BMUs
+
+    # on an unordered map the descent stops at local minima: never closer than the exact BMU
+    def test_unordered_map(self):
+        grid = Grid(20, 20)
+        codebook = np.random.RandomState(1).rand(grid.size, 3).astype(np.float32)
+        data = np.random.RandomState(2).rand(400, 3).astype(np.float32)
+        bmus, distances = search.LocalSearch(grid).query(data, codebook)
+        exact_bmus, exact_distances = bmu.best_matching_units(data, codebook)
+        np.testing.assert_allclose(distances, ((data - codebook[bmus]) ** 2).sum(axis=1), rtol=1e-4, atol=1e-6)
+        self.assertTrue(np.all(distances >= exact_distances - 1e-5))
+        self.assertTrue(np.mean(bmus == exact_bmus) > 0.5)
+
+
+class CheckTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_check_and_save_checks(self):
+        grid = Grid(10, 10)
+        codebook = np.random.RandomState(1).rand(grid.size, 3).astype(np.float32)
+        data = np.random.RandomState(2).rand(300, 3).astype(np.float32)
+        exact_bmus, exact_distances = bmu.best_matching_units(data, codebook)
+        bmus, distances = exact_bmus.copy(), exact_distances.copy()
+        wrong = np.arange(0, 300, 3)
+        bmus[wrong] = (bmus[wrong] + 1) % grid.size
+        distances[wrong] = ((data[wrong] - codebook[bmus[wrong]]) ** 2).sum(axis=1)
+        checked = search.ExactSearch(grid, check_rows=1000)
+        result = checked.check(data, codebook, bmus, distances)
+        self.assertEqual((result["search"], result["rows"]), ("exact", 300))
+        self.assertAlmostEqual(result["disagreement"], len(wrong) / 300.0)
+        excess = np.maximum(np.sqrt(distances) - np.sqrt(exact_distances), 0.0)
+        self.assertAlmostEqual(result["distance_excess"], float(excess.mean()), places=5)
+
+        sampled = search.LocalSearch(grid, check_rows=50)
+        self.assertIsNone(sampled.check(data[:0], codebook, bmus[:0], distances[:0]))
+        result = sampled.check(data, codebook, bmus, distances)
+        self.assertEqual((result["search"], result["rows"]), ("local", 50))
+        sampled.check(data, codebook, exact_bmus, exact_distances)
+        with open(sampled.save_checks(os.path.join(self.folder, search.CHECK_FILE))) as check_file:
+            checks = json.load(check_file)
+        self.assertEqual(len(checks), 2)
+        self.assertEqual((checks[1]["disagreement"], checks[1]["distance_excess"]), (0.0, 0.0))
+
+    def test_get_search(self):
+        self.assertEqual(search.get_search("local", Grid(4, 4)).name, "local")
+        self.assertEqual(search.get_search("kdtree", Grid(4, 4), kdtree_eps=0.5).eps, 0.5)
+        self.assertRaises(ValueError, search.get_search, "kdtree", Grid(4, 4), kdtree_eps=-1.0)
+        self.assertRaises(ValueError, search.get_search, "ball", Grid(4, 4))
+
+
+@unittest.skipUnless(SCIPY, "scipy is not installed")
+class KdTreeSearchTest(unittest.TestCase):
+    def test_error_bound(self):
+        grid = Grid(15, 15)
+        codebook = np.random.RandomState(1).rand(grid.size, 6).astype(np.float32)
+        data = np.random.RandomState(2).rand(1000, 6).astype(np.float32)
+        exact_bmus, exact_distances = bmu.best_matching_units(data, codebook)
+        bmus, distances = search.KdTreeSearch(grid).query(data, codebook)
+        np.testing.assert_array_equal(bmus, exact_bmus)
+        for eps in (0.5, 2.0):
+            bmus, distances = search.KdTreeSearch(grid, eps=eps).query(data, codebook)
+            self.assertTrue(np.all(np.sqrt(distances) <= (1 + eps) * np.sqrt(exact_distances) + 1e-5))
+            np.testing.assert_allclose(distances, ((data - codebook[bmus]) ** 2).sum(axis=1), rtol=1e-4,
+                                       atol=1e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
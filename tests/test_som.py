@@ -0,0 +1,207 @@
+# -*- coding: utf8 -*-
+
+"""
+Tests of the numpy SOM trainer (somcore.som) against a plain reference
+implementation of the batch SOM and, when it is installed, against somoclu.
+"""
+
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from somcore import bmu, som
+
+try:
+    import somoclu  # noqa: F401
+    SOMOCLU = True
+except ImportError:
+    SOMOCLU = False
+
+SOM_XML = """<?xml version="1.0" ?>
+<som_configuration>
+<som_files><input>{folder}/SOM.npy</input><input_format>npy</input_format>
+<output_somspace>{folder}/somspace.txt</output_somspace><output_geospace>{folder}/geospace.txt</output_geospace>
+</som_files>
+<som_parameters><som_x>6</som_x><som_y>5</som_y><nEpoch>6</nEpoch><mapType>{map_type}</mapType>
+<gridType>rectangular</gridType><neighborhood>{neighborhood}</neighborhood><std_coeff>0.5</std_coeff>
+<initialization>random</initialization><radius0>0</radius0><radiusN>0</radiusN><radiuscooling>{cooling}</radiuscooling>
+<scale0>0.1</scale0><scaleN>0.01</scaleN><scalecooling>{cooling}</scalecooling></som_parameters>
+</som_configuration>
+"""
+
+
+def sample_data(rows=400, bands=3, seed=0):
+    random_state = np.random.RandomState(seed)
+    centers = random_state.rand(5, bands) * 10
+    labels = random_state.randint(0, len(centers), rows)
+    return (centers[labels] + random_state.standard_normal((rows, bands))).astype(np.float32)
+
+
+# radius or scale of an epoch, as somoclu's linearCooling and exponentialCooling compute it
+def reference_cooling(start, end, epoch, n_epoch, kind):
+    if kind == "linear":
+        return start - epoch * (start - end) / (n_epoch - 1.0)
+    decay = -math.log(0.1 if end == 0 else end / start) / n_epoch
+    return start * math.exp(-epoch * decay)
+
+
+# batch SOM node by node in float64: every node becomes the mean of the data weighted with the
+# neighbourhood of the best matching units (gaussian with compact support, or bubble)
+def reference_train(data, codebook, config):
+    data = data.astype(np.float64)
+    codebook = codebook.astype(np.float64)
+    nodes = np.array([(x, y) for y in range(config.som_y) for x in range(config.som_x)], dtype=np.float64)
+    for epoch in range(config.n_epoch):
+        radius = reference_cooling(config.radius0, config.radius_n, epoch, config.n_epoch, config.radius_cooling)
+        bmus = np.array([np.argmin(((codebook - row) ** 2).sum(axis=1)) for row in data])
+        updated = codebook.copy()
+        for node in range(len(codebook)):
+            difference = np.abs(nodes[bmus] - nodes[node])
+            if config.map_type == "toroid":
+                difference = np.minimum(difference, [config.som_x, config.som_y] - difference)
+            distance = np.sqrt((difference ** 2).sum(axis=1))
+            if config.neighborhood == "bubble":
+                weights = (distance <= radius).astype(np.float64)
+            else:
+                weights = np.exp(-distance ** 2 / (2 * (config.std_coeff * radius) ** 2)) * (distance <= radius)
+            if weights.sum() > 0:
+                updated[node] = (weights[:, np.newaxis] * data).sum(axis=0) / weights.sum()
+        codebook = updated
+    return codebook
+
+
+# numpy backend that keeps the radius and scale of every epoch and mini-batch step
+class RecordingBackend(som.NumpyBackend):
+    def __init__(self):
+        super(RecordingBackend, self).__init__()
+        self.epochs = []
+        self.steps = []
+
+    def epoch(self, data, codebook, grid, radius, scale, config, data_norm=None):
+        self.epochs.append((radius, scale))
+        return super(RecordingBackend, self).epoch(data, codebook, grid, radius, scale, config, data_norm)
+
+    def minibatch_step(self, data, codebook, grid, radius, scale, config, data_norm=None):
+        self.steps.append((radius, scale))
+        return super(RecordingBackend, self).minibatch_step(data, codebook, grid, radius, scale, config, data_norm)
+
+
+class NumpyBackendTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.data = sample_data()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def config(self, map_type="planar", neighborhood="gaussian", cooling="linear"):
+        path = os.path.join(self.folder, "SOM.xml")
+        with open(path, "w") as xml_file:
+            xml_file.write(SOM_XML.format(folder=self.folder, map_type=map_type, neighborhood=neighborhood,
+                                          cooling=cooling))
+        return som.SomConfig(path)
+
+    def assert_reference(self, config, backend):
+        initial = som.initialize_codebook(self.data, config.grid(), config.initialization, config.seed)
+        trained = backend.train(self.data, initial.copy(), config.grid(), config)
+        expected = reference_train(self.data, initial, config)
+        span = float(self.data.max() - self.data.min())
+        np.testing.assert_allclose(trained, expected, rtol=0, atol=1e-4 * span)
+
+    def test_defaults(self):
+        config = self.config()
+        self.assertEqual((config.radius0, config.radius_n), (2.5, 1.0))
+
+    def test_planar_gaussian(self):
+        self.assert_reference(self.config(), som.NumpyBackend())
+
+    def test_toroid_bubble_exponential(self):
+        self.assert_reference(self.config("toroid", "bubble", "exponential"), som.NumpyBackend())
+
+    def test_thread_workers(self):
+        self.assert_reference(self.config("toroid"), som.NumpyBackend(workers=2))
+
+    def test_minibatch(self):
+        for cooling in ("linear", "exponential"):
+            config = self.config(cooling=cooling)
+            config.n_epoch, config.batch_size = 20, 120
+
+            def parts():
+                return (som.lrn.TrainingData(self.data[start:start + config.batch_size], None, None, None)
+                        for start in range(0, len(self.data), config.batch_size))
+
+            initial = som.initialize_codebook(self.data, config.grid(), config.initialization, config.seed)
+            backend = RecordingBackend()
+            trained = backend.train_minibatch(parts, len(self.data), initial.copy(), config.grid(), config)
+            radii, scales = np.array(backend.steps).T
+            self.assertEqual(len(backend.steps), 4 * config.n_epoch)
+            self.assertTrue(np.all(np.diff(radii) <= 0) and np.all(np.diff(scales) <= 0))
+            self.assertTrue(radii.min() > config.radius_n - 1e-9 and scales.min() > config.scale_n - 1e-9)
+            if cooling == "linear":
+                self.assertAlmostEqual(radii[-1], config.radius_n)
+                self.assertAlmostEqual(scales[-1], config.scale_n)
+            batch = som.NumpyBackend().train(self.data, initial.copy(), config.grid(), config)
+            errors = [som.quantization_error(bmu.best_matching_units(self.data, codebook)[1])
+                      for codebook in (trained, batch)]
+            self.assertLess(errors[0], 1.1 * errors[1])
+
+    # the epochs after the convergence are skipped but the last one, at the end of the schedule
+    def test_early_stop(self):
+        for cooling in ("linear", "exponential"):
+            config = self.config(cooling=cooling)
+            config.n_epoch, config.tolerance, config.batch_size = 40, 0.05, 100
+            final = som.final_cooling(config, config.n_epoch)
+            if cooling == "linear":
+                np.testing.assert_allclose(final, (config.radius_n, config.scale_n))
+            initial = som.initialize_codebook(self.data, config.grid(), config.initialization, config.seed)
+            backend = RecordingBackend()
+            epochs = []
+            backend.train(self.data, initial.copy(), config.grid(), config, lambda epoch, _: epochs.append(epoch))
+            stop = backend.convergence.epochs[-1]["epoch"]
+            self.assertTrue(backend.convergence.stopped and stop < config.n_epoch - 2)
+            self.assertEqual(epochs, list(range(stop + 1)) + [config.n_epoch - 1])
+            self.assertEqual(len(backend.epochs), stop + 2)
+            np.testing.assert_allclose(backend.epochs[-1], final)
+
+            def parts():
+                return (som.lrn.TrainingData(self.data[start:start + config.batch_size], None, None, None)
+                        for start in range(0, len(self.data), config.batch_size))
+
+            backend.train_minibatch(parts, len(self.data), initial.copy(), config.grid(), config)
+            stop = backend.convergence.epochs[-1]["epoch"]
+            self.assertTrue(backend.convergence.stopped and stop < config.n_epoch - 2)
+            self.assertEqual(len(backend.steps), 4 * (stop + 2))
+            np.testing.assert_allclose(backend.steps[-4:], [som.final_cooling(config, 4 * config.n_epoch)] * 4)
+
+    @unittest.skipUnless(SOMOCLU, "somoclu is not installed")
+    def test_somoclu_matches_reference(self):
+        self.assert_reference(self.config("toroid", cooling="exponential"), som.SomocluBackend())
+
+    @unittest.skipUnless(SOMOCLU, "somoclu is not installed")
+    def test_somoclu(self):
+        config = self.config()
+        initial = som.initialize_codebook(self.data, config.grid(), config.initialization, config.seed)
+        trained = som.NumpyBackend().train(self.data, initial.copy(), config.grid(), config)
+        reference = som.SomocluBackend().train(self.data, initial.copy(), config.grid(), config)
+        np.testing.assert_allclose(trained, reference, rtol=0, atol=1e-4 * float(self.data.max() - self.data.min()))
+
+    # somoclu trains all epochs in one go: the last epoch is reported, a resumed training is refused
+    def test_somoclu_epochs(self):
+        config = self.config()
+        initial = som.initialize_codebook(self.data, config.grid(), config.initialization, config.seed)
+        self.assertRaises(ValueError, som.SomocluBackend().train, self.data, initial, config.grid(), config,
+                          first_epoch=1)
+        if SOMOCLU:
+            epochs = []
+            trained = som.SomocluBackend().train(self.data, initial, config.grid(), config,
+                                                 lambda epoch, codebook: epochs.append((epoch, codebook)))
+            self.assertEqual([epoch for epoch, _ in epochs], [config.n_epoch - 1])
+            np.testing.assert_array_equal(epochs[0][1], trained)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+# -*- coding: utf8 -*-
+
+"""
+Tests of the SomSpace rasters (somcore.somspace): the U-matrix of the neighbour index tables and the
+planes against a node by node reference on rectangular and hexagonal, planar and toroid grids, and
+the rebuild from 'model.npz' alone.
+"""
+
+import math
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from somcore import model, som, somspace
+from somcore.grid import Grid
+from somcore.normalize import Normalization
+from somcore.raster import FLOAT_NODATA
+
+GRIDS = [(6, 4, "planar", "rectangular"), (6, 4, "toroid", "rectangular"), (5, 4, "planar", "hexagonal"),
+         (6, 4, "toroid", "hexagonal"), (2, 3, "toroid", "rectangular"), (1, 5, "planar", "rectangular")]
+
+
+# map position of a node: odd rows of hexagonal grids shifted by half a cell, rows sqrt(3)/2 apart
+def position(x, y, grid_type):
+    if grid_type == "hexagonal":
+        return x + 0.5 * (y % 2), y * math.sqrt(3.0) / 2.0
+    return float(x), float(y)
+
+
+# map distance of two nodes; on toroids the shortest of the copies of the map shifted by one period
+def map_distance(a, b, som_x, som_y, map_type, grid_type):
+    (ax, ay), (bx, by) = position(a[0], a[1], grid_type), position(b[0], b[1], grid_type)
+    width, height = som_x, position(0, som_y, grid_type)[1]
+    shifts = [(i, j) for i in (-1, 0, 1) for j in (-1, 0, 1)] if map_type == "toroid" else [(0, 0)]
+    return min(math.hypot(ax - bx + i * width, ay - by + j * height) for i, j in shifts)
+
+
+# mean distance of every node's vector to the vectors of the nodes at map distance 1
+def reference_umatrix(codebook, som_x, som_y, map_type, grid_type):
+    nodes = [(x, y) for y in range(som_y) for x in range(som_x)]
+    result = []
+    for i, a in enumerate(nodes):
+        distances = [np.sqrt(((codebook[i] - codebook[j]) ** 2).sum()) for j, b in enumerate(nodes)
+                     if j != i and abs(map_distance(a, b, som_x, som_y, map_type, grid_type) - 1.0) < 1e-6]
+        result.append(np.mean(distances) if distances else 0.0)
+    return np.array(result)
+
+
+class SomSpaceTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_umatrix(self):
+        random_state = np.random.RandomState(0)
+        for som_x, som_y, map_type, grid_type in GRIDS:
+            grid = Grid(som_x, som_y, map_type, grid_type)
+            codebook = random_state.rand(grid.size, 3)
+            np.testing.assert_allclose(som.umatrix(codebook, grid),
+                                       reference_umatrix(codebook, som_x, som_y, map_type, grid_type), rtol=1e-12)
+
+    def test_som_planes(self):
+        grid = Grid(5, 4, "toroid", "hexagonal")
+        codebook = np.random.RandomState(0).rand(grid.size, 2)
+        labels = np.arange(grid.size) % 3
+        planes = somspace.som_planes(codebook, grid, labels)
+        umatrix = reference_umatrix(codebook, 5, 4, "toroid", "hexagonal")
+        self.assertEqual(planes.shape, (4, 4, 5))
+        for node in range(grid.size):
+            x, y = node % 5, node // 5
+            np.testing.assert_allclose(planes[:, 3 - y, x], np.concatenate(([labels[node], umatrix[node]],
+                                                                            codebook[node])), rtol=1e-6)
+
+    # SOM.xml, 'somspace.txt' and the training data are gone after a run that deletes its intermediates
+    def test_rebuild_from_the_model(self):
+        grid = Grid(4, 3, "planar", "hexagonal")
+        codebook = np.random.RandomState(0).rand(grid.size, 2).astype(np.float32)
+        normalization = Normalization("zscore", [10.0, -5.0], [2.0, 0.5])
+        path = model.save_model(os.path.join(self.folder, model.MODEL_FILE),
+                                model.SomModel(codebook, grid, np.arange(grid.size), ["a", "b"], normalization))
+        writers = somspace.rebuild(path, self.folder, driver="array")
+        self.assertEqual([os.path.basename(writer.path) for writer in writers], ["SOM_cluster", "umatrix", "a", "b"])
+        planes = np.array([writer.array for writer in writers])
+        expected = somspace.som_planes(normalization.invert(codebook), grid, np.arange(grid.size),
+                                       som.umatrix(codebook, grid))
+        np.testing.assert_allclose(planes, expected, rtol=1e-6)
+        self.assertFalse((planes == FLOAT_NODATA).any())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+# -*- coding: utf8 -*-
+
+"""
+Tests of the hyperparameter sweep (somcore.sweep): the grid of configurations, the SOM.xml written
+per configuration and the ranking of the scored configurations.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from somcore import lrn, som, sweep, workflow
+
+# the 20 parameters of the toolbox and the training data format and backend
+VALUES = ["workspace", "a.tif;b.tif", "4", "3", "3", "2", "4", "3", "planar", "rectangular", "false", "random",
+          "gaussian", "0.5", "0", "1", "linear", "0.1", "0.01", "linear", "npy", "numpy"]
+
+
+class GridTest(unittest.TestCase):
+    def test_parse_grid(self):
+        grid = sweep.parse_grid(["som_x=10,20", "radiuscooling=linear,exponential"])
+        self.assertEqual(list(grid.items()), [("som_x", ["10", "20"]), ("radiuscooling", ["linear", "exponential"])])
+        self.assertEqual(len(sweep.configurations(grid)), 4)
+        self.assertEqual(dict(sweep.configurations(grid)[1]), {"som_x": "10", "radiuscooling": "exponential"})
+        self.assertRaises(ValueError, sweep.parse_grid, ["workers=1,2"])
+        self.assertRaises(ValueError, sweep.parse_grid, ["som_x="])
+
+
+class ConfigurationTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        random_state = np.random.RandomState(0)
+        data = random_state.rand(200, 3).astype(np.float32)
+        self.training = lrn.TrainingData(np.asfortranarray(data), np.arange(200) // 20, np.arange(200) % 20,
+                                         ["a", "b", "c"])
+        params = workflow.ToolParameters([self.folder] + VALUES[1:])
+        params.planned_training_mode, params.planned_batch_size = "minibatch", "50"
+        workflow.write_xml(params, lambda message: None)
+        self.base_xml = os.path.join(self.folder, "SOM.xml")
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    # the training mode planned for the tool's run would override the batch mode of the sweep
+    def test_write_configuration(self):
+        self.assertEqual(som.SomConfig(self.base_xml).training_mode, "minibatch")
+        folder = os.path.join(self.folder, "config_000")
+        os.makedirs(folder)
+        path = sweep.write_configuration(self.base_xml, {"som_x": "5", "nEpoch": "2"}, "SOM.npy", folder)
+        config = som.SomConfig(path)
+        self.assertEqual((config.som_x, config.n_epoch, config.input, config.workers), (5, 2, "SOM.npy", 1))
+        self.assertEqual(config.training_mode, "batch")
+        self.assertEqual(config.batch_size, int(config.requested_training[1]) or lrn.STREAM_ROWS)
+
+    def test_prepare_data(self):
+        path = os.path.join(self.folder, "SOM.lrn")
+        lrn.write_lrn(path, self.training)
+        prepared = sweep.prepare_data(path, self.folder)
+        self.assertEqual(os.path.basename(prepared), "SOM.npy")
+        np.testing.assert_array_equal(lrn.read_training_data(prepared).data, self.training.data)
+        self.assertEqual(sweep.prepare_data(prepared, self.folder), prepared)
+
+    def test_run_sweep(self):
+        data_file = os.path.join(self.folder, "SOM.npy")
+        lrn.write_npy(data_file, self.training)
+        grid = sweep.parse_grid(["som_x=3,5", "nEpoch=2"])
+        rows = sweep.run_sweep(self.base_xml, grid, data_file, os.path.join(self.folder, "sweep"), workers=1,
+                               log=lambda message: None)
+        self.assertEqual([(row["config"], row["som_x"]) for row in rows], [(0, "3"), (1, "5")])
+        for row in rows:
+            self.assertTrue(row["qe"] > 0 and 0 <= row["te"] <= 1 and row["k"] >= 1)
+            self.assertTrue(os.path.exists(row["codebook"]))
+
+
+class RankTest(unittest.TestCase):
+    # the largest map has the lowest qe and the highest te: the balanced configuration wins
+    def test_ranked(self):
+        rows = [{"config": 0, "qe": 0.5, "te": 0.01}, {"config": 1, "qe": 0.3, "te": 0.02},
+                {"config": 2, "qe": 0.1, "te": 0.30}, {"config": 3, "qe": 0.3, "te": 0.05}]
+        sweep.rank_rows(rows)
+        self.assertEqual([row["rank"] for row in rows], [5, 4, 5, 5])
+        self.assertEqual([row["config"] for row in sweep.ranked(rows)], [1, 2, 3, 0])
+        self.assertEqual([row["config"] for row in sweep.ranked(rows, "qe")], [2, 1, 3, 0])
+        self.assertEqual([row["config"] for row in sweep.ranked(rows, "te")], [0, 1, 3, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
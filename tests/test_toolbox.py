@@ -0,0 +1,86 @@
+# -*- coding: utf8 -*-
+
+"""
+Tests of the Python toolbox 'SOM Toolbox.pyt' against the arcpy stub of benchmarks/arcpy_stub.py:
+its parameters reach the tool by name, the band rasters the tool leaves out are its derived output.
+"""
+
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import arcpy_stub  # noqa: E402
+from somcore import workflow  # noqa: E402
+
+
+# the module of the Python toolbox (the extension .pyt isn't one of the import system)
+def load_toolbox():
+    path = os.path.join(ROOT, "SOM Toolbox.pyt")
+    try:
+        import importlib.util
+        from importlib.machinery import SourceFileLoader
+    except ImportError:
+        import imp
+        return imp.load_source("som_toolbox", path)
+    loader = SourceFileLoader("som_toolbox", path)
+    module = importlib.util.module_from_spec(importlib.util.spec_from_loader("som_toolbox", loader))
+    loader.exec_module(module)
+    return module
+
+
+class ToolboxTest(unittest.TestCase):
+    def setUp(self):
+        arcpy_stub.install()
+        self.toolbox = load_toolbox()
+        self.tool = self.toolbox.Toolbox().tools[0]()
+        self.run = self.toolbox.SOM_Clustering.run
+        self.values = []
+        self.left_out = []
+        self.toolbox.SOM_Clustering.run = self.run_tool
+
+    def tearDown(self):
+        self.toolbox.SOM_Clustering.run = self.run
+
+    def run_tool(self, values):
+        self.values.extend(values)
+        return self.left_out
+
+    def test_parameters(self):
+        parameters = self.tool.getParameterInfo()
+        names = [parameter.name for parameter in parameters if parameter.direction == "Input"]
+        self.assertEqual(names[:len(workflow.PARAMETERS)], workflow.PARAMETERS)
+        optional = names[len(workflow.PARAMETERS):]
+        self.assertEqual(len(set(optional)), len(optional))
+        self.assertTrue(set(optional) <= set(name for name, _ in workflow.OPTIONAL_PARAMETERS))
+
+    def test_execute(self):
+        parameters = self.tool.getParameterInfo()
+        for parameter in parameters:
+            if parameter.name == "input_raster":
+                parameter.value = "a;b"
+            elif parameter.value is None and parameter.direction == "Input":
+                parameter.value = 3
+        self.tool.execute(parameters, None)
+        params = workflow.ToolParameters(self.values)
+        self.assertEqual((params.rasters(), params.cellsize_x, params.is_checked_del), (["a", "b"], "3", "false"))
+        for parameter in parameters[len(workflow.PARAMETERS):-1]:
+            self.assertEqual(getattr(params, parameter.name), parameter.valueAsText)
+        for name, default in workflow.OPTIONAL_PARAMETERS:
+            if name not in [parameter.name for parameter in parameters]:
+                self.assertEqual(getattr(params, name), default)
+
+
+    def test_band_rasters(self):
+        parameters = self.tool.getParameterInfo()
+        self.assertEqual((parameters[-1].name, parameters[-1].parameterType, parameters[-1].direction),
+                         (self.toolbox.BAND_RASTERS, "Derived", "Output"))
+        self.left_out.extend([os.path.join("GeoSpace", "b1"), os.path.join("SomSpace", "b1")])
+        self.tool.execute(parameters, None)
+        self.assertEqual(parameters[-1].valueAsText.split(";"), self.left_out)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+# -*- coding: utf8 -*-
+
+"""
+Tests of the tool parameters of the SOM tool (somcore.workflow).
+"""
+
+import unittest
+
+from somcore import workflow
+
+# the 20 parameters of the toolbox
+VALUES = ["workspace", "a.tif;b.tif", "4", "3", "3", "2", "4", "3", "planar", "rectangular", "false", "random",
+          "gaussian", "0.5", "0", "1", "linear", "0.1", "0.01", "linear"]
+
+
+class ToolParametersTest(unittest.TestCase):
+    def test_defaults(self):
+        params = workflow.ToolParameters(VALUES)
+        self.assertEqual((params.input_format, params.som_backend), ("lrn", "nextsom_wrap"))
+        self.assertEqual(params.rasters(), ["a.tif", "b.tif"])
+
+    def test_too_few_parameters(self):
+        self.assertRaises(ValueError, workflow.ToolParameters, VALUES[:-1])
+
+    def test_npy_needs_an_in_repo_backend(self):
+        self.assertRaises(ValueError, workflow.ToolParameters, VALUES + ["npy"])
+        self.assertRaises(ValueError, workflow.ToolParameters, VALUES + ["npy", "nextsom_wrap"])
+        self.assertEqual(workflow.ToolParameters(VALUES + ["npy", "numpy"]).input_format, "npy")
+        self.assertEqual(workflow.main(VALUES + ["--input-format", "npy", "--backend", "nextsom_wrap"]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()